@@ -0,0 +1,163 @@
+"""
+响应压缩中间件（按 Accept-Encoding 协商 br / gzip）
+
+推荐接口一次返回几十本书的完整字段，试读接口返回整章正文，都是高度可压缩的中文 JSON。
+Starlette 自带的 GZipMiddleware 只会 gzip，这里：
+- 按 Accept-Encoding 的 q 值协商，br 优先（需安装 brotli，未安装时只用 gzip）
+- 小于 COMPRESSION_MIN_BYTES 的响应原样返回（压缩省下的字节抵不过 CPU 和头部开销）
+- 只压文本类 Content-Type；图片代理的 WebP/AVIF/JPEG 本身已压缩，直接放行
+- 已带 Content-Encoding 的响应（如预压缩好的试读章节）原样透传
+- 流式响应逐块压缩，不整体缓冲
+"""
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import COMPRESSION_MIN_BYTES, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY
+
+try:
+    import brotli
+except ImportError:  # brotli 可选：未安装时只协商 gzip
+    brotli = None
+
+_COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def _parse_accept_encoding(accept_encoding: str) -> dict:
+    accepted = {}
+    for part in (accept_encoding or "").lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding] = q
+    return accepted
+
+
+def accepts_encoding(accept_encoding: str, coding: str) -> bool:
+    """客户端是否接受某种编码（q > 0，含 * 通配）。"""
+    accepted = _parse_accept_encoding(accept_encoding)
+    return accepted.get(coding, accepted.get("*", 0.0)) > 0
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """按 Accept-Encoding（含 q 值）选编码：br > gzip，都不可接受时返回 None。"""
+    if brotli is not None and accepts_encoding(accept_encoding, "br"):
+        return "br"
+    if accepts_encoding(accept_encoding, "gzip"):
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    """gzip / br 的流式压缩器统一接口。"""
+
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._obj = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+            self._compress, self._finish = self._obj.process, self._obj.finish
+        else:
+            # wbits=31：带 gzip 头和尾
+            self._obj = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._compress, self._finish = self._obj.compress, self._obj.flush
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data)
+
+    def flush(self) -> bytes:
+        return self._finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_BYTES) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int) -> None:
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Optional[Send] = None
+        self.initial_message: Message = {}
+        self.started = False
+        self.passthrough = False
+        self.compressor: Optional[_Compressor] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _should_skip(self, headers: Headers) -> bool:
+        if "content-encoding" in headers:
+            return True
+        content_type = headers.get("content-type", "")
+        return not content_type.startswith(_COMPRESSIBLE_TYPES)
+
+    async def send_compressed(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # 先扣住响应头：要看到第一块响应体才知道压不压
+            self.initial_message = message
+            self.passthrough = self._should_skip(Headers(raw=message["headers"]))
+            return
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.started:
+            self.started = True
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            if not self.passthrough:
+                # 压与不压都随 Accept-Encoding 变化，缓存要按它区分
+                headers.add_vary_header("Accept-Encoding")
+            if self.passthrough or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+
+            self.compressor = _Compressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            if "etag" in headers and not headers["etag"].startswith("W/"):
+                # 压缩后字节变了，强 ETag 降为弱 ETag
+                headers["ETag"] = "W/" + headers["etag"]
+            data = self.compressor.compress(body)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                data += self.compressor.flush()
+                headers["Content-Length"] = str(len(data))
+            await self.send(self.initial_message)
+            await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+            return
+
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.flush()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
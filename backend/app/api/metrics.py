@@ -0,0 +1,46 @@
+"""
+HTTP 指标中间件：按路由模板记录请求耗时、进行中的请求数
+
+route 标签取路由模板（/api/recommendations/{book_id}）而不是实际路径，
+否则每本书一条时间序列；未匹配任何路由的请求（404 扫描等）统一记为 "unmatched"。
+耗时从收到请求到响应体发完，包含响应压缩。
+"""
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..utils.metrics import HTTP_IN_PROGRESS, HTTP_REQUEST_SECONDS
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_PROGRESS.dec(method=method)
+            # Router 匹配成功后会把 route 写回同一个 scope
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=method,
+                route=getattr(route, "path", "unmatched"),
+                status=str(status),
+            )
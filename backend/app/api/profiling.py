@@ -0,0 +1,47 @@
+"""
+单请求 cProfile 中间件：请求头 X-Profile: 1 且 X-Admin-Token 正确时剖析该请求
+
+- 未配置 PROFILING_TOKEN、没带头或令牌不对的请求直接透传，开销只是读一次请求头
+- 被剖析的请求响应带 X-Profile-Id，用 /api/admin/profiles/{profile_id} 取结果；
+  已有请求在剖析时不排队，照常处理，响应带 X-Profile: busy
+"""
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import PROFILING_TOKEN
+from ..utils.profiling import check_admin_token, finish_request_profile, start_request_profile
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not PROFILING_TOKEN:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if headers.get("x-profile") != "1" or not check_admin_token(headers.get("x-admin-token")):
+            await self.app(scope, receive, send)
+            return
+
+        profile, token = start_request_profile(f"{scope['method']} {scope['path']}")
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                if profile is None:
+                    MutableHeaders(scope=message)["X-Profile"] = "busy"
+                else:
+                    MutableHeaders(scope=message)["X-Profile-Id"] = profile.profile_id
+            await send(message)
+
+        if profile is None:
+            await self.app(scope, receive, send_wrapper)
+            return
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            if route is not None:
+                profile.name = f"{scope['method']} {route.path}"
+            finish_request_profile(profile, token)
@@ -0,0 +1,39 @@
+"""
+请求 ID 中间件：给每个请求一个 request_id，写进日志 ContextVar 并回写 X-Request-Id 响应头
+
+上游（负载均衡 / 网关）已带 X-Request-Id 时沿用，便于跨服务串联；否则本地生成。
+"""
+import os
+import re
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..utils.log import reset_request_id, set_request_id
+
+# 外部传入的 ID 只接受这些字符、最多 64 个，防止日志注入
+_VALID_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestIdMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = Headers(scope=scope).get("x-request-id") or ""
+        request_id = incoming if _VALID_ID.match(incoming) else os.urandom(8).hex()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-Id"] = request_id
+            await send(message)
+
+        token = set_request_id(request_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            reset_request_id(token)
@@ -2,29 +2,52 @@
 API路由 - 小说搜索和推荐
 """
 import asyncio
-from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
-from fastapi.responses import Response
-from urllib.parse import urlparse
+import gzip
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
 from typing import Optional
 import logging
-import requests
 
 from ..schemas.novel import NovelResponse, NovelStats, NovelDetail
-from ..schemas.recommendation import RecommendationResponse
+from ..schemas.recommendation import (
+    RecommendationResponse,
+    BatchRecommendationRequest,
+    ShelfRecommendationRequest,
+)
 from ...services.novel_service import search_novel_exact, insert_novel
 from ...services.crawler_service import JinjiangCrawler, NovelNotFoundException, CrawlerException
 from ...services.recommendation_service import (
     get_recommendation_summary,
+    get_recommendation_batch,
+    get_shelf_recommendations,
+    get_recommendation_page,
+    CursorExpiredException,
     backfill_missing_covers,
     backfill_missing_stats,
     fetch_stats_if_missing,
     invalidate_recommendation_cache,
+    compact_recommendations,
+)
+from ...services.chapter_service import ChapterPayload, get_chapter_payload, peek_chapter_payload
+from ...services.image_proxy import ImageFetchError, get_image_response, validate_image_url
+from ...services.thumbnail_service import get_thumbnail_response
+from ...services.prefetch_service import schedule_chapter_prefetch, record_chapter_open, prefetch_stats
+from ...services.warmup_service import warmup_status
+from ...services.health_service import readiness_report
+from ...utils.tracing import get_trace, recent_traces
+from ...utils.profiling import (
+    ProfilerBusyError,
+    check_admin_token,
+    continuous_sampler,
+    get_request_profile,
+    recent_request_profiles,
+    sample_for,
 )
-from ...services.chapter_service import get_or_fetch_chapters
+from ...config import CHAPTER_CACHE_MAX_AGE, PROFILING_TOKEN, PROFILE_DEFAULT_HZ, PROFILE_MAX_SECONDS
+from ..compression import accepts_encoding
 
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
+# 日志配置（队列 + 结构化输出）在 app.main 里统一做，这里只取 logger
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["novels"])
@@ -51,13 +74,13 @@ async def search_novel(q: str = Query(..., min_length=1, description="搜索关
             "source": "database" | "crawled"
         }
     """
-    logger.info(f"搜索小说: {q}")
+    logger.info(f"搜索小说: {q}", extra={"phase": "search"})
 
     # Step 1: 在数据库中搜索
     novel_data = search_novel_exact(q)
 
     if novel_data:
-        logger.info(f"从数据库找到小说: {q}")
+        logger.info(f"从数据库找到小说: {q}", extra={"phase": "search"})
 
         # 历史入库的书可能缺统计数据（营养液/点击数），首次查看时同步补全
         # 用线程池避免阻塞事件循环；补全后写回库，后续直接命中
@@ -83,7 +106,7 @@ async def search_novel(q: str = Query(..., min_length=1, description="搜索关
         }
 
     # Step 2: 数据库未找到，尝试爬取
-    logger.info(f"数据库未找到，开始爬取: {q}")
+    logger.info(f"数据库未找到，开始爬取: {q}", extra={"phase": "search_crawl"})
 
     try:
         crawler = JinjiangCrawler()
@@ -91,7 +114,8 @@ async def search_novel(q: str = Query(..., min_length=1, description="搜索关
         crawled_data = await asyncio.to_thread(crawler.crawl_novel_complete, q)
 
         # 入库
-        logger.info(f"爬取成功，准备入库: {crawled_data.get('title')}")
+        logger.info(f"爬取成功，准备入库: {crawled_data.get('title')}",
+                    extra={"book_id": crawled_data.get("book_id"), "phase": "search_crawl"})
         insert_result = insert_novel(crawled_data)
 
         if not insert_result:
@@ -120,15 +144,15 @@ async def search_novel(q: str = Query(..., min_length=1, description="搜索关
         }
 
     except NovelNotFoundException:
-        logger.error(f"未找到小说: {q}")
+        logger.info(f"未找到小说: {q}", extra={"phase": "search_crawl"})
         raise HTTPException(status_code=404, detail=f"未找到小说: {q}")
 
     except CrawlerException as e:
-        logger.error(f"爬虫错误: {str(e)}")
+        logger.warning(f"爬虫错误: {e}", extra={"phase": "search_crawl"})
         raise HTTPException(status_code=500, detail=f"爬取失败: {str(e)}")
 
     except Exception as e:
-        logger.error(f"未知错误: {str(e)}")
+        logger.exception("搜索未知错误", extra={"phase": "search"})
         raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
 
 
@@ -137,120 +161,351 @@ async def get_recommendations(
     book_id: int,
     background_tasks: BackgroundTasks,
     limit: int = Query(default=10, ge=1, le=50, description="推荐数量"),
+    mode: str = Query(default="exact", pattern="^(exact|ann)$", description="召回模式：exact 精确 / ann 近似近邻"),
+    compact: bool = Query(default=False, description="只返回列表视图所需字段（不含简介、角色等大字段）"),
 ):
     """获取小说推荐，封面补全在后台异步执行不阻塞响应。"""
-    logger.info(f"获取推荐: book_id={book_id}, limit={limit}")
+    logger.info("获取推荐", extra={"book_id": book_id, "limit": limit, "mode": mode, "phase": "recommend"})
 
     try:
-        result = await asyncio.to_thread(get_recommendation_summary, book_id, limit)
+        result = await asyncio.to_thread(get_recommendation_summary, book_id, limit, mode)
 
+        # 排名靠前的书预先爬好试读章节，用户点开抽屉时直接命中（只入队，排在补全前面不被拖慢）
+        background_tasks.add_task(schedule_chapter_prefetch, result["recommendations"])
         # 封面 + 统计数据补全放入后台，不阻塞当前请求
         background_tasks.add_task(backfill_missing_covers, result["recommendations"])
         background_tasks.add_task(backfill_missing_stats, result["recommendations"])
 
         return {
             "success": True,
-            "data": result
+            "data": compact_recommendations(result) if compact else result
         }
 
     except ValueError as e:
-        logger.error(f"小说ID不存在: {book_id}")
+        logger.warning("小说ID不存在", extra={"book_id": book_id, "phase": "recommend"})
         raise HTTPException(status_code=404, detail=str(e))
 
     except Exception as e:
-        logger.error(f"推荐计算错误: {str(e)}")
+        logger.exception("推荐计算错误", extra={"book_id": book_id, "phase": "recommend"})
+        raise HTTPException(status_code=500, detail=f"推荐计算失败: {str(e)}")
+
+
+@router.get("/recommendations/{book_id}/page", response_model=dict)
+async def get_recommendations_page(
+    book_id: int,
+    background_tasks: BackgroundTasks,
+    cursor: Optional[str] = Query(default=None, description="上一页返回的 next_cursor，不传为第一页"),
+    page_size: int = Query(default=20, ge=1, le=50, description="每页数量"),
+    compact: bool = Query(default=False, description="只返回列表视图所需字段（不含简介、角色等大字段）"),
+):
+    """分页获取推荐（无限滚动用）：完整排行每个快照只算一次，翻页只做切片。"""
+    logger.info("分页获取推荐", extra={"book_id": book_id, "page_size": page_size, "cursor": cursor,
+                                     "phase": "recommend_page"})
+
+    try:
+        result = await asyncio.to_thread(get_recommendation_page, book_id, cursor, page_size)
+
+        if not cursor:
+            background_tasks.add_task(schedule_chapter_prefetch, result["recommendations"])
+        background_tasks.add_task(backfill_missing_covers, result["recommendations"])
+        background_tasks.add_task(backfill_missing_stats, result["recommendations"])
+
+        return {
+            "success": True,
+            "data": compact_recommendations(result) if compact else result
+        }
+
+    except CursorExpiredException as e:
+        raise HTTPException(status_code=410, detail=str(e))
+
+    except ValueError as e:
+        logger.warning(f"分页推荐参数错误: {e}", extra={"book_id": book_id, "phase": "recommend_page"})
+        status = 400 if cursor else 404
+        raise HTTPException(status_code=status, detail=str(e))
+
+    except Exception as e:
+        logger.exception("分页推荐计算错误", extra={"book_id": book_id, "phase": "recommend_page"})
         raise HTTPException(status_code=500, detail=f"推荐计算失败: {str(e)}")
 
 
+@router.post("/recommendations/batch", response_model=dict)
+async def get_recommendations_batch(
+    request: BatchRecommendationRequest,
+    background_tasks: BackgroundTasks,
+):
+    """
+    批量获取多本书的推荐（书架页用），一次请求代替 N 次单本请求。
+
+    所有目标共享一次候选池查询与一份 IDF 快照；merge=true 时额外返回合并去重的整体排行。
+    """
+    logger.info("批量获取推荐", extra={"books": len(request.book_ids), "limit": request.limit,
+                                     "merge": request.merge, "phase": "recommend_batch"})
+
+    try:
+        result = await asyncio.to_thread(
+            get_recommendation_batch, request.book_ids, request.limit, request.merge
+        )
+
+        # 各本推荐列表会有重叠，按 book_id 去重后再交给后台补全
+        unique_recs = list({
+            rec["book_id"]: rec
+            for summary in result["results"]
+            for rec in summary["recommendations"]
+        }.values())
+        background_tasks.add_task(backfill_missing_covers, unique_recs)
+        background_tasks.add_task(backfill_missing_stats, unique_recs)
+
+        return {
+            "success": True,
+            "data": compact_recommendations(result) if request.compact else result
+        }
+
+    except Exception as e:
+        logger.exception("批量推荐计算错误", extra={"phase": "recommend_batch"})
+        raise HTTPException(status_code=500, detail=f"批量推荐计算失败: {str(e)}")
+
+
+@router.post("/recommendations/shelf", response_model=dict)
+async def get_shelf_recommendations_route(
+    request: ShelfRecommendationRequest,
+    background_tasks: BackgroundTasks,
+):
+    """书架推荐：以多本书的聚合画像为种子，服务端一次打分，结果不含种子书本身。"""
+    logger.info("书架推荐", extra={"books": len(request.book_ids), "limit": request.limit, "phase": "recommend_shelf"})
+
+    try:
+        result = await asyncio.to_thread(get_shelf_recommendations, request.book_ids, request.limit)
+
+        background_tasks.add_task(backfill_missing_covers, result["recommendations"])
+        background_tasks.add_task(backfill_missing_stats, result["recommendations"])
+
+        return {
+            "success": True,
+            "data": compact_recommendations(result) if request.compact else result
+        }
+
+    except ValueError as e:
+        logger.warning(f"书架种子均不存在: {request.book_ids}", extra={"phase": "recommend_shelf"})
+        raise HTTPException(status_code=404, detail=str(e))
+
+    except Exception as e:
+        logger.exception("书架推荐计算错误", extra={"phase": "recommend_shelf"})
+        raise HTTPException(status_code=500, detail=f"书架推荐计算失败: {str(e)}")
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match 按弱比较匹配（中间层压缩过的响应 ETag 会带 W/ 前缀）。"""
+    tags = [t.strip() for t in if_none_match.split(",") if t.strip()]
+    return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+
+def _chapter_payload_response(payload: ChapterPayload, request: Request) -> Response:
+    """
+    预压缩的试读响应：接受 gzip 的客户端直接拿存好的 gzip 字节，否则现场解压；
+    两种表示的强 ETag 不同。If-None-Match 命中回 304。
+    """
+    gzip_ok = accepts_encoding(request.headers.get("accept-encoding", ""), "gzip")
+    etag = payload.etag if gzip_ok else payload.etag[:-1] + '-identity"'
+    headers = {
+        "ETag": etag,
+        # URL 不带版本，章节可能被重新解析改写：不标 immutable，过期后凭 ETag 回源（没变只回 304）
+        "Cache-Control": f"public, max-age={CHAPTER_CACHE_MAX_AGE}",
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    if gzip_ok:
+        return Response(payload.body_gzip, media_type="application/json",
+                        headers={**headers, "Content-Encoding": "gzip"})
+    return Response(gzip.decompress(payload.body_gzip), media_type="application/json", headers=headers)
+
+
 @router.get("/novels/{book_id}/chapters", response_model=dict)
-async def get_chapters(book_id: int, n: int = Query(default=3, ge=1, le=10, description="试读章节数")):
+async def get_chapters(
+    request: Request,
+    book_id: int,
+    n: int = Query(default=3, ge=1, le=10, description="试读章节数"),
+):
     """
     获取小说前 N 章免费试读正文。
 
     懒加载：库里有就直接返回；没有则实时爬取（约 4~8s，仅首次），
     爬取放到线程池避免阻塞事件循环。
+    响应整份预压缩缓存（见 chapter_service），带强 ETag 与 Cache-Control: max-age。
     """
-    logger.info(f"获取试读章节: book_id={book_id}, n={n}")
-    try:
-        chapters = await asyncio.to_thread(get_or_fetch_chapters, book_id, n)
+    logger.info("获取试读章节", extra={"book_id": book_id, "n": n, "phase": "chapters"})
+    record_chapter_open(book_id)
+    payload = peek_chapter_payload(book_id)
+    if payload is None:
+        try:
+            payload = await asyncio.to_thread(get_chapter_payload, book_id, n)
+        except Exception as e:
+            logger.exception("试读章节获取失败", extra={"book_id": book_id, "phase": "chapters"})
+            raise HTTPException(status_code=500, detail=f"试读章节获取失败: {str(e)}")
+
+    if payload is None:
+        # 爬取失败 / 无免费章节：空结果不缓存，下次打开重试
         return {
             "success": True,
-            "data": {"book_id": book_id, "chapters": chapters},
+            "data": {"book_id": book_id, "chapters": []},
         }
-    except Exception as e:
-        logger.error(f"试读章节获取失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"试读章节获取失败: {str(e)}")
+    return _chapter_payload_response(payload, request)
+
+
+@router.get("/prefetch/stats")
+async def get_prefetch_stats():
+    """试读预取统计：入队 / 预取成功 / 命中数与命中率（hits / fetched）。"""
+    return {"success": True, "data": prefetch_stats()}
+
+
+# ── 管理员接口守卫 ───────────────────────────────────────────────
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """追踪 / 剖析接口守卫：未配置 PROFILING_TOKEN 时整组接口不存在，令牌不对返回 403。"""
+    if not PROFILING_TOKEN:
+        raise HTTPException(status_code=404, detail="管理员接口未启用")
+    if not check_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="管理员令牌无效")
+
+
+# span 里有 SQL 耗时、上游 URL、请求 ID，只对管理员开放
+@router.get("/traces", dependencies=[Depends(require_admin)])
+async def list_traces():
+    """最近被采样请求的追踪摘要（新的在前）；带请求头 X-Trace: 1 可强制采样单个请求。"""
+    return {"success": True, "data": recent_traces()}
+
+
+@router.get("/traces/{trace_id}", dependencies=[Depends(require_admin)])
+async def get_trace_detail(trace_id: str):
+    """单个请求的完整 span 树（trace_id 见响应头 X-Trace-Id）。"""
+    trace = get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="追踪记录不存在或已被淘汰")
+    return {"success": True, "data": trace}
+
+
+# ── 性能剖析（管理员）─────────────────────────────────────────────
+def _sampler_response(sampler, output_format: str):
+    if output_format == "collapsed":
+        return PlainTextResponse(sampler.collapsed())
+    return {"success": True, "data": sampler.summary()}
+
+
+@router.get("/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_stacks(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS, description="采样时长（秒）"),
+    hz: float = Query(PROFILE_DEFAULT_HZ, gt=0, le=1000, description="采样频率"),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$", description="collapsed = 火焰图折叠栈"),
+    idle: bool = Query(False, description="是否计入空闲线程"),
+):
+    """
+    对全部线程做 N 秒栈采样。
+
+    collapsed 输出可直接交给 flamegraph.pl / inferno-flamegraph 或拖进 speedscope；
+    json 输出自身 / 累计占比最高的函数。同一时间只允许一个按需剖析。
+    """
+    try:
+        sampler = await asyncio.to_thread(sample_for, seconds, hz, idle)
+    except ProfilerBusyError:
+        raise HTTPException(status_code=409, detail="已有剖析在进行，请稍后再试")
+    return _sampler_response(sampler, format)
+
+
+@router.get("/admin/profile/continuous", dependencies=[Depends(require_admin)])
+async def profile_continuous(
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+    reset: bool = Query(False, description="取走后清零，下次从头累积"),
+):
+    """常驻低频栈采样（PROFILE_CONTINUOUS_HZ）自启动或上次清零以来的累积结果。"""
+    sampler = continuous_sampler()
+    if sampler is None:
+        raise HTTPException(status_code=404, detail="常驻采样未开启（PROFILE_CONTINUOUS_HZ=0）")
+    response = _sampler_response(sampler, format)
+    if reset:
+        sampler.reset()
+    return response
+
+
+@router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_request_profiles():
+    """最近的单请求 cProfile 结果（新的在前）；请求头 X-Profile: 1 + X-Admin-Token 触发。"""
+    return {"success": True, "data": recent_request_profiles()}
+
+
+@router.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_request_profile_detail(
+    profile_id: str,
+    format: str = Query("text", pattern="^(text|pstats)$", description="pstats = 可用 snakeviz 打开的二进制"),
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|ncalls)$"),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """单个请求的 cProfile 结果（profile_id 见响应头 X-Profile-Id）。"""
+    profile = get_request_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="剖析记录不存在或已被淘汰")
+    if format == "pstats":
+        content = await asyncio.to_thread(profile.pstats_bytes)
+        return Response(content, media_type="application/octet-stream", headers={
+            "Content-Disposition": f'attachment; filename="{profile_id}.prof"'})
+    return PlainTextResponse(await asyncio.to_thread(profile.text, sort, limit))
 
 
 @router.get("/health")
 async def health_check():
-    """健康检查端点"""
-    return {"status": "healthy", "service": "NovelMind API"}
+    """健康检查端点（附启动预热进度）"""
+    return {"status": "healthy", "service": "NovelMind API", "warmup": warmup_status()}
+
+
+@router.get("/health/live")
+async def liveness_check():
+    """存活检查：进程能响应即可（供平台判断是否重启）。"""
+    return {"status": "alive"}
+
+
+@router.get("/health/ready")
+async def readiness_check():
+    """
+    就绪检查：数据库连接池、线程池排队、进行中的上游爬取任一饱和时返回 503，
+    负载均衡据此暂时摘掉本实例；明细里另附预热进度与上游错误率。
+    """
+    report = await readiness_report()
+    body = {"status": "ready" if report["ready"] else "not_ready", **report}
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=body)
 
 
 @router.get("/proxy/image")
-async def proxy_image(url: str = Query(..., description="图片URL")):
+async def proxy_image(
+    request: Request,
+    url: str = Query(..., description="图片URL"),
+    w: Optional[int] = Query(None, ge=16, le=2000, description="缩略图宽度（就近取档，按 Accept 转 AVIF/WebP）"),
+):
     """
     图片代理接口 - 解决外部图床的CORS问题
 
-    通过后端转发外部图片，避免浏览器CORS限制
+    通过后端转发外部图片，避免浏览器CORS限制。
+    原图落磁盘 LRU 缓存：命中直接发文件，未命中流式回源并同时写缓存（见 image_proxy）。
+    带 w 时返回缩放 + 转码后的缩略图（见 thumbnail_service）。
 
     Args:
         url: 要代理的图片URL
+        w: 缩略图宽度（可选）
 
     Returns:
         图片二进制数据
     """
     try:
-        # 只允许代理特定域名的图片（安全考虑）
-        allowed_domains = {
-            'sinaimg.cn',
-            'jjwxc.net',
-            'bmp.ovh',
-            'loli.net',
-            'jd.com',
-            'huluxia.com',
-            'bdstatic.com',
-        }
-
-        parsed = urlparse(url)
-        # 必须是 http/https 且 netloc 非空，防止 file:// 等协议
-        if parsed.scheme not in ('http', 'https') or not parsed.netloc:
-            raise HTTPException(status_code=403, detail="不支持的图片URL格式")
-        # 用 netloc（hostname）校验，防止路径伪装绕过（如 evil.com/jjwxc.net/img）
-        hostname = parsed.hostname or ''
-        if not any(hostname == d or hostname.endswith('.' + d) for d in allowed_domains):
-            raise HTTPException(status_code=403, detail="不支持的图片域名")
-
-        # 请求外部图片
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate',
-            'Referer': 'https://www.jjwxc.net/',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        }
+        validate_image_url(url)
+    except ValueError as e:
+        raise HTTPException(status_code=403, detail=str(e))
 
-        response = requests.get(url, headers=headers, timeout=10, allow_redirects=True)
-        response.raise_for_status()
-
-        # 返回图片
-        return Response(
-            content=response.content,
-            media_type=response.headers.get('Content-Type', 'image/jpeg'),
-            headers={
-                'Cache-Control': 'public, max-age=86400',  # 缓存1天
-                'Access-Control-Allow-Origin': '*'  # 允许跨域
-            }
-        )
+    try:
+        if w:
+            return await get_thumbnail_response(url, w, request.headers.get("accept", ""))
+        return await get_image_response(url)
 
-    except requests.RequestException as e:
-        logger.error(f"图片代理失败: {url}, 错误: {str(e)}")
+    except ImageFetchError as e:
+        logger.warning(f"图片代理失败: {e}", extra={"phase": "image_proxy", "url": url})
         raise HTTPException(status_code=404, detail="图片加载失败")
 
-    except Exception as e:
-        logger.error(f"图片代理错误: {str(e)}")
+    except Exception:
+        logger.exception("图片代理错误", extra={"phase": "image_proxy", "url": url})
         raise HTTPException(status_code=500, detail="服务器错误")
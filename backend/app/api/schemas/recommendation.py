@@ -36,6 +36,21 @@ class TargetNovel(BaseModel):
     tags: Optional[str] = Field(None, description="标签")
 
 
+class BatchRecommendationRequest(BaseModel):
+    """批量推荐请求"""
+    book_ids: List[int] = Field(..., min_length=1, max_length=50, description="目标小说ID列表")
+    limit: int = Field(default=10, ge=1, le=50, description="每本书的推荐数量")
+    merge: bool = Field(default=False, description="是否额外返回合并去重后的整体排行")
+    compact: bool = Field(default=False, description="只返回列表视图所需字段（不含简介、角色等大字段）")
+
+
+class ShelfRecommendationRequest(BaseModel):
+    """书架推荐请求（多本种子书）"""
+    book_ids: List[int] = Field(..., min_length=1, max_length=100, description="种子小说ID列表")
+    limit: int = Field(default=10, ge=1, le=50, description="推荐数量")
+    compact: bool = Field(default=False, description="只返回列表视图所需字段（不含简介、角色等大字段）")
+
+
 class RecommendationResponse(BaseModel):
     """推荐响应"""
     success: bool = Field(default=True, description="请求是否成功")
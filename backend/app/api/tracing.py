@@ -0,0 +1,56 @@
+"""
+请求追踪中间件：为每个请求开根 span，按需加 Server-Timing 头、保存被采样请求的 span 树
+
+- 既没开 TRACE_SERVER_TIMING、又没被采样的请求直接透传，不建追踪
+- 请求头 X-Trace: 1 且 X-Admin-Token 正确时强制采样并返回 Server-Timing（排查线上单个慢请求用）；
+  Server-Timing 暴露内部 span 名和 SQL / 上游耗时，强制采样还会挤掉缓冲区里的正常样本，所以只对管理员开放
+- 被采样的请求响应带 X-Trace-Id，可用 /api/traces/{trace_id}（需管理员令牌）取完整 span 树
+- 根 span 在 BackgroundTasks 跑完后才结束，后台补全的 span 也记在同一棵树里；
+  Server-Timing 在响应头发出时生成，只含此前已结束的 span
+"""
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import TRACE_SERVER_TIMING
+from ..utils.profiling import check_admin_token
+from ..utils.tracing import finish_trace, should_sample, start_trace
+
+
+class TracingMiddleware:
+    def __init__(self, app: ASGIApp, server_timing: bool = TRACE_SERVER_TIMING) -> None:
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        forced = headers.get("x-trace") == "1" and check_admin_token(headers.get("x-admin-token"))
+        sampled = should_sample(forced)
+        server_timing = self.server_timing or forced
+        if not (sampled or server_timing):
+            await self.app(scope, receive, send)
+            return
+
+        root, token = start_trace(f"{scope['method']} {scope['path']}", sampled, method=scope["method"])
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                root.set("status", message["status"])
+                headers = MutableHeaders(scope=message)
+                if server_timing:
+                    headers.append("Server-Timing", root.trace.server_timing())
+                if sampled:
+                    headers["X-Trace-Id"] = root.trace.trace_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"{scope['method']} {route.path}"
+                root.set("path", scope["path"])
+            finish_trace(root, token)
@@ -6,13 +6,19 @@ from pathlib import Path
 
 # 项目根目录
 BASE_DIR = Path(__file__).parent.parent.parent
+# 运行时生成的数据（图片缓存、热门请求列表等）默认放这里，不落在源码树里；同一台机器上的
+# 多个部署应各用各的 DATA_DIR
+DATA_DIR = os.environ.get("DATA_DIR", os.path.join(BASE_DIR, "data"))
 
 # ── 数据库 ──────────────────────────────────────────────────────
 # 生产环境设置 DATABASE_URL（PostgreSQL），本地开发回退到 SQLite
 DATABASE_URL = os.environ.get("DATABASE_URL")
 
-# 本地 SQLite 回退路径（仅开发用）
-SQLITE_PATH = os.path.join(BASE_DIR, "jinjiang_novels.db")
+# 本地 SQLite 回退路径（仅开发用；基准测试等指向单独的库文件时用环境变量覆盖）
+SQLITE_PATH = os.environ.get("SQLITE_PATH", os.path.join(BASE_DIR, "jinjiang_novels.db"))
+
+# PostgreSQL 连接池上限（池满时取连接直接报错，就绪检查据此摘流量）
+DB_POOL_MAX_CONN = int(os.environ.get("DB_POOL_MAX_CONN", 10))
 
 # ── API ──────────────────────────────────────────────────────────
 API_HOST = "0.0.0.0"
@@ -38,7 +44,165 @@ RECOMMENDATION_WEIGHTS = {
     "author": 0.10,
 }
 
+# ── 近似近邻召回（MinHash LSH）────────────────────────────────────
+# 签名长度 = ANN_BANDS × 每段行数；64 位 / 32 段（每段 2 位）时，
+# 加权 Jaccard ≈ 0.18 的两本书有一半概率被召回，≥ 0.4 的基本必中
+ANN_NUM_PERM = int(os.environ.get("ANN_NUM_PERM", 64))
+ANN_BANDS = int(os.environ.get("ANN_BANDS", 32))
+# 启动时是否预建 ANN 索引（关闭则在第一次 mode=ann 请求时懒加载）
+ANN_BUILD_ON_STARTUP = os.environ.get("ANN_BUILD_ON_STARTUP", "1") == "1"
+# 目录快照：非空时 ANN 索引（标签矩阵、作者列、IDF 向量、LSH 表）编码进这个文件，由调度 worker 生成，
+# 各 worker 只读 mmap 共用，启动只需映射、内存不随 worker 数增长；为空时每个进程在内存里各建一份。
+# 多 worker（WEB_CONCURRENCY > 1，gunicorn.conf.py 会写回实际 worker 数）时默认放在 DATA_DIR 下
+CATALOG_SNAPSHOT_PATH = os.environ.get(
+    "CATALOG_SNAPSHOT_PATH",
+    os.path.join(DATA_DIR, "catalog.snap") if int(os.environ.get("WEB_CONCURRENCY", 1)) > 1 else "")
+# 调度 worker 每隔多久（秒）检查目录是否变化，变了就重建快照并原子替换（0 = 只在启动时建）
+CATALOG_SNAPSHOT_INTERVAL = int(os.environ.get("CATALOG_SNAPSHOT_INTERVAL", 600))
+# 各 worker 最多隔多久（秒）检查一次快照文件是否已被替换
+CATALOG_SNAPSHOT_CHECK_INTERVAL = float(os.environ.get("CATALOG_SNAPSHOT_CHECK_INTERVAL", 5))
+
 # ── 爬虫 ─────────────────────────────────────────────────────────
 CRAWLER_DELAY_MIN = 2.0
 CRAWLER_DELAY_MAX = 3.0
 CRAWLER_TIMEOUT = 15
+
+# ── 原始响应归档 ─────────────────────────────────────────────────
+# 设置后爬虫把每次请求的原始响应（详情页 HTML / 移动端 JSON）内容寻址压缩存到该目录，
+# 可用 scripts/reparse_archive.py 离线重建 book / chapter；不设置则不归档
+RAW_ARCHIVE_DIR = os.environ.get("RAW_ARCHIVE_DIR") or None
+
+# ── 统计数据刷新 ─────────────────────────────────────────────────
+# 刷新调度按「陈旧度 × 热度」挑书，每轮最多发 STATS_REFRESH_BUDGET 个上游请求；
+# STATS_REFRESH_INTERVAL 秒跑一轮（0 = 不在 API 进程内跑，改用 scripts/refresh_stats.py 定时任务）
+STATS_REFRESH_BUDGET = int(os.environ.get("STATS_REFRESH_BUDGET", 200))
+STATS_REFRESH_INTERVAL = int(os.environ.get("STATS_REFRESH_INTERVAL", 0))
+# 距上次抓取不足该小时数的书不进刷新队列；超过 STATS_MAX_AGE_HOURS 视为已过期、优先级封顶
+STATS_MIN_AGE_HOURS = float(os.environ.get("STATS_MIN_AGE_HOURS", 12))
+STATS_MAX_AGE_HOURS = float(os.environ.get("STATS_MAX_AGE_HOURS", 24 * 7))
+
+# ── 目录发现 ─────────────────────────────────────────────────────
+# 榜单/列表页（逗号分隔），页面上的 onebook.php?novelid= 链接会进入发现队列
+DISCOVERY_RANKING_URLS = [
+    u.strip() for u in os.environ.get(
+        "DISCOVERY_RANKING_URLS",
+        "https://www.jjwxc.net/topten.php?orderstr=7&t=0,"
+        "https://www.jjwxc.net/topten.php?orderstr=4&t=0,"
+        "https://www.jjwxc.net/topten.php?orderstr=5&t=0",
+    ).split(",") if u.strip()
+]
+# novelbasicinfo 按 id 区间扫描的范围，每次向队列补 DISCOVERY_ID_BATCH 个 id
+DISCOVERY_ID_START = int(os.environ.get("DISCOVERY_ID_START", 1))
+DISCOVERY_ID_END = int(os.environ.get("DISCOVERY_ID_END", 10_000_000))
+DISCOVERY_ID_BATCH = int(os.environ.get("DISCOVERY_ID_BATCH", 500))
+# 进程内发现任务：每 DISCOVERY_INTERVAL 秒一轮、每轮最多 DISCOVERY_BUDGET 个请求（0 = 不在 API 进程内跑）
+DISCOVERY_INTERVAL = int(os.environ.get("DISCOVERY_INTERVAL", 0))
+DISCOVERY_BUDGET = int(os.environ.get("DISCOVERY_BUDGET", 300))
+
+# ── 上游地址 ─────────────────────────────────────────────────────
+# 压测 / 本地联调时把爬虫指向假上游（scripts/fake_upstream.py），生产保持默认
+JJWXC_WEB_BASE = os.environ.get("JJWXC_WEB_BASE", "https://www.jjwxc.net").rstrip("/")
+JJWXC_APP_BASE = os.environ.get("JJWXC_APP_BASE", "https://app.jjwxc.org").rstrip("/")
+# 非空时图片代理改向这里回源（保留原图 URL 的路径和查询串），白名单和缓存键仍按原 URL
+IMAGE_UPSTREAM_BASE = os.environ.get("IMAGE_UPSTREAM_BASE", "").rstrip("/")
+# 按主机限速间隔的倍率：只在压测假上游时调小（0 = 不限速），对真实晋江必须保持 1
+CRAWL_DELAY_SCALE = float(os.environ.get("CRAWL_DELAY_SCALE", 1.0))
+
+# ── 图片代理缓存 ─────────────────────────────────────────────────
+# 封面原图（及缩略图）的磁盘缓存目录与总大小上限（字节），超出按最近访问时间淘汰
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join(DATA_DIR, "image_cache"))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# 缩略图：允许的宽度档位（?w= 就近向上取档，避免任意宽度撑爆缓存）与编码进程数
+THUMBNAIL_WIDTHS = tuple(int(w) for w in os.environ.get("THUMBNAIL_WIDTHS", "120,240,360,480").split(","))
+THUMBNAIL_WORKERS = int(os.environ.get("THUMBNAIL_WORKERS", 2))
+
+# ── 响应压缩 ─────────────────────────────────────────────────────
+# 响应体不小于该字节数时按 Accept-Encoding 压缩（br 需安装 brotli，否则只用 gzip）
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", 1024))
+# 动态响应每次都要现压：gzip 6 / brotli 4 是压缩率和 CPU 的折中点
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", 4))
+
+# ── 试读章节响应缓存 ─────────────────────────────────────────────
+# 预压缩好的试读响应体在进程内保留的本数（LRU）
+CHAPTER_PAYLOAD_CACHE_SIZE = int(os.environ.get("CHAPTER_PAYLOAD_CACHE_SIZE", 256))
+# 进程内缓存的响应体最多用多久（秒）就回库里核对一次 ETag：其他 worker 或 scripts/reparse_archive.py
+# 改写了章节时，本进程最迟这么久后换成新内容
+CHAPTER_PAYLOAD_REVALIDATE_INTERVAL = float(os.environ.get("CHAPTER_PAYLOAD_REVALIDATE_INTERVAL", 30))
+# 浏览器 / CDN 缓存时长（秒）；过期后带 If-None-Match 回源，内容没变只回 304
+CHAPTER_CACHE_MAX_AGE = int(os.environ.get("CHAPTER_CACHE_MAX_AGE", 3600))
+
+# ── 试读章节预取 ─────────────────────────────────────────────────
+# 推荐结果返回后，为排名前 PREFETCH_TOP_N 本还没有试读章节的书在后台预先爬好（0 = 关闭）
+PREFETCH_TOP_N = int(os.environ.get("PREFETCH_TOP_N", 3))
+# 全局预算：每小时最多预取这么多本（每本约 4 个上游请求），以及待预取队列长度上限
+PREFETCH_BUDGET_PER_HOUR = int(os.environ.get("PREFETCH_BUDGET_PER_HOUR", 120))
+PREFETCH_QUEUE_SIZE = int(os.environ.get("PREFETCH_QUEUE_SIZE", 100))
+
+# ── 启动预热 ─────────────────────────────────────────────────────
+# 启动后在后台线程里加载标签 IDF，并为最多 WARMUP_TOP_N 本书预算推荐（0 = 不预热）：
+# 优先用上个进程退出时保存的热门请求列表（WARMUP_HOT_KEYS_PATH），没有则取收藏量最高的书
+WARMUP_TOP_N = int(os.environ.get("WARMUP_TOP_N", 200))
+WARMUP_LIMIT = int(os.environ.get("WARMUP_LIMIT", 10))
+# 多 worker 部署时只由持有调度锁的 worker 写盘（各 worker 分到的流量大致均匀，单个 worker 的热门排序已有代表性）
+WARMUP_HOT_KEYS_PATH = os.environ.get("WARMUP_HOT_KEYS_PATH", os.path.join(DATA_DIR, "hot_keys.json"))
+
+# ── 就绪检查 ─────────────────────────────────────────────────────
+# asyncio.to_thread 用的默认线程池大小（同 Python 默认值，显式创建以便观测排队深度）
+TO_THREAD_WORKERS = int(os.environ.get("TO_THREAD_WORKERS", min(32, (os.cpu_count() or 1) + 4)))
+# 超过任一阈值时 /api/health/ready 返回 503，负载均衡先摘掉本实例，等排队消化后再恢复
+READY_MAX_POOL_USAGE = float(os.environ.get("READY_MAX_POOL_USAGE", 0.9))    # 连接池占用比例
+READY_MAX_THREAD_QUEUE = int(os.environ.get("READY_MAX_THREAD_QUEUE", 10))   # 线程池排队任务数
+READY_MAX_INFLIGHT_CRAWLS = int(os.environ.get(                             # 进行中 + 排队限速的上游请求
+    "READY_MAX_INFLIGHT_CRAWLS", max(4, TO_THREAD_WORKERS // 2)))
+
+# ── 请求追踪 ─────────────────────────────────────────────────────
+# 进程内 span 追踪（route → service → DB → 上游请求），不依赖外部采集器
+# 响应带 Server-Timing 头（浏览器开发者工具 Timing 面板可直接看）；对外暴露内部耗时，默认关闭
+TRACE_SERVER_TIMING = os.environ.get("TRACE_SERVER_TIMING", "0") == "1"
+# 采样比例：被采样的请求保留完整 span 树，/api/traces 可查（需管理员令牌）；
+# 请求头 X-Trace: 1 加正确的 X-Admin-Token 强制采样
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", 0.01))
+TRACE_BUFFER_SIZE = int(os.environ.get("TRACE_BUFFER_SIZE", 100))
+# 非空时被采样请求的 span 树同时由后台线程逐行追加写入该 JSONL 文件；
+# 文件超过 TRACE_DUMP_MAX_BYTES 时改名为 <路径>.1（覆盖上一份）后重新开始
+TRACE_DUMP_PATH = os.environ.get("TRACE_DUMP_PATH", "")
+TRACE_DUMP_MAX_BYTES = int(os.environ.get("TRACE_DUMP_MAX_BYTES", 50 * 1024 * 1024))
+
+# ── 性能剖析 ─────────────────────────────────────────────────────
+# 管理员令牌（请求头 X-Admin-Token）；为空时追踪查询接口（/api/traces）、剖析接口和 X-Profile 请求头全部关闭
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN", "")
+# 常驻栈采样频率（Hz，0 = 关闭）：1~5 Hz 开销可忽略，可长期开着积累线上热点
+PROFILE_CONTINUOUS_HZ = float(os.environ.get("PROFILE_CONTINUOUS_HZ", 0))
+# 按需采样（/api/admin/profile）的默认频率与时长上限
+PROFILE_DEFAULT_HZ = float(os.environ.get("PROFILE_DEFAULT_HZ", 100))
+PROFILE_MAX_SECONDS = int(os.environ.get("PROFILE_MAX_SECONDS", 60))
+# 保留最近多少份单请求 cProfile 结果（请求头 X-Profile: 1）
+PROFILE_BUFFER_SIZE = int(os.environ.get("PROFILE_BUFFER_SIZE", 20))
+
+# ── 日志 ─────────────────────────────────────────────────────────
+# 日志经有界队列交给后台线程写 stdout，业务线程不在输出流的锁上排队
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# json：每行一条结构化记录（带 request_id / book_id / phase / duration_ms），便于采集过滤；text：本地开发可读格式
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+# 队列满时直接丢弃新日志并计数（novelmind_log_records_dropped_total），不阻塞请求
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+# 高频日志（如逐本封面补全成功）每 N 条只输出 1 条，记录里带 sampled=N
+LOG_SAMPLE_EVERY = int(os.environ.get("LOG_SAMPLE_EVERY", 50))
+
+# ── 多进程部署 ───────────────────────────────────────────────────
+# gunicorn.conf.py 按 WEB_CONCURRENCY 起多个 uvicorn worker 进程；每个进程的推荐 / IDF 缓存各自独立，
+# 共享缓存层让一个 worker 算过的结果其他 worker 直接取用，并把 invalidate 广播到所有进程
+# 后端：sqlite（默认）= DATA_DIR 下的共享文件，同一实例上的 worker 和命令行脚本（目录发现、统计刷新等）共用，
+# 脚本里的 invalidate 也能传到 worker；redis = Redis 兼容服务（需安装 redis 包，多实例也能共享）；
+# none = 关闭，只用进程内缓存。条目按数据库区分，指向别的库的进程（基准测试等）不会读到这里的结果
+SHARED_CACHE_BACKEND = os.environ.get("SHARED_CACHE_BACKEND", "sqlite").lower()
+SHARED_CACHE_PATH = os.environ.get("SHARED_CACHE_PATH", os.path.join(DATA_DIR, "shared_cache.db"))
+SHARED_CACHE_REDIS_URL = os.environ.get("SHARED_CACHE_REDIS_URL", "redis://localhost:6379/0")
+# SQLite 共享层的条目上限（超出后按过期时间淘汰最旧的）
+SHARED_CACHE_MAX_ENTRIES = int(os.environ.get("SHARED_CACHE_MAX_ENTRIES", 20000))
+# 每个 worker 最多隔多久（秒）读一次共享失效代数；其他进程 invalidate 后，最迟这么久本进程缓存随之清空
+SHARED_CACHE_SYNC_INTERVAL = float(os.environ.get("SHARED_CACHE_SYNC_INTERVAL", 1.0))
+# 后台调度（统计刷新、目录发现）只在拿到这把文件锁的 worker 里运行，避免按 worker 数成倍请求上游；
+# 为空时不加锁，每个进程都运行
+SCHEDULER_LOCK_PATH = os.environ.get("SCHEDULER_LOCK_PATH", os.path.join(DATA_DIR, "scheduler.lock"))
@@ -3,27 +3,57 @@
 - 生产环境（DATABASE_URL 已设置）：PostgreSQL via psycopg2 连接池
 - 本地开发（无 DATABASE_URL）：SQLite 回退
 """
+import logging
 import os
+import threading
 from contextlib import contextmanager
-from typing import Generator
+from typing import Dict, Generator
 
-from ..config import DATABASE_URL, SQLITE_PATH
+from ..config import DATABASE_URL, SQLITE_PATH, DB_POOL_MAX_CONN
+
+logger = logging.getLogger(__name__)
 
 # ── PostgreSQL 连接池（仅生产环境）─────────────────────────────
 _pg_pool = None
 
+# 连接占用统计（就绪检查用）：当前借出的连接数、因池满取不到连接的累计次数
+_usage_lock = threading.Lock()
+_in_use = 0
+_exhausted_total = 0
+
+
 def _get_pg_pool():
     global _pg_pool
     if _pg_pool is None:
         import psycopg2.pool
         _pg_pool = psycopg2.pool.ThreadedConnectionPool(
             minconn=1,
-            maxconn=10,
+            maxconn=DB_POOL_MAX_CONN,
             dsn=DATABASE_URL,
         )
     return _pg_pool
 
 
+def _track_usage(delta: int) -> None:
+    global _in_use
+    with _usage_lock:
+        _in_use += delta
+
+
+def db_pool_stats() -> Dict:
+    """连接占用：backend / in_use / max（SQLite 无连接池上限，为 None）/ usage / exhausted_total。"""
+    with _usage_lock:
+        in_use, exhausted = _in_use, _exhausted_total
+    max_conn = DB_POOL_MAX_CONN if DATABASE_URL else None
+    return {
+        "backend": "postgresql" if DATABASE_URL else "sqlite",
+        "in_use": in_use,
+        "max": max_conn,
+        "usage": round(in_use / max_conn, 3) if max_conn else None,
+        "exhausted_total": exhausted,
+    }
+
+
 # ── 统一上下文管理器 ───────────────────────────────────────────
 @contextmanager
 def get_db_connection() -> Generator:
@@ -36,8 +66,16 @@ def get_db_connection() -> Generator:
 
 def _pg_connection():
     """纯生成器（勿加 @contextmanager），供 get_db_connection 用 yield from 委托。"""
+    global _exhausted_total
+    import psycopg2.pool
     pool = _get_pg_pool()
-    conn = pool.getconn()
+    try:
+        conn = pool.getconn()
+    except psycopg2.pool.PoolError:
+        with _usage_lock:
+            _exhausted_total += 1
+        raise
+    _track_usage(1)
     try:
         yield _PgConnWrapper(conn)
         conn.commit()
@@ -46,6 +84,7 @@ def _pg_connection():
         raise
     finally:
         pool.putconn(conn)
+        _track_usage(-1)
 
 
 def _sqlite_connection():
@@ -53,6 +92,7 @@ def _sqlite_connection():
     import sqlite3
     conn = sqlite3.connect(SQLITE_PATH)
     conn.row_factory = sqlite3.Row
+    _track_usage(1)
     try:
         yield conn
         conn.commit()
@@ -61,6 +101,7 @@ def _sqlite_connection():
         raise
     finally:
         conn.close()
+        _track_usage(-1)
 
 
 class _PgConnWrapper:
@@ -172,6 +213,128 @@ CREATE TABLE IF NOT EXISTS chapter (
 );
 """
 
+# 标签规范化：tag 字典表 + book_tag 关联表。
+# book.tags 仍保留原始空格分隔串（打分/展示用），成员查询与 IDF 统计走关联表，
+# 「含某标签的书」「每个标签的文档频率」都变成 idx_book_tag_tag 上的索引扫描。
+_CREATE_TAG_PG = """
+CREATE TABLE IF NOT EXISTS tag (
+    tag_id  SERIAL PRIMARY KEY,
+    name    TEXT NOT NULL UNIQUE
+);
+"""
+
+_CREATE_TAG_SQLITE = """
+CREATE TABLE IF NOT EXISTS tag (
+    tag_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+    name    TEXT NOT NULL UNIQUE
+);
+"""
+
+_CREATE_BOOK_TAG_PG = """
+CREATE TABLE IF NOT EXISTS book_tag (
+    book_id BIGINT NOT NULL,
+    tag_id  INTEGER NOT NULL,
+    PRIMARY KEY (book_id, tag_id)
+);
+"""
+
+_CREATE_BOOK_TAG_SQLITE = """
+CREATE TABLE IF NOT EXISTS book_tag (
+    book_id INTEGER NOT NULL,
+    tag_id  INTEGER NOT NULL,
+    PRIMARY KEY (book_id, tag_id)
+);
+"""
+
+# 抓取新鲜度：每本书每类上游响应（detail 详情页 / basicinfo 移动端统计）一行，
+# 记上次的 ETag / Last-Modified / 响应体哈希，供条件请求判断「没变就跳过解析和写库」；
+# last_fetched / last_changed 为 Unix 时间戳，刷新调度按它算陈旧度
+_CREATE_FETCH_STATE_PG = """
+CREATE TABLE IF NOT EXISTS fetch_state (
+    book_id         BIGINT NOT NULL,
+    kind            TEXT NOT NULL,
+    etag            TEXT,
+    last_modified   TEXT,
+    content_hash    TEXT,
+    last_fetched    DOUBLE PRECISION,
+    last_changed    DOUBLE PRECISION,
+    PRIMARY KEY (book_id, kind)
+);
+"""
+
+_CREATE_FETCH_STATE_SQLITE = """
+CREATE TABLE IF NOT EXISTS fetch_state (
+    book_id         INTEGER NOT NULL,
+    kind            TEXT NOT NULL,
+    etag            TEXT,
+    last_modified   TEXT,
+    content_hash    TEXT,
+    last_fetched    REAL,
+    last_changed    REAL,
+    PRIMARY KEY (book_id, kind)
+);
+"""
+
+# 目录发现：待抓取 id 的去重队列（status: pending / done / missing / failed）
+# 与各发现源的断点（如 id 区间扫到哪了），进程重启后从断点续跑
+_CREATE_DISCOVERY_PG = """
+CREATE TABLE IF NOT EXISTS discovery_frontier (
+    book_id     BIGINT PRIMARY KEY,
+    source      TEXT NOT NULL,
+    priority    REAL NOT NULL DEFAULT 0,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    last_error  TEXT,
+    enqueued_at DOUBLE PRECISION,
+    updated_at  DOUBLE PRECISION
+);
+CREATE TABLE IF NOT EXISTS discovery_checkpoint (
+    source      TEXT PRIMARY KEY,
+    position    TEXT,
+    updated_at  DOUBLE PRECISION
+);
+"""
+
+_CREATE_DISCOVERY_SQLITE = """
+CREATE TABLE IF NOT EXISTS discovery_frontier (
+    book_id     INTEGER PRIMARY KEY,
+    source      TEXT NOT NULL,
+    priority    REAL NOT NULL DEFAULT 0,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    last_error  TEXT,
+    enqueued_at REAL,
+    updated_at  REAL
+);
+CREATE TABLE IF NOT EXISTS discovery_checkpoint (
+    source      TEXT PRIMARY KEY,
+    position    TEXT,
+    updated_at  REAL
+);
+"""
+
+# 试读接口的预压缩响应体：每本书一行，存整份 JSON 响应的 gzip 字节与强 ETag（JSON 的哈希）。
+# 章节写入时删掉对应行，下次请求重新生成
+_CREATE_CHAPTER_PAYLOAD_PG = """
+CREATE TABLE IF NOT EXISTS chapter_payload (
+    book_id     BIGINT PRIMARY KEY,
+    etag        TEXT NOT NULL,
+    body_gzip   BYTEA NOT NULL,
+    raw_size    INTEGER NOT NULL,
+    created_at  DOUBLE PRECISION
+);
+"""
+
+_CREATE_CHAPTER_PAYLOAD_SQLITE = """
+CREATE TABLE IF NOT EXISTS chapter_payload (
+    book_id     INTEGER PRIMARY KEY,
+    etag        TEXT NOT NULL,
+    body_gzip   BLOB NOT NULL,
+    raw_size    INTEGER NOT NULL,
+    created_at  REAL
+);
+"""
+
 # 对已存在的旧库做增量迁移（新加的列）。SQLite 无 IF NOT EXISTS，靠 try/except 容错。
 _MIGRATION_COLUMNS = [
     ("book", "intro_short", "TEXT"),
@@ -181,8 +344,12 @@ _MIGRATION_COLUMNS = [
 
 _INDEXES = [
     ("idx_book_title",  "CREATE INDEX IF NOT EXISTS idx_book_title  ON book(title)"),
-    ("idx_book_tags",   "CREATE INDEX IF NOT EXISTS idx_book_tags   ON book(tags)"),
     ("idx_book_author", "CREATE INDEX IF NOT EXISTS idx_book_author ON book(author)"),
+    # (tag_id, book_id) 覆盖索引：按标签找书、GROUP BY tag_id 统计 DF 都是 index-only
+    ("idx_book_tag_tag", "CREATE INDEX IF NOT EXISTS idx_book_tag_tag ON book_tag(tag_id, book_id)"),
+    # 目录发现按优先级领取待抓 id
+    ("idx_frontier_pending",
+     "CREATE INDEX IF NOT EXISTS idx_frontier_pending ON discovery_frontier(status, priority, enqueued_at)"),
 ]
 
 
@@ -193,10 +360,17 @@ def init_db_indexes():
         try:
             cursor.execute(_CREATE_TABLE_PG if DATABASE_URL else _CREATE_TABLE_SQLITE)
             cursor.execute(_CREATE_CHAPTER_PG if DATABASE_URL else _CREATE_CHAPTER_SQLITE)
+            cursor.execute(_CREATE_CHAPTER_PAYLOAD_PG if DATABASE_URL else _CREATE_CHAPTER_PAYLOAD_SQLITE)
+            cursor.execute(_CREATE_TAG_PG if DATABASE_URL else _CREATE_TAG_SQLITE)
+            cursor.execute(_CREATE_BOOK_TAG_PG if DATABASE_URL else _CREATE_BOOK_TAG_SQLITE)
+            cursor.execute(_CREATE_FETCH_STATE_PG if DATABASE_URL else _CREATE_FETCH_STATE_SQLITE)
+            for sql in (_CREATE_DISCOVERY_PG if DATABASE_URL else _CREATE_DISCOVERY_SQLITE).split(";"):
+                if sql.strip():
+                    cursor.execute(sql)
             for _, sql in _INDEXES:
                 cursor.execute(sql)
         except Exception as e:
-            print(f"数据库初始化失败: {e}")
+            logger.error(f"数据库初始化失败: {e}", extra={"phase": "init_db"})
 
         # 旧库增量迁移：逐列尝试添加，已存在则忽略
         for table, col, coltype in _MIGRATION_COLUMNS:
@@ -2,31 +2,107 @@
 FastAPI 主程序入口
 NovelMind 晋江小说推荐系统后端
 """
+import asyncio
+import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
 import logging
 
+from .api.compression import CompressionMiddleware
+from .api.metrics import MetricsMiddleware
+from .api.profiling import ProfilingMiddleware
+from .api.request_id import RequestIdMiddleware
+from .api.tracing import TracingMiddleware
 from .api.routes import novels
 from .database.connection import init_db_indexes
-from .config import CORS_ORIGINS
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from .services.ann_service import load_ann_index, start_snapshot_builder, stop_snapshot_builder
+from .services.freshness_service import start_refresh_scheduler, stop_refresh_scheduler
+from .services.discovery_service import start_discovery_scheduler, stop_discovery_scheduler
+from .services.image_proxy import get_image_client, close_image_client
+from .services.novel_service import backfill_book_tags_if_empty
+from .services.recommendation_service import invalidate_recommendation_cache
+from .services.thumbnail_service import shutdown_thumbnail_pool
+from .services.prefetch_service import start_prefetch_worker, stop_prefetch_worker
+from .services.warmup_service import start_warmup, stop_warmup, save_hot_keys
+from .services.health_service import install_thread_pool
+from .utils.log import setup_logging
+from .utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
+from .utils.profiling import start_continuous_profiler, stop_continuous_profiler
+from .utils.scheduler_lock import acquire_scheduler_lock, release_scheduler_lock
+from .config import (
+    CORS_ORIGINS, ANN_BUILD_ON_STARTUP, STATS_REFRESH_INTERVAL, DISCOVERY_INTERVAL, PREFETCH_TOP_N,
+    WARMUP_TOP_N, PROFILE_CONTINUOUS_HZ, CATALOG_SNAPSHOT_INTERVAL,
 )
+
+# 配置日志：队列 + 后台线程写出（LOG_FORMAT=json 时为结构化记录，见 utils/log.py）
+setup_logging()
 logger = logging.getLogger(__name__)
 
+# orjson 序列化推荐列表 / 章节正文比标准库 json 快数倍；未安装时退回 JSONResponse
+try:
+    import orjson  # noqa: F401
+    DefaultResponse = ORJSONResponse
+except ImportError:
+    DefaultResponse = JSONResponse
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("=" * 60)
     logger.info("NovelMind API 启动成功!")
     logger.info("API 文档: http://localhost:8000/docs")
+    install_thread_pool(asyncio.get_running_loop())
     init_db_indexes()
+    # 多 worker 部署时统计刷新、目录发现和目录快照生成只在持有调度锁的进程里运行
+    scheduler = acquire_scheduler_lock()
+    if scheduler:
+        # 标签关联表首次上线时回填（全表，放线程里、只在调度 worker 做一次）；
+        # 其他 worker 可能已按空表算过 IDF，回填完让所有进程的缓存失效
+        backfilled = await asyncio.to_thread(backfill_book_tags_if_empty)
+        if backfilled:
+            invalidate_recommendation_cache()
+            logger.info(f"标签关联表回填完成: {backfilled} 本", extra={"phase": "init_db"})
+    if ANN_BUILD_ON_STARTUP:
+        count = await asyncio.to_thread(load_ann_index, scheduler)
+        if count:
+            logger.info(f"ANN 索引已就绪: {count} 本")
+        else:
+            logger.info("目录快照尚未生成，等调度 worker 建好后映射")
+    get_image_client()
+    # 推荐缓存预热放后台线程：不推迟启动，进度见 /api/health
+    if start_warmup():
+        logger.info(f"缓存预热已启动: 最多 {WARMUP_TOP_N} 本")
+    if scheduler:
+        if start_refresh_scheduler():
+            logger.info(f"统计刷新调度已启动: 每 {STATS_REFRESH_INTERVAL} 秒一轮")
+        if start_discovery_scheduler():
+            logger.info(f"目录发现已启动: 每 {DISCOVERY_INTERVAL} 秒一轮")
+        if start_snapshot_builder():
+            logger.info(f"目录快照定期重建已启动: 每 {CATALOG_SNAPSHOT_INTERVAL} 秒检查一次")
+    else:
+        logger.info("后台调度由其他 worker 运行", extra={"pid": os.getpid()})
+    if start_prefetch_worker():
+        logger.info(f"试读预取已启动: 推荐结果前 {PREFETCH_TOP_N} 本")
+    if start_continuous_profiler():
+        logger.info(f"常驻栈采样已启动: {PROFILE_CONTINUOUS_HZ} Hz")
     logger.info("=" * 60)
     yield
+    stop_continuous_profiler()
+    stop_refresh_scheduler()
+    stop_discovery_scheduler()
+    stop_snapshot_builder()
+    stop_prefetch_worker()
+    stop_warmup()
+    # 各 worker 写同一个文件会互相覆盖，只由调度 worker 保存
+    if scheduler:
+        saved = save_hot_keys()
+        if saved:
+            logger.info(f"热门请求列表已保存: {saved} 条")
+    release_scheduler_lock()
+    await close_image_client()
+    shutdown_thumbnail_pool()
     logger.info("NovelMind API 已关闭")
 
 
@@ -38,6 +114,7 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     lifespan=lifespan,
+    default_response_class=DefaultResponse,
 )
 
 # 配置CORS中间件（允许前端跨域访问）
@@ -49,6 +126,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 响应压缩（br / gzip 按 Accept-Encoding 协商，小响应和图片不压）
+app.add_middleware(CompressionMiddleware)
+
+# 单请求 cProfile（X-Profile: 1 + 管理员令牌，见 utils/profiling.py）
+app.add_middleware(ProfilingMiddleware)
+
+# 请求追踪（Server-Timing / 采样请求的 span 树，见 utils/tracing.py）
+app.add_middleware(TracingMiddleware)
+
+# 请求指标放在压缩和追踪外层：耗时包含压缩
+app.add_middleware(MetricsMiddleware)
+
+# 请求 ID：最外层设置，之后各层（含线程池和后台任务）的日志都带上
+app.add_middleware(RequestIdMiddleware)
+
 # 注册路由
 app.include_router(novels.router)
 
@@ -68,6 +160,12 @@ async def root():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 抓取端点（文本格式）"""
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
 
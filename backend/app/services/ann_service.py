@@ -0,0 +1,274 @@
+"""
+近似近邻（ANN）候选召回服务：标签加权 MinHash + LSH。
+
+精确召回（get_candidate_novels）对「正剧 / 甜文」这类宽泛标签几乎命中全表，
+ANN 模式改为只取与目标标签签名至少有一个 LSH 段相同的书（再加上同作者的书），
+候选集缩到与目标真正相近的一小撮，之后仍由精确打分器排序。
+
+- 启动时 load_ann_index() 建好索引；新书入库时 update_ann_index() 增量更新
+- 签名用建索引那一刻的 IDF 快照加权，增量更新沿用同一快照；IDF 漂移靠重建修正
+- 召回率可用 recommendation_service.evaluate_ann_recall / scripts/ann_recall.py 度量
+
+两种存放方式：
+- 进程内（默认）：每个进程全表扫描、在内存里建一份
+- 目录快照（配置 CATALOG_SNAPSHOT_PATH，多 worker 部署时默认开启，文件在 DATA_DIR 下）：调度 worker 把索引编码成文件
+  （见 catalog_snapshot.py），各 worker 只读 mmap 共用，启动只需映射文件；目录有变化时调度 worker
+  定期重建并原子替换，其他 worker 每 CATALOG_SNAPSHOT_CHECK_INTERVAL 秒检查一次、发现换了就改映射。
+  快照之后新入库 / 改了标签的书记在本进程的小索引（overlay）里，与快照结果合并
+"""
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from ..config import (
+    ANN_NUM_PERM,
+    ANN_BANDS,
+    CATALOG_SNAPSHOT_PATH,
+    CATALOG_SNAPSHOT_INTERVAL,
+    CATALOG_SNAPSHOT_CHECK_INTERVAL,
+)
+from ..database.connection import get_db_connection
+from ..utils.minhash import WeightedMinHash, MinHashLSH
+from ..utils.similarity import parse_tags
+from ..utils.tag_idf import get_tag_idf, get_default_idf
+from .catalog_snapshot import (
+    CatalogSnapshot,
+    SnapshotFormatError,
+    build_catalog_snapshot,
+    catalog_fingerprint,
+    open_catalog_snapshot,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _AnnIndex:
+    """一份进程内 ANN 索引：LSH 桶 + 同作者倒排；签名函数决定用哪一份 IDF 快照加权。"""
+
+    def __init__(self, signature: Callable[[Optional[str]], Tuple[int, ...]]):
+        self.signature = signature
+        self.lsh = MinHashLSH(bands=ANN_BANDS, rows=ANN_NUM_PERM // ANN_BANDS)
+        self.authors: Dict[str, Set[int]] = {}
+        self.book_authors: Dict[int, str] = {}
+        self.lock = threading.Lock()
+
+    def add(self, book_id: int, tags: Optional[str], author: Optional[str]) -> None:
+        sig = self.signature(tags)
+        with self.lock:
+            self.lsh.insert(book_id, sig)
+            old_author = self.book_authors.pop(book_id, None)
+            if old_author:
+                self.authors.get(old_author, set()).discard(book_id)
+            if author:
+                self.authors.setdefault(author, set()).add(book_id)
+                self.book_authors[book_id] = author
+
+    def query_signature(self, sig, author: Optional[str]) -> Set[int]:
+        with self.lock:
+            hits = self.lsh.query(sig)
+            if author:
+                hits |= self.authors.get(author, set())
+        return hits
+
+    def query(self, target_novel: Dict) -> Set[int]:
+        hits = self.query_signature(self.signature(target_novel.get("tags")), target_novel.get("author"))
+        hits.discard(target_novel["book_id"])
+        return hits
+
+
+def _idf_signature(tag_idf: Dict[str, float], default_idf: float):
+    hasher = WeightedMinHash(num_perm=ANN_NUM_PERM)
+
+    def signature(tags: Optional[str]):
+        return hasher.signature({t: tag_idf.get(t, default_idf) for t in parse_tags(tags)})
+    return signature
+
+
+_index: Optional[_AnnIndex] = None
+_build_lock = threading.Lock()
+
+# 已映射的快照及其 overlay，成对替换；_overlay_books 记 overlay 里各书的 (tags, author)，换快照时据此重放
+_mapped: Optional[Tuple[CatalogSnapshot, _AnnIndex]] = None
+_overlay_books: Dict[int, Tuple[Optional[str], Optional[str]]] = {}
+_swap_lock = threading.Lock()
+_checked_at = float("-inf")
+
+
+def _build_in_process() -> int:
+    global _index
+    with _build_lock:
+        index = _AnnIndex(_idf_signature(get_tag_idf(), get_default_idf()))
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT book_id, tags, author FROM book")
+            rows = [dict(row) for row in cursor.fetchall()]
+        for row in rows:
+            index.add(row["book_id"], row["tags"], row["author"])
+        _index = index
+    return len(rows)
+
+
+def _matches_snapshot(snapshot: CatalogSnapshot, book_id: int, tags: Optional[str], author: Optional[str]) -> bool:
+    entry = snapshot.book(book_id)
+    return entry is not None and entry == (set(parse_tags(tags)), author or None)
+
+
+def _use_snapshot(snapshot: CatalogSnapshot) -> None:
+    """切换到新映射的快照：overlay 里已被新快照收录（且内容一致）的书丢掉，其余重放进新 overlay。"""
+    global _mapped, _index
+    with _swap_lock:
+        overlay = _AnnIndex(snapshot.signature)
+        for book_id, (tags, author) in list(_overlay_books.items()):
+            if _matches_snapshot(snapshot, book_id, tags, author):
+                del _overlay_books[book_id]
+            else:
+                overlay.add(book_id, tags, author)
+        _mapped = (snapshot, overlay)
+        # 快照可用后不再需要进程内兜底索引
+        _index = None
+
+
+def _check_snapshot(force: bool = False) -> None:
+    """快照文件被替换（或首次出现）时改映射新文件；非 force 时按 CATALOG_SNAPSHOT_CHECK_INTERVAL 节流。"""
+    global _checked_at
+    now = time.monotonic()
+    if not force and now - _checked_at < CATALOG_SNAPSHOT_CHECK_INTERVAL:
+        return
+    _checked_at = now
+    try:
+        stat = os.stat(CATALOG_SNAPSHOT_PATH)
+    except FileNotFoundError:
+        return
+    mapped = _mapped
+    if mapped is not None and mapped[0].file_id == (stat.st_ino, stat.st_mtime_ns):
+        return
+    try:
+        snapshot = open_catalog_snapshot(CATALOG_SNAPSHOT_PATH)
+    except SnapshotFormatError as e:
+        logger.warning(f"目录快照不可用: {e}", extra={"phase": "ann_snapshot"})
+        return
+    if snapshot is not None:
+        _use_snapshot(snapshot)
+        logger.info("目录快照已映射", extra={"phase": "ann_snapshot", **snapshot.info()})
+
+
+def build_ann_index() -> int:
+    """
+    全量（重）建 ANN 索引，返回入索引的书数。
+
+    配置了 CATALOG_SNAPSHOT_PATH 时重建快照文件（原子替换）并映射；否则在进程内建好后原子替换旧索引。
+    """
+    if not CATALOG_SNAPSHOT_PATH:
+        return _build_in_process()
+    with _build_lock:
+        count = build_catalog_snapshot(CATALOG_SNAPSHOT_PATH)
+    _check_snapshot(force=True)
+    return count
+
+
+def load_ann_index(build: bool = True) -> int:
+    """
+    启动时准备 ANN 索引，返回可用的书数。
+
+    快照模式下先映射现有快照：build=True（调度 worker）且快照缺失、不兼容或目录已变化时重建；
+    build=False 时只映射，快照还没生成就返回 0，等调度 worker 建好后在查询时映射。
+    """
+    if not CATALOG_SNAPSHOT_PATH:
+        return _build_in_process()
+    _check_snapshot(force=True)
+    mapped = _mapped
+    if build and (mapped is None or mapped[0].fingerprint != catalog_fingerprint()):
+        return build_ann_index()
+    return len(mapped[0]) if mapped is not None else 0
+
+
+def _get_index() -> _AnnIndex:
+    if _index is None:
+        _build_in_process()
+    return _index
+
+
+def update_ann_index(novel: Dict) -> None:
+    """新书入库/更新后增量刷新该书的签名；索引尚未建立时什么都不做（首次使用时会全量建）。"""
+    book_id = novel.get("book_id")
+    if not book_id:
+        return
+    tags, author = novel.get("tags"), novel.get("author")
+    if _mapped is not None:
+        with _swap_lock:
+            snapshot, overlay = _mapped
+            # 统计刷新 / 目录发现会整批 upsert 已有的书，内容与快照一致的不必进 overlay
+            if _matches_snapshot(snapshot, book_id, tags, author):
+                _overlay_books.pop(book_id, None)
+                return
+            _overlay_books[book_id] = (tags, author)
+        overlay.add(book_id, tags, author)
+        return
+    index = _index
+    if index is None:
+        return
+    index.add(book_id, tags, author)
+
+
+def get_ann_candidate_ids(target_novel: Dict) -> List[int]:
+    """ANN 召回：与目标标签签名同桶、或同作者的书 id（不含目标本身）。"""
+    if CATALOG_SNAPSHOT_PATH:
+        # 还没映射到快照时每次都检查（stat 很便宜），尽早从进程内兜底索引切过去
+        _check_snapshot(force=_mapped is None)
+        mapped = _mapped
+        if mapped is not None:
+            snapshot, overlay = mapped
+            author = target_novel.get("author")
+            sig = snapshot.signature(target_novel.get("tags"))
+            hits = snapshot.query(sig, author) | overlay.query_signature(sig, author)
+            hits.discard(target_novel["book_id"])
+            return sorted(hits)
+        if _index is None:
+            # 只在真要建兜底索引时记一次；建好后的请求直接用它，不再每次告警
+            logger.warning("目录快照尚未生成，本进程临时在内存里建 ANN 索引", extra={"phase": "ann_snapshot"})
+    return sorted(_get_index().query(target_novel))
+
+
+def ann_index_status() -> Dict:
+    """供就绪检查展示：索引存放方式和规模。"""
+    mapped = _mapped
+    if mapped is not None:
+        return {"mode": "snapshot", "overlay": len(_overlay_books), **mapped[0].info()}
+    index = _index
+    return {"mode": "memory" if index is not None else None, "books": len(index.lsh) if index is not None else 0}
+
+
+# ── 快照定期重建（只在调度 worker 里运行）──────────────────────
+_builder_thread: Optional[threading.Thread] = None
+_builder_stop = threading.Event()
+
+
+def _builder_loop(interval: int) -> None:
+    while not _builder_stop.wait(interval):
+        try:
+            mapped = _mapped
+            if mapped is not None and mapped[0].fingerprint == catalog_fingerprint():
+                continue
+            start = time.time()
+            count = build_ann_index()
+            logger.info("目录快照已重建", extra={"phase": "ann_snapshot", "books": count,
+                                           "duration_ms": round((time.time() - start) * 1000, 1)})
+        except Exception:
+            logger.exception("目录快照重建失败", extra={"phase": "ann_snapshot"})
+
+
+def start_snapshot_builder(interval: int = CATALOG_SNAPSHOT_INTERVAL) -> bool:
+    """启动快照定期重建线程（未配置快照路径或 interval <= 0 时不启动），返回是否已启动。"""
+    global _builder_thread
+    if not CATALOG_SNAPSHOT_PATH or interval <= 0 or (_builder_thread is not None and _builder_thread.is_alive()):
+        return False
+    _builder_stop.clear()
+    _builder_thread = threading.Thread(target=_builder_loop, args=(interval,), name="ann-snapshot", daemon=True)
+    _builder_thread.start()
+    return True
+
+
+def stop_snapshot_builder() -> None:
+    _builder_stop.set()
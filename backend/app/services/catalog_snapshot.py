@@ -0,0 +1,323 @@
+"""
+目录快照：ANN 召回用到的全部目录数据编码进一个文件，各 worker 只读 mmap 共用。
+
+进程内建 ANN 索引要全表扫 book、逐本算 MinHash 签名，LSH 桶和同作者倒排都是 Python dict/set，
+每个 worker 一份。快照把这些预先编码成定长数组：
+- 标签矩阵（CSR：tag_ptr / tag_idx，按 book_id 升序一行一本）+ 标签词表 + 建快照时的 IDF 向量
+- 类别列：作者编码（author_code）+ 作者 → 书的倒排（author_ptr / author_rows）
+- LSH 表：每段按段哈希排序的 (band_hash, 行号)，查询时二分
+文件头带格式版本、签名参数、建成时间和目录指纹（book / book_tag 行数 + 各书标签、作者的校验和）。
+
+打开快照只是 mmap + 解析文件头，毫秒级；数据在页缓存里，多个 worker 不随 worker 数增加内存。
+重建时写临时文件再 os.replace 原子替换：已映射旧文件的 worker 继续读旧 inode，
+下次检查时发现文件换了再改映射新文件（见 ann_service）。
+文件按本机字节序写，只在同一台机器的进程之间共享。
+"""
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+import time
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+
+from ..config import ANN_NUM_PERM, ANN_BANDS
+from ..database.connection import get_db_connection
+from ..utils.minhash import WeightedMinHash
+from ..utils.similarity import parse_tags
+from ..utils.tag_idf import get_tag_idf, get_default_idf
+from ..utils.tracing import db_query
+
+_MAGIC = b"NMCATSNP"
+# 布局或编码方式变化时 +1，旧版本文件直接视为不兼容，由调度 worker 重建
+_FORMAT_VERSION = 2
+# magic, 格式版本, num_perm, bands, rows, 书数, 标签数, 作者数, 默认 IDF, 建成时间,
+# 指纹（书数, 书-标签数, 内容校验和）
+_HEADER = struct.Struct("=8sIIIIIIIddQQQ")
+# 各段按顺序存放，每段 (偏移, 字节数)；typecode 同 array / memoryview.cast
+_SECTIONS: Tuple[Tuple[str, str], ...] = (
+    ("book_ids", "q"),
+    ("tag_ptr", "I"),
+    ("tag_idx", "I"),
+    ("idf", "d"),
+    ("tag_offsets", "I"),
+    ("tag_blob", "B"),
+    ("author_code", "i"),
+    ("author_ptr", "I"),
+    ("author_rows", "I"),
+    ("author_offsets", "I"),
+    ("author_blob", "B"),
+    ("band_ptr", "I"),
+    ("band_hash", "Q"),
+    ("band_rows", "I"),
+)
+_SECTION_TABLE = struct.Struct("=" + "QQ" * len(_SECTIONS))
+_MASK64 = (1 << 64) - 1
+
+
+class SnapshotFormatError(Exception):
+    """快照文件损坏、格式版本或签名参数与当前配置不一致"""
+    pass
+
+
+def _band_hash(band) -> int:
+    """段哈希（FNV 式按 64 位字折叠）：写进文件，必须跨进程、跨 Python 版本稳定，不能用内置 hash()。"""
+    h = 0xcbf29ce484222325
+    for value in band:
+        h = ((h ^ value) * 0x100000001b3) & _MASK64
+    return h
+
+
+class _StringTable:
+    """按 UTF-8 字节序排好的字符串表：offsets[i]..offsets[i+1] 是第 i 个字符串。"""
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _raw(self, i: int) -> bytes:
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+    def __getitem__(self, i: int) -> str:
+        return self._raw(i).decode("utf-8")
+
+    def find(self, value: str) -> int:
+        """二分查找，返回编码；不存在返回 -1。"""
+        raw = value.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._raw(mid) < raw:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self) and self._raw(lo) == raw else -1
+
+
+def _encode_strings(values: List[str]) -> Tuple[array, bytes]:
+    offsets = array("I", [0])
+    blob = bytearray()
+    for value in values:
+        blob += value.encode("utf-8")
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+class CatalogSnapshot:
+    """一个已映射的只读快照。"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = path
+        self.file_id = (stat.st_ino, stat.st_mtime_ns)
+        self.size = stat.st_size
+
+        view = memoryview(self._mm)
+        if len(view) < _HEADER.size + _SECTION_TABLE.size:
+            raise SnapshotFormatError("快照文件不完整")
+        (magic, version, self.num_perm, self.bands, self.rows, self.book_count, self.tag_count,
+         self.author_count, self.default_idf, self.built_at, *fingerprint) = _HEADER.unpack_from(view)
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            raise SnapshotFormatError(f"快照格式不兼容（版本 {version}）")
+        if (self.num_perm, self.bands) != (ANN_NUM_PERM, ANN_BANDS):
+            raise SnapshotFormatError(
+                f"快照签名参数 {self.num_perm}/{self.bands} 与配置 {ANN_NUM_PERM}/{ANN_BANDS} 不一致")
+        self.fingerprint = tuple(fingerprint)
+
+        table = _SECTION_TABLE.unpack_from(view, _HEADER.size)
+        arrays = {}
+        for i, (name, typecode) in enumerate(_SECTIONS):
+            offset, length = table[2 * i], table[2 * i + 1]
+            if offset + length > len(view):
+                raise SnapshotFormatError(f"快照段 {name} 越界")
+            section = view[offset:offset + length]
+            arrays[name] = section if typecode == "B" else section.cast(typecode)
+        self._book_ids = arrays["book_ids"]
+        self._tag_ptr = arrays["tag_ptr"]
+        self._tag_idx = arrays["tag_idx"]
+        self._idf = arrays["idf"]
+        self._tags = _StringTable(arrays["tag_offsets"], arrays["tag_blob"])
+        self._author_code = arrays["author_code"]
+        self._author_ptr = arrays["author_ptr"]
+        self._author_rows = arrays["author_rows"]
+        self._authors = _StringTable(arrays["author_offsets"], arrays["author_blob"])
+        self._band_ptr = arrays["band_ptr"]
+        self._band_hash = arrays["band_hash"]
+        self._band_rows = arrays["band_rows"]
+        self.hasher = WeightedMinHash(num_perm=self.num_perm)
+
+    def __len__(self) -> int:
+        return self.book_count
+
+    def tag_weight(self, tag: str) -> float:
+        code = self._tags.find(tag)
+        return self._idf[code] if code >= 0 else self.default_idf
+
+    def signature(self, tags: Optional[str]):
+        """用建快照时的 IDF 加权签名（与快照内各书的签名同一口径）。"""
+        return self.hasher.signature({t: self.tag_weight(t) for t in parse_tags(tags)})
+
+    def _row(self, book_id: int) -> int:
+        i = bisect.bisect_left(self._book_ids, book_id)
+        return i if i < len(self._book_ids) and self._book_ids[i] == book_id else -1
+
+    def book(self, book_id: int) -> Optional[Tuple[Set[str], Optional[str]]]:
+        """快照里这本书的 (标签集合, 作者)；不在快照里返回 None。"""
+        row = self._row(book_id)
+        if row < 0:
+            return None
+        tags = {self._tags[code] for code in self._tag_idx[self._tag_ptr[row]:self._tag_ptr[row + 1]]}
+        author_code = self._author_code[row]
+        return tags, (self._authors[author_code] if author_code >= 0 else None)
+
+    def query(self, sig, author: Optional[str] = None) -> Set[int]:
+        """与签名至少有一段相同、或同作者的书 id。"""
+        hits: Set[int] = set()
+        for b in range(self.bands if sig else 0):
+            h = _band_hash(sig[b * self.rows:(b + 1) * self.rows])
+            hi = self._band_ptr[b + 1]
+            i = bisect.bisect_left(self._band_hash, h, self._band_ptr[b], hi)
+            while i < hi and self._band_hash[i] == h:
+                hits.add(self._book_ids[self._band_rows[i]])
+                i += 1
+        code = self._authors.find(author) if author else -1
+        if code >= 0:
+            for row in self._author_rows[self._author_ptr[code]:self._author_ptr[code + 1]]:
+                hits.add(self._book_ids[row])
+        return hits
+
+    def info(self) -> Dict:
+        return {
+            "path": self.path,
+            "books": self.book_count,
+            "tags": self.tag_count,
+            "authors": self.author_count,
+            "bytes": self.size,
+            "built_at": self.built_at,
+        }
+
+
+def _scan_catalog() -> Tuple[List[Dict], Tuple[int, int, int]]:
+    """按 book_id 顺序读出快照用到的列，连同算出的目录指纹一起返回。"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT book_id, tags, author FROM book ORDER BY book_id")
+        rows = [dict(row) for row in cursor.fetchall()]
+        cursor.execute("SELECT COUNT(*) AS n FROM book_tag")
+        book_tags = dict(cursor.fetchone())["n"]
+    digest = hashlib.blake2b(digest_size=8)
+    for row in rows:
+        digest.update(f"{row['book_id']}\x1f{row['tags'] or ''}\x1f{row['author'] or ''}\x1e".encode("utf-8"))
+    return rows, (len(rows), book_tags, int.from_bytes(digest.digest(), "little"))
+
+
+@db_query("catalog_fingerprint")
+def catalog_fingerprint() -> Tuple[int, int, int]:
+    """
+    目录指纹：(book 行数, book_tag 行数, 各书 book_id / 标签 / 作者的校验和)。
+
+    入库、改标签、改作者后都会变，用来判断快照是否需要重建。要读全表的这三列，
+    调度 worker 每 CATALOG_SNAPSHOT_INTERVAL 秒才算一次，不在请求路径上调用。
+    """
+    return _scan_catalog()[1]
+
+
+def build_catalog_snapshot(path: str) -> int:
+    """全量扫 book 表生成快照，写临时文件后原子替换 path，返回收录的书数。"""
+    tag_idf = get_tag_idf()
+    default_idf = get_default_idf()
+    rows, fingerprint = _scan_catalog()
+
+    book_tags = [parse_tags(row["tags"]) for row in rows]
+    tag_names = sorted({t for tags in book_tags for t in tags} | set(tag_idf), key=lambda t: t.encode("utf-8"))
+    tag_codes = {t: i for i, t in enumerate(tag_names)}
+    author_names = sorted({row["author"] for row in rows if row["author"]}, key=lambda a: a.encode("utf-8"))
+    author_codes = {a: i for i, a in enumerate(author_names)}
+
+    hasher = WeightedMinHash(num_perm=ANN_NUM_PERM)
+    band_rows_count = ANN_NUM_PERM // ANN_BANDS
+    book_ids = array("q")
+    tag_ptr, tag_idx = array("I", [0]), array("I")
+    author_code = array("i")
+    author_books: List[List[int]] = [[] for _ in author_names]
+    bands: List[List[Tuple[int, int]]] = [[] for _ in range(ANN_BANDS)]
+    for row_no, (row, tags) in enumerate(zip(rows, book_tags)):
+        book_ids.append(row["book_id"])
+        codes = sorted({tag_codes[t] for t in tags})
+        tag_idx.extend(codes)
+        tag_ptr.append(len(tag_idx))
+        code = author_codes.get(row["author"], -1) if row["author"] else -1
+        author_code.append(code)
+        if code >= 0:
+            author_books[code].append(row_no)
+        sig = hasher.signature({t: tag_idf.get(t, default_idf) for t in tags})
+        if sig:
+            for b in range(ANN_BANDS):
+                bands[b].append((_band_hash(sig[b * band_rows_count:(b + 1) * band_rows_count]), row_no))
+
+    author_ptr, author_rows = array("I", [0]), array("I")
+    for books in author_books:
+        author_rows.extend(books)
+        author_ptr.append(len(author_rows))
+    band_ptr, band_hash, band_rows = array("I", [0]), array("Q"), array("I")
+    for entries in bands:
+        entries.sort()
+        band_hash.extend(h for h, _ in entries)
+        band_rows.extend(r for _, r in entries)
+        band_ptr.append(len(band_hash))
+    tag_offsets, tag_blob = _encode_strings(tag_names)
+    author_offsets, author_blob = _encode_strings(author_names)
+
+    sections = {
+        "book_ids": book_ids, "tag_ptr": tag_ptr, "tag_idx": tag_idx,
+        "idf": array("d", (tag_idf.get(t, default_idf) for t in tag_names)),
+        "tag_offsets": tag_offsets, "tag_blob": tag_blob,
+        "author_code": author_code, "author_ptr": author_ptr, "author_rows": author_rows,
+        "author_offsets": author_offsets, "author_blob": author_blob,
+        "band_ptr": band_ptr, "band_hash": band_hash, "band_rows": band_rows,
+    }
+    header = _HEADER.pack(_MAGIC, _FORMAT_VERSION, ANN_NUM_PERM, ANN_BANDS, band_rows_count, len(rows),
+                          len(tag_names), len(author_names), default_idf, time.time(), *fingerprint)
+
+    # 各段按 8 字节对齐，memoryview.cast 出来的数组访问不跨缓存行
+    layout = []
+    offset = _HEADER.size + _SECTION_TABLE.size
+    for name, _ in _SECTIONS:
+        data = sections[name]
+        data = data if isinstance(data, bytes) else data.tobytes()
+        offset += -offset % 8
+        layout.append((offset, data))
+        offset += len(data)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.write(_SECTION_TABLE.pack(*(v for off, data in layout for v in (off, len(data)))))
+            for off, data in layout:
+                f.write(b"\0" * (off - f.tell()))
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return len(rows)
+
+
+def open_catalog_snapshot(path: str) -> Optional[CatalogSnapshot]:
+    """映射快照；文件不存在返回 None，格式不兼容抛 SnapshotFormatError。"""
+    try:
+        return CatalogSnapshot(path)
+    except FileNotFoundError:
+        return None
+    except (ValueError, struct.error) as e:
+        raise SnapshotFormatError(f"快照文件损坏: {e}")
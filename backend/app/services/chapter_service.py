@@ -1,15 +1,38 @@
 """
 章节试读数据服务（前 N 章免费正文）
 兼容 SQLite（开发）和 PostgreSQL（生产）
+
+试读正文爬下来后很少变化，接口响应整份预先序列化 + gzip 压缩存进 chapter_payload 表，
+并在进程内保留最近用到的 CHAPTER_PAYLOAD_CACHE_SIZE 本：重复打开同一本书只是一次内存拷贝，
+路由层据此直接回 gzip 字节（Content-Encoding 透传）或 304。
+章节被改写（insert_chapters，可能在其他 worker 或 scripts/reparse_archive.py 里）时库里的响应体随之删除；
+进程内的副本每 CHAPTER_PAYLOAD_REVALIDATE_INTERVAL 秒按库里的 ETag 核对一次，对不上就重新加载。
 """
-from typing import Dict, List
-from ..config import DATABASE_URL
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from ..config import DATABASE_URL, CHAPTER_PAYLOAD_CACHE_SIZE, CHAPTER_PAYLOAD_REVALIDATE_INTERVAL
 from ..database.connection import get_db_connection
+from ..utils.tracing import db_query, traced
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # orjson 可选：未安装时用标准库 json
+    orjson = None
 
 # PostgreSQL 用 %s，SQLite 用 ?
 _P = "%s" if DATABASE_URL else "?"
 
 
+@db_query("get_chapters")
 def get_chapters(book_id: int) -> List[Dict]:
     """取某本小说已存的试读章节，按章节顺序返回。"""
     with get_db_connection() as conn:
@@ -31,28 +54,93 @@ def has_chapters(book_id: int) -> bool:
         return cursor.fetchone() is not None
 
 
-def get_or_fetch_chapters(book_id: int, n: int = 3) -> List[Dict]:
+# 正在爬的书：同一本书的并发请求（含后台预取）只爬一次，其余等它写库后直接读
+_inflight: Dict[int, threading.Event] = {}
+# 用户请求自己发起（持有）的爬取数；等别人爬同一本书的用户请求不计入
+_user_crawls = 0
+# 已有用户请求在等的后台预取：这些书的预取不再让路，否则用户会跟着预取一起等
+_promoted: Set[int] = set()
+_crawl_cond = threading.Condition()
+
+# 后台预取最多为用户爬取让路这么久，之后照常继续（避免用户流量持续时预取永远饿死）
+_YIELD_TIMEOUT = 30
+
+
+def user_crawls_in_flight() -> int:
+    """当前用户触发（非后台预取）的试读爬取数。"""
+    with _crawl_cond:
+        return _user_crawls
+
+
+def _yield_to_user_crawls(book_id: int) -> None:
+    with _crawl_cond:
+        _crawl_cond.wait_for(lambda: _user_crawls == 0 or book_id in _promoted, timeout=_YIELD_TIMEOUT)
+
+
+def _crawl_free_chapters(book_id: int, n: int, background: bool) -> List[Dict]:
+    # 延迟导入，避免模块加载期的循环依赖
+    from .crawler_service import JinjiangCrawler
+    crawler = JinjiangCrawler()
+    if not background:
+        return crawler.fetch_free_chapters(book_id, n)
+
+    # 后台预取：每个上游请求前先等用户爬取结束，不和用户抢共享限速器的时间槽
+    def get_content(chapter_id):
+        _yield_to_user_crawls(book_id)
+        return crawler.fetch_chapter_content(book_id, chapter_id)
+
+    _yield_to_user_crawls(book_id)
+    return crawler.assemble_free_chapters(crawler.fetch_chapter_list(book_id), get_content, n)
+
+
+@traced()
+def get_or_fetch_chapters(book_id: int, n: int = 3, background: bool = False) -> List[Dict]:
     """
     懒加载试读章节：库里有就直接返回；没有则实时爬前 n 章免费正文、
     写库后返回。爬取失败返回空列表。
+
+    background=True 为后台预取：优先级低于用户请求，每个上游请求前先让路给进行中的用户爬取。
+    同一本书已有爬取在进行时不重复爬，等它结束后读库；等的是后台预取时，该预取随即停止让路。
     """
+    global _user_crawls
     existing = get_chapters(book_id)
     if existing:
         return existing
 
-    # 延迟导入，避免模块加载期的循环依赖
-    from .crawler_service import JinjiangCrawler
+    with _crawl_cond:
+        event = _inflight.get(book_id)
+        owner = event is None
+        if owner:
+            event = _inflight[book_id] = threading.Event()
+            if not background:
+                _user_crawls += 1
+        elif not background:
+            _promoted.add(book_id)
+            _crawl_cond.notify_all()
     try:
-        chapters = JinjiangCrawler().fetch_free_chapters(book_id, n)
-    except Exception as e:
-        print(f"✗ 爬取试读章节失败 (book_id={book_id}): {e}")
-        return []
-
-    if chapters:
-        insert_chapters(book_id, chapters)
-    return chapters
+        if not owner:
+            event.wait(timeout=60)
+            return get_chapters(book_id)
+        try:
+            chapters = _crawl_free_chapters(book_id, n, background)
+        except Exception:
+            logger.exception("爬取试读章节失败", extra={"book_id": book_id, "phase": "chapters"})
+            return []
+        if chapters:
+            insert_chapters(book_id, chapters)
+        return chapters
+    finally:
+        with _crawl_cond:
+            if owner and not background:
+                _user_crawls -= 1
+            if owner:
+                _inflight.pop(book_id, None)
+                _promoted.discard(book_id)
+                event.set()
+            _crawl_cond.notify_all()
 
 
+@db_query("insert_chapters")
 def insert_chapters(book_id: int, chapters: List[Dict]) -> bool:
     """批量写入/更新试读章节（按 book_id+chapter_id upsert）。"""
     if not chapters:
@@ -92,7 +180,129 @@ def insert_chapters(book_id: int, chapters: List[Dict]) -> bool:
                         chapter_name, chapter_intro, content, author_say
                     ) VALUES (?,?,?,?,?,?,?)
                 """, rows)
+            # 章节变了，预压缩响应体作废（同一事务内删除）；其他进程的内存副本核对 ETag 时发现
+            cursor.execute(f"DELETE FROM chapter_payload WHERE book_id = {_P}", (book_id,))
+        with _payload_lock:
+            _payload_cache.pop(book_id, None)
         return True
     except Exception as e:
-        print(f"插入章节数据失败 (book_id={book_id}): {e}")
+        logger.error(f"插入章节数据失败: {e}", extra={"book_id": book_id, "phase": "db_write"})
         return False
+
+
+# ── 预压缩响应体 ──────────────────────────────────────────────
+class ChapterPayload(NamedTuple):
+    """试读接口的完整响应：gzip 压缩的 JSON 字节 + 强 ETag。"""
+    etag: str           # 未压缩 JSON 的 sha256 前 32 位（含引号）
+    body_gzip: bytes
+    raw_size: int       # 未压缩字节数
+
+
+# book_id → (响应体, 上次与库里核对的时刻)
+_payload_cache: "OrderedDict[int, Tuple[ChapterPayload, float]]" = OrderedDict()
+_payload_lock = threading.Lock()
+
+
+def _dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def build_chapter_payload(book_id: int, chapters: List[Dict]) -> ChapterPayload:
+    """把章节列表序列化成接口响应并压缩（只在生成时做一次，用最高压缩级别）。"""
+    body = _dumps({"success": True, "data": {"book_id": book_id, "chapters": chapters}})
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    # mtime=0：同样的内容压出同样的字节
+    return ChapterPayload(etag, gzip.compress(body, compresslevel=9, mtime=0), len(body))
+
+
+def _remember(book_id: int, payload: ChapterPayload) -> None:
+    with _payload_lock:
+        _payload_cache[book_id] = (payload, time.monotonic())
+        _payload_cache.move_to_end(book_id)
+        while len(_payload_cache) > CHAPTER_PAYLOAD_CACHE_SIZE:
+            _payload_cache.popitem(last=False)
+
+
+def _cached_payload(book_id: int, max_age: float = float("inf")) -> Optional[ChapterPayload]:
+    with _payload_lock:
+        entry = _payload_cache.get(book_id)
+        if entry is None or time.monotonic() - entry[1] >= max_age:
+            return None
+        _payload_cache.move_to_end(book_id)
+        return entry[0]
+
+
+def peek_chapter_payload(book_id: int) -> Optional[ChapterPayload]:
+    """只查进程内缓存、且近期核对过的（不碰数据库，可在事件循环里直接调用）。"""
+    return _cached_payload(book_id, CHAPTER_PAYLOAD_REVALIDATE_INTERVAL)
+
+
+def _load_stored_etag(book_id: int) -> Optional[str]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT etag FROM chapter_payload WHERE book_id = {_P}", (book_id,))
+        row = cursor.fetchone()
+    return None if row is None else dict(row)["etag"]
+
+
+def _load_stored_payload(book_id: int) -> Optional[ChapterPayload]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT etag, body_gzip, raw_size FROM chapter_payload WHERE book_id = {_P}", (book_id,)
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    row = dict(row)
+    # psycopg2 的 BYTEA 读出来是 memoryview
+    return ChapterPayload(row["etag"], bytes(row["body_gzip"]), row["raw_size"])
+
+
+def _store_payload(book_id: int, payload: ChapterPayload) -> None:
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                INSERT INTO chapter_payload (book_id, etag, body_gzip, raw_size, created_at)
+                VALUES ({_P}, {_P}, {_P}, {_P}, {_P})
+                ON CONFLICT (book_id) DO UPDATE SET
+                    etag = excluded.etag, body_gzip = excluded.body_gzip,
+                    raw_size = excluded.raw_size, created_at = excluded.created_at
+            """, (book_id, payload.etag, payload.body_gzip, payload.raw_size, time.time()))
+    except Exception as e:
+        logger.warning(f"试读响应体缓存写入失败: {e}", extra={"book_id": book_id, "phase": "chapters"})
+
+
+@traced()
+def get_chapter_payload(book_id: int, n: int = 3) -> Optional[ChapterPayload]:
+    """
+    取试读接口的预压缩响应：进程内缓存 → chapter_payload 表 → 读章节（必要时实时爬取）现场生成。
+
+    进程内副本超过 CHAPTER_PAYLOAD_REVALIDATE_INTERVAL 没核对时先比对库里的 ETag（只读一列），
+    一致就接着用，不一致或库里已删（章节被改写）就重新加载。
+    没有章节（爬取失败 / 无免费章节）时返回 None，不缓存，下次请求重试。
+    """
+    payload = peek_chapter_payload(book_id)
+    if payload is not None:
+        return payload
+
+    cached = _cached_payload(book_id)
+    if cached is not None and _load_stored_etag(book_id) == cached.etag:
+        _remember(book_id, cached)
+        return cached
+
+    payload = _load_stored_payload(book_id)
+    if payload is None:
+        chapters = get_or_fetch_chapters(book_id, n)
+        if not chapters:
+            return None
+        # 刚爬到的章节以库里的行为准，保证与之后生成的响应字段一致
+        chapters = get_chapters(book_id) or chapters
+        payload = build_chapter_payload(book_id, chapters)
+        _store_payload(book_id, payload)
+
+    _remember(book_id, payload)
+    return payload
@@ -4,14 +4,105 @@
 """
 import requests
 import re
+import hashlib
 import json
 import html
+import logging
 import time
 import random
+import threading
 from bs4 import BeautifulSoup
+from collections import deque
 from datetime import date
 from urllib.parse import urljoin, urlparse, parse_qs, quote
-from typing import Optional, Dict
+from typing import Optional, Deque, Dict, Iterator, Tuple
+
+from ..config import JJWXC_WEB_BASE, JJWXC_APP_BASE, CRAWL_DELAY_SCALE
+from .raw_archive import archive_response
+from ..utils.metrics import CRAWLER_REQUEST_SECONDS, CRAWLER_REQUESTS
+from ..utils.tracing import span, traced
+
+logger = logging.getLogger(__name__)
+
+try:
+    import lxml.html as _lxml_html
+    from lxml import etree as _lxml_etree
+except ImportError:  # lxml 缺失时详情页解析回退到 html.parser
+    _lxml_html = None
+    _lxml_etree = None
+
+
+# ── 详情页解析用正则（模块级预编译，两条解析路径共用）─────────────────
+_RE_TAGS_PATTERNS = [
+    re.compile(r"文章标签[:：]\s*([^\n]+)"),
+    re.compile(r"标签[:：]\s*([^\n]+)"),
+    re.compile(r"搜索关键字[:：]\s*([^\n]+)"),
+]
+_EMPTY_TAG_TEXTS = ('无', '暂无', '-', '')
+_RE_WHITESPACE = re.compile(r'\s+')
+_RE_COLON = re.compile(r'[:：]')
+_RE_AUTHOR_LABEL = re.compile(r'作者[:：]')
+_RE_AUTHOR_HREF = re.compile(r'oneauthor\.php\?authorid=')
+_RE_CHAPTER_HREF = re.compile(r'novelid=\d+&chapterid=\d+')
+_RE_REVIEW_COUNT = re.compile(r"总书评数[：:]\s*(\d+)")
+_RE_FAVORITE_COUNT = re.compile(r"(?:当前)?(?:被)?收藏数[：:]\s*(\d+)")
+_RE_NUTRIENT_COUNT = re.compile(r"营养液数[：:]\s*(\d+)")
+_RE_SCORE = re.compile(r"文章积分[：:]\s*([\d,]+)")
+_RE_CLICK_COUNT = re.compile(r"(?:非V章节)?总点击数[：:]\s*(\d+)")
+_RE_LISTING_NOVELID = re.compile(r"onebook\.php\?novelid=(\d+)")
+_RE_LAST_UPDATE = re.compile(r"最新更新[:：](\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})")
+
+# BeautifulSoup 的 get_text() 不含这些标签里的文本，lxml 路径需对齐
+_HIDDEN_TEXT_TAGS = frozenset({"script", "style", "template"})
+# BeautifulSoup 会把纯空白文本折叠成 "\n" 或 " "，这两个标签内除外
+_PRESERVE_WS_TAGS = frozenset({"pre", "textarea"})
+_ASCII_SPACES = str.maketrans("", "", "\x20\x0a\x09\x0c\x0d")
+
+
+def _lxml_strings(el, include_hidden: bool = False) -> Iterator[Tuple[str, Optional[object]]]:
+    """
+    按文档顺序产出 el 子树内的 (文本, 该文本所属的父元素)，不含 el 自身的 tail。
+
+    语义对齐 BeautifulSoup(html.parser)：默认跳过注释与 script/style/template 内的文本
+    （同 get_text），include_hidden=True 时全部产出（同 find_all(string=...)）；
+    纯空白文本按 bs4 的规则折叠。
+    """
+    hidden = 0
+    preserve = 0
+
+    def _normalize(text: str) -> str:
+        if preserve or text.translate(_ASCII_SPACES):
+            return text
+        return "\n" if "\n" in text else " "
+
+    for event, node in _lxml_etree.iterwalk(el, events=("start", "end")):
+        is_element = isinstance(node.tag, str)
+        if event == "start":
+            if is_element and node.tag in _HIDDEN_TEXT_TAGS:
+                hidden += 1
+            if is_element and node.tag in _PRESERVE_WS_TAGS:
+                preserve += 1
+            if node.text:
+                if is_element and not hidden:
+                    yield _normalize(node.text), node
+                elif include_hidden:
+                    yield _normalize(node.text), node if is_element else node.getparent()
+        else:
+            if is_element and node.tag in _HIDDEN_TEXT_TAGS:
+                hidden -= 1
+            if is_element and node.tag in _PRESERVE_WS_TAGS:
+                preserve -= 1
+            if node is not el and node.tail and (include_hidden or not hidden):
+                yield _normalize(node.tail), node.getparent()
+
+
+def _lxml_text_strip(el) -> str:
+    """等价于 BeautifulSoup 的 get_text(strip=True)。"""
+    return "".join(s.strip() for s, _ in _lxml_strings(el) if s.strip())
+
+
+def _first(nodes):
+    return nodes[0] if nodes else None
 
 
 class NovelNotFoundException(Exception):
@@ -19,11 +110,104 @@ class NovelNotFoundException(Exception):
     pass
 
 
+_DESKTOP_HOST = urlparse(JJWXC_WEB_BASE).netloc
+_MOBILE_HOST = urlparse(JJWXC_APP_BASE).netloc
+
+
+class _HostRateLimiter:
+    """
+    进程内共享的按主机限速器：同一主机相邻两次请求至少间隔随机 [min_delay, max_delay] 秒。
+
+    用户搜索、后台补全、统计刷新、目录发现等多条线程同时爬时，原先各自 sleep 互不知情，
+    叠加起来对晋江的实际请求频率会成倍放大；统一走这里后总频率受控。
+    空闲后的第一个请求不必再白等一个延迟。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_slot: Dict[str, float] = {}
+        self.waiting = 0    # 正在排队等时间槽的线程数
+
+    def wait(self, host: str, min_delay: float, max_delay: float) -> None:
+        min_delay, max_delay = min_delay * CRAWL_DELAY_SCALE, max_delay * CRAWL_DELAY_SCALE
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            # 预约下一个可用时间点后立即释放锁，各线程在锁外各自睡到自己的时间点
+            self._next_slot[host] = slot + random.uniform(min_delay, max_delay)
+            if slot > now:
+                self.waiting += 1
+        if slot > now:
+            try:
+                with span("rate_limit_wait", host=host):
+                    time.sleep(slot - now)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+
+
+_rate_limiter = _HostRateLimiter()
+
+
+class _CrawlHealth:
+    """上游请求的进行中计数 + 最近 _WINDOW 秒的成败记录（就绪检查算错误率用）。"""
+
+    _WINDOW = 300
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+
+    def begin(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def end(self, ok: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            self._outcomes.append((now, ok))
+            while self._outcomes and self._outcomes[0][0] < now - self._WINDOW:
+                self._outcomes.popleft()
+
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            recent = [ok for ts, ok in self._outcomes if ts >= now - self._WINDOW]
+            in_flight = self.in_flight
+        errors = recent.count(False)
+        return {
+            "in_flight": in_flight,
+            "waiting_rate_limit": _rate_limiter.waiting,
+            "window_seconds": self._WINDOW,
+            "requests": len(recent),
+            "errors": errors,
+            "error_rate": round(errors / len(recent), 3) if recent else None,
+        }
+
+
+_crawl_health = _CrawlHealth()
+
+
+def crawl_health() -> Dict:
+    """上游爬取状态：进行中 / 排队限速的请求数，最近 5 分钟请求数与错误率。"""
+    return _crawl_health.snapshot()
+
+
 class CrawlerException(Exception):
     """爬虫异常"""
     pass
 
 
+def _request_outcome(status_code: int) -> str:
+    if status_code == 304:
+        return "not_modified"
+    if status_code == 404:
+        return "not_found"
+    return "ok" if status_code < 400 else "http_error"
+
+
 class JinjiangCrawler:
     """晋江文学城爬虫类"""
 
@@ -34,7 +218,7 @@ class JinjiangCrawler:
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/105.0.0.0 Safari/537.36",
             "Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/105.0.0.0 Safari/537.36"
         ]
-        self.base_url = "https://www.jjwxc.net/"
+        self.base_url = f"{JJWXC_WEB_BASE}/"
 
     def _get_headers(self) -> dict:
         """获取随机请求头（反爬策略）"""
@@ -46,6 +230,73 @@ class JinjiangCrawler:
             "Connection": "keep-alive"
         }
 
+    def _get(self, url: str, headers: dict, timeout: float, archive_kind: Optional[str] = None,
+             book_id=None, chapter_id=None) -> requests.Response:
+        """
+        爬虫统一的 GET 出口。
+
+        archive_kind 不为空时把响应原始字节写入原始响应归档（见 raw_archive），
+        供之后离线重新解析；归档未开启时无额外开销。
+        """
+        parsed = urlparse(url)
+        labels = {"host": parsed.netloc, "endpoint": parsed.path or "/"}
+        _crawl_health.begin()
+        ok = False
+        outcome = "error"
+        try:
+            with CRAWLER_REQUEST_SECONDS.time(**labels), \
+                    span("upstream." + labels["endpoint"].rsplit("/", 1)[-1], **labels) as sp:
+                resp = requests.get(url, headers=headers, timeout=timeout)
+                if sp is not None:
+                    sp.set("status", resp.status_code)
+            # 404 是「书不存在」的正常结果，不算上游故障
+            ok = resp.status_code < 400 or resp.status_code == 404
+            outcome = _request_outcome(resp.status_code)
+        finally:
+            _crawl_health.end(ok)
+            CRAWLER_REQUESTS.inc(outcome=outcome, **labels)
+        if archive_kind and resp.status_code == 200:
+            archive_response(
+                archive_kind, url, resp.content,
+                book_id=int(book_id) if book_id else None,
+                chapter_id=int(chapter_id) if chapter_id else None,
+            )
+        return resp
+
+    def fetch_if_changed(self, url: str, headers: dict, timeout: float, state: Optional[Dict],
+                         archive_kind: Optional[str] = None, book_id=None) -> Tuple[Optional[requests.Response], Dict]:
+        """
+        条件请求：带上次记下的 ETag / Last-Modified 发 If-None-Match / If-Modified-Since。
+
+        Args:
+            state: 上次的校验信息（etag / last_modified / content_hash），没有则发普通请求
+
+        Returns:
+            (resp, validators)：上游回 304、或响应体 sha256 与上次相同（晋江多数接口不带 ETag）时
+            resp 为 None，调用方应跳过解析和写库；validators 是本次的 etag / last_modified /
+            content_hash，供记入 fetch_state。非 200/304 抛 requests.HTTPError。
+        """
+        state = state or {}
+        headers = dict(headers)
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+
+        resp = self._get(url, headers, timeout, archive_kind=archive_kind, book_id=book_id)
+        if resp.status_code == 304:
+            return None, {k: state.get(k) for k in ("etag", "last_modified", "content_hash")}
+        resp.raise_for_status()
+
+        validators = {
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "content_hash": hashlib.sha256(resp.content).hexdigest(),
+        }
+        if validators["content_hash"] == state.get("content_hash"):
+            return None, validators
+        return resp, validators
+
     def _extract_novelid(self, novel_url: str) -> Optional[int]:
         """
         从小说链接URL中提取 novelid 参数
@@ -64,6 +315,7 @@ class JinjiangCrawler:
             return int(novel_url.split("novelid=")[-1].split("&")[0])
         return None
 
+    @traced("crawler.search_novel_by_web")
     def search_novel_by_web(self, novel_name: str) -> Optional[Dict]:
         """
         通过网页搜索找到小说（备用方案，用于AJAX搜索失败时）
@@ -80,17 +332,17 @@ class JinjiangCrawler:
         try:
             # 使用GBK编码（晋江网站使用GBK编码）
             keyword_gbk = quote(novel_name.encode('gbk'))
-            search_url = f"https://www.jjwxc.net/search.php?kw={keyword_gbk}&t=1"
+            search_url = f"{JJWXC_WEB_BASE}/search.php?kw={keyword_gbk}&t=1"
 
             # 添加延迟避免被封
-            time.sleep(random.uniform(2.0, 3.0))
+            _rate_limiter.wait(_DESKTOP_HOST, 2.0, 3.0)
 
             headers = self._get_headers()
             headers.update({
-                "Referer": "https://www.jjwxc.net/"
+                "Referer": f"{JJWXC_WEB_BASE}/"
             })
 
-            resp = requests.get(search_url, headers=headers, timeout=15)
+            resp = self._get(search_url, headers, 15)
             resp.encoding = "gb18030"  # 晋江使用gb18030编码
 
             soup = BeautifulSoup(resp.text, "html.parser")
@@ -127,7 +379,7 @@ class JinjiangCrawler:
 
             # 构造完整URL
             if not href.startswith('http'):
-                url = f"https://www.jjwxc.net/onebook.php?novelid={novel_id}"
+                url = f"{JJWXC_WEB_BASE}/onebook.php?novelid={novel_id}"
             else:
                 url = href
 
@@ -141,6 +393,7 @@ class JinjiangCrawler:
         except Exception as e:
             raise CrawlerException(f"网页搜索小说时出错: {str(e)}")
 
+    @traced("crawler.search_novel_by_name")
     def search_novel_by_name(self, novel_name: str) -> Optional[Dict]:
         """
         通过小说名称在晋江搜索找到小说
@@ -157,19 +410,19 @@ class JinjiangCrawler:
         """
         # 方法1: 尝试AJAX接口（速度快）
         # type=1 表示搜索文章（作品）
-        ajax_url = f"https://www.jjwxc.net/search/search_ajax.php?action=search&keywords={quote(novel_name)}&type=1&getfull=1"
+        ajax_url = f"{JJWXC_WEB_BASE}/search/search_ajax.php?action=search&keywords={quote(novel_name)}&type=1&getfull=1"
 
         try:
             # 添加延迟避免被封
-            time.sleep(random.uniform(2.0, 3.0))
+            _rate_limiter.wait(_DESKTOP_HOST, 2.0, 3.0)
 
             headers = self._get_headers()
             headers.update({
-                "Referer": "https://www.jjwxc.net/search.php",
+                "Referer": f"{JJWXC_WEB_BASE}/search.php",
                 "X-Requested-With": "XMLHttpRequest"
             })
 
-            resp = requests.get(ajax_url, headers=headers, timeout=15)
+            resp = self._get(ajax_url, headers, 15)
             resp.encoding = "utf-8"
 
             # 解析JSON响应
@@ -187,9 +440,9 @@ class JinjiangCrawler:
 
                     if novel_id:
                         # 构造小说详情页URL
-                        url = f"https://www.jjwxc.net/onebook.php?novelid={novel_id}"
+                        url = f"{JJWXC_WEB_BASE}/onebook.php?novelid={novel_id}"
 
-                        print(f"✓ AJAX搜索成功: {title}")
+                        logger.info(f"AJAX搜索成功: {title}", extra={"book_id": novel_id, "phase": "search_ajax"})
                         return {
                             "title": title,
                             "author": author,
@@ -198,22 +451,24 @@ class JinjiangCrawler:
                         }
 
             # AJAX搜索未找到结果，fallback到网页搜索
-            print(f"⚠ AJAX搜索未找到《{novel_name}》，尝试网页搜索...")
+            logger.info(f"AJAX搜索未找到《{novel_name}》，尝试网页搜索", extra={"phase": "search_ajax"})
 
         except Exception as e:
             # AJAX搜索出错，fallback到网页搜索
-            print(f"⚠ AJAX搜索出错: {str(e)}，尝试网页搜索...")
+            logger.warning(f"AJAX搜索出错，尝试网页搜索: {e}", extra={"phase": "search_ajax"})
 
         # 方法2: 使用网页搜索（备用方案）
         try:
             result = self.search_novel_by_web(novel_name)
             if result:
-                print(f"✓ 网页搜索成功: {result.get('title')}")
+                logger.info(f"网页搜索成功: {result.get('title')}",
+                            extra={"book_id": result.get("book_id"), "phase": "search_web"})
             return result
 
         except Exception as e:
             raise CrawlerException(f"搜索小说失败（AJAX和网页搜索均失败）: {str(e)}")
 
+    @traced("crawler.fetch_novel_detail")
     def fetch_novel_detail(self, novel_url: str) -> Dict:
         """
         抓取单本小说的详情页信息
@@ -228,19 +483,280 @@ class JinjiangCrawler:
         Raises:
             CrawlerException: 爬取失败
         """
-        data = {}
-
         try:
             # 添加延迟避免被封
-            time.sleep(random.uniform(2.0, 3.0))
+            _rate_limiter.wait(_DESKTOP_HOST, 2.0, 3.0)
 
-            resp = requests.get(novel_url, headers=self._get_headers(), timeout=15)
+            resp = self._get(novel_url, self._get_headers(), 15,
+                             archive_kind="detail", book_id=self._extract_novelid(novel_url))
         except Exception as e:
             raise CrawlerException(f"获取小说详情失败: {novel_url}, 原因: {str(e)}")
 
         # 晋江详情页通常为 GBK 编码
         resp.encoding = "gb18030"
-        soup = BeautifulSoup(resp.text, "html.parser")
+        return self.parse_novel_detail(resp.text)
+
+    def fetch_novel_detail_if_changed(self, book_id, state: Optional[Dict]) -> Tuple[Optional[Dict], Dict]:
+        """
+        条件抓取详情页（刷新用）。
+
+        Returns:
+            (detail, validators)：页面未变化时 detail 为 None；validators 见 fetch_if_changed
+        """
+        novel_url = f"{JJWXC_WEB_BASE}/onebook.php?novelid={book_id}"
+        try:
+            _rate_limiter.wait(_DESKTOP_HOST, 2.0, 3.0)
+            resp, validators = self.fetch_if_changed(
+                novel_url, self._get_headers(), 15, state, archive_kind="detail", book_id=book_id
+            )
+        except Exception as e:
+            raise CrawlerException(f"获取小说详情失败: {novel_url}, 原因: {str(e)}")
+        if resp is None:
+            return None, validators
+        resp.encoding = "gb18030"
+        return self.parse_novel_detail(resp.text), validators
+
+    def parse_novel_detail(self, page_html: str) -> Dict:
+        """
+        解析详情页 HTML，返回小说字段字典。
+
+        优先走 lxml 快速路径（C 解析器 + 定向提取）；lxml 不可用或解析出错时
+        回退到原先的 BeautifulSoup(html.parser) 实现。两条路径输出一致，
+        由 scripts/verify_detail_parser.py 对照 fixtures 里的详情页做回归校验。
+        """
+        if _lxml_html is not None:
+            try:
+                return self._parse_detail_lxml(page_html)
+            except Exception as e:
+                logger.warning(f"lxml 解析详情页失败，回退 html.parser: {e}", extra={"phase": "parse_detail"})
+        return self._parse_detail_soup(page_html)
+
+    def _best_cover_url(self, img_candidates: list) -> Optional[str]:
+        """从候选图片中选择最佳封面（优先晋江官方图床，过滤外部图床）"""
+        jjwxc_urls = []
+        external_urls = []
+
+        for img_url in img_candidates:
+            if not img_url:
+                continue
+            full_url = urljoin(self.base_url, img_url)
+            # 晋江官方域名 / 静态资源
+            if any(domain in full_url for domain in ('jjwxc.net', 'static.jjwxc.net')):
+                jjwxc_urls.append(full_url)
+            else:
+                external_urls.append(full_url)
+
+        # 优先返回晋江官方图床，否则返回外部图床
+        if jjwxc_urls:
+            return jjwxc_urls[0]
+        elif external_urls:
+            return external_urls[0]
+        return None
+
+    @staticmethod
+    def _apply_page_text_fields(data: Dict, page_text: str) -> None:
+        """从整页纯文本里提取 主角/配角/其它、标签、统计数据、最新更新时间（两条解析路径共用）。"""
+        # 2. 主角/配角/其它信息
+        idx = page_text.find("主角：")
+        if idx != -1:
+            snippet = page_text[idx: idx + 200]
+            data['main_chars'] = None
+            data['support_chars'] = None
+            data['other_info'] = None
+            parts = snippet.split('┃')
+            for part in parts:
+                part = part.strip()
+                if part.startswith("主角："):
+                    data['main_chars'] = part.replace("主角：", "").strip()
+                elif part.startswith("配角："):
+                    data['support_chars'] = part.replace("配角：", "").strip()
+                elif part.startswith("其它："):
+                    data['other_info'] = part.replace("其它：", "").strip()
+
+        # 2.5 标签信息：尝试多种可能的标签位置
+        data['tags'] = None
+        for pattern in _RE_TAGS_PATTERNS:
+            tags_match = pattern.search(page_text)
+            if tags_match:
+                tags_text = tags_match.group(1).strip()
+                # 清理标签文本，去除多余的空格和符号
+                tags_text = _RE_WHITESPACE.sub(' ', tags_text)
+                tags_text = tags_text.replace('┃', '').strip()
+                if tags_text and tags_text not in _EMPTY_TAG_TEXTS:
+                    data['tags'] = tags_text
+                    break
+
+        # 4. 底部统计数据（使用更灵活的匹配方式）
+        data['review_count'] = None
+        data['favorite_count'] = None
+        data['nutrient_count'] = None
+        data['total_click_count'] = None
+        data['score'] = None
+
+        m_review = _RE_REVIEW_COUNT.search(page_text)
+        if m_review:
+            data['review_count'] = int(m_review.group(1))
+
+        m_fav = _RE_FAVORITE_COUNT.search(page_text)
+        if m_fav:
+            data['favorite_count'] = int(m_fav.group(1))
+
+        m_nutrient = _RE_NUTRIENT_COUNT.search(page_text)
+        if m_nutrient:
+            data['nutrient_count'] = int(m_nutrient.group(1))
+
+        m_score = _RE_SCORE.search(page_text)
+        if m_score:
+            score_str = m_score.group(1).replace(',', '')
+            data['score'] = int(score_str) if score_str.isdigit() else None
+
+        m_click = _RE_CLICK_COUNT.search(page_text)
+        if m_click:
+            data['total_click_count'] = int(m_click.group(1))
+
+        # 5. 最新更新时间
+        if "最新更新" in page_text:
+            m3 = _RE_LAST_UPDATE.search(page_text)
+            if m3:
+                data['last_update_time'] = m3.group(1)
+
+    @staticmethod
+    def _apply_info_item(data: Dict, text: str, has_img: bool, font_text: Optional[str]) -> None:
+        """解析基本信息列表（ul[name=printright]）里的一项。"""
+        if text.startswith("文章类型："):
+            data['category'] = text.replace("文章类型：", "")
+        elif text.startswith("作品视角："):
+            data['perspective'] = text.replace("作品视角：", "")
+        elif text.startswith("所属系列："):
+            data['series'] = text.replace("所属系列：", "")
+        elif text.startswith("文章进度："):
+            data['status'] = text.replace("文章进度：", "")
+        elif text.startswith("全文字数："):
+            num_str = "".join(filter(str.isdigit, text))
+            data['word_count'] = int(num_str) if num_str else None
+        elif text.startswith("版权转化："):
+            if "尚未出版" in text:
+                data['publish_status'] = "尚未出版"
+            else:
+                data['publish_status'] = "已出版" if has_img else text.replace("版权转化：", "")
+        elif text.startswith("签约状态："):
+            data['sign_status'] = font_text if font_text is not None else text.replace("签约状态：", "")
+
+    @staticmethod
+    def _tags_from_label_text(full_text: str) -> Optional[str]:
+        """从「xx标签：a b c」形式的整段文本里切出标签部分（span 兜底路径用）。"""
+        if '：' in full_text or ':' in full_text:
+            tags_part = _RE_COLON.split(full_text, 1)
+            if len(tags_part) > 1:
+                tags_text = _RE_WHITESPACE.sub(' ', tags_part[1].strip())
+                if tags_text and tags_text not in _EMPTY_TAG_TEXTS:
+                    return tags_text
+        return None
+
+    def _parse_detail_lxml(self, page_html: str) -> Dict:
+        """快速路径：lxml 建树，按需定向取节点；整页纯文本只遍历一次。"""
+        data = {}
+        root = _lxml_html.fromstring(page_html).getroottree().getroot()
+        page_text = "".join(s for s, _ in _lxml_strings(root))
+
+        # 0. 书名和作者
+        page_title = root.find('.//title')
+        if page_title is not None:
+            parts = "".join(s for s, _ in _lxml_strings(page_title)).strip().split('_')
+            if len(parts) >= 2:
+                data['title'] = parts[0].strip()
+                data['author'] = parts[1].strip()
+
+        title_tag = _first(root.xpath('//span[@itemprop="articleSection"]'))
+        if title_tag is not None:
+            data['title'] = _lxml_text_strip(title_tag)
+
+        author_tag = _first(root.xpath('//span[@itemprop="author"]'))
+        if author_tag is not None:
+            author_link = next(author_tag.iterdescendants('a'), None)
+            data['author'] = _lxml_text_strip(author_link if author_link is not None else author_tag)
+
+        if not data.get('author'):
+            for text, parent in _lxml_strings(root, include_hidden=True):
+                if parent is None or not _RE_AUTHOR_LABEL.search(text):
+                    continue
+                author_link = next(
+                    (a for a in parent.iterdescendants('a') if _RE_AUTHOR_HREF.search(a.get('href') or '')),
+                    None,
+                )
+                if author_link is not None:
+                    data['author'] = _lxml_text_strip(author_link)
+                    break
+
+        if not data.get('author'):
+            meta_author = _first(root.xpath('//meta[@name="Author"]'))
+            if meta_author is not None and meta_author.get('content'):
+                data['author'] = meta_author.get('content').strip()
+
+        if not data.get('title'):
+            h1_tag = root.find('.//h1')
+            if h1_tag is not None:
+                data['title'] = _lxml_text_strip(h1_tag)
+
+        # 1. 封面图片
+        cover_candidates = []
+        cover_img = _first(root.xpath('//img[@itemprop="image"]'))
+        if cover_img is not None and cover_img.get('src'):
+            cover_candidates.append(cover_img.get('src'))
+        cover_img = next(
+            (img for img in root.iter('img')
+             if any(k in (img.get('class') or '').lower() for k in ('noveldefaultimage', 'noveldisplayimage'))),
+            None,
+        )
+        if cover_img is not None and cover_img.get('src'):
+            cover_candidates.append(cover_img.get('src'))
+        td_with_img = _first(root.xpath('//td[@width="100"]'))
+        if td_with_img is not None:
+            img = next(td_with_img.iterdescendants('img'), None)
+            if img is not None and img.get('src'):
+                cover_candidates.append(img.get('src'))
+        data['cover_url'] = self._best_cover_url(cover_candidates)
+
+        # 2. 小说简介（文案）
+        intro_div = _first(root.xpath('//div[@id="novelintro" and @itemprop="description"]'))
+        if intro_div is not None:
+            data['intro'] = "\n".join(s.strip() for s, _ in _lxml_strings(intro_div) if s.strip())
+
+        self._apply_page_text_fields(data, page_text)
+
+        if not data['tags']:
+            for span in root.iter('span'):
+                span_text = _lxml_text_strip(span)
+                if '文章标签' in span_text or '标签' in span_text:
+                    parent = span.getparent()
+                    if parent is not None:
+                        tags_text = self._tags_from_label_text(_lxml_text_strip(parent))
+                        if tags_text:
+                            data['tags'] = tags_text
+                            break
+
+        # 3. 基本信息列表
+        info_ul = _first(root.xpath('//ul[@name="printright"]'))
+        if info_ul is not None:
+            for li in info_ul.iterdescendants('li'):
+                font_tag = next(li.iterdescendants('font'), None)
+                self._apply_info_item(
+                    data,
+                    _lxml_text_strip(li),
+                    next(li.iterdescendants('img'), None) is not None,
+                    _lxml_text_strip(font_tag) if font_tag is not None else None,
+                )
+
+        # 5. 章节数：只数正文章节链接
+        data['chapter_count'] = sum(
+            1 for a in root.iter('a') if _RE_CHAPTER_HREF.search(a.get('href') or '')
+        )
+        return data
+
+    def _parse_detail_soup(self, page_html: str) -> Dict:
+        """回退路径：BeautifulSoup(html.parser)，纯 Python 实现，慢但容错最好。"""
+        data = {}
+        soup = BeautifulSoup(page_html, "html.parser")
         page_text = soup.get_text()  # 页面所有文本，用于搜索特定关键字
 
         # 0. 书名和作者（从页面标题或元数据中提取）
@@ -271,11 +787,11 @@ class JinjiangCrawler:
         # 方法3: 从"作者："文本后的链接提取（常见格式）
         if not data.get('author'):
             # 查找包含"作者："的文本
-            for text_node in soup.find_all(string=re.compile(r'作者[:：]')):
+            for text_node in soup.find_all(string=_RE_AUTHOR_LABEL):
                 parent = text_node.parent
                 if parent:
                     # 查找相邻的作者链接
-                    author_link = parent.find('a', href=re.compile(r'oneauthor\.php\?authorid='))
+                    author_link = parent.find('a', href=_RE_AUTHOR_HREF)
                     if author_link:
                         data['author'] = author_link.get_text(strip=True)
                         break
@@ -293,39 +809,6 @@ class JinjiangCrawler:
                 data['title'] = h1_tag.get_text(strip=True)
 
         # 1. 封面图片（优先使用晋江官方图床，过滤外部图床）
-        data['cover_url'] = None
-
-        def is_jjwxc_image(url: str) -> bool:
-            """检查是否为晋江官方图床链接"""
-            if not url:
-                return False
-            jjwxc_domains = [
-                'jjwxc.net',  # 晋江官方域名
-                'static.jjwxc.net',  # 静态资源
-            ]
-            return any(domain in url for domain in jjwxc_domains)
-
-        def get_best_cover_url(img_candidates: list) -> Optional[str]:
-            """从候选图片中选择最佳封面（优先晋江官方图床）"""
-            jjwxc_urls = []
-            external_urls = []
-
-            for img_url in img_candidates:
-                if not img_url:
-                    continue
-                full_url = urljoin(self.base_url, img_url)
-                if is_jjwxc_image(full_url):
-                    jjwxc_urls.append(full_url)
-                else:
-                    external_urls.append(full_url)
-
-            # 优先返回晋江官方图床，否则返回外部图床
-            if jjwxc_urls:
-                return jjwxc_urls[0]
-            elif external_urls:
-                return external_urls[0]
-            return None
-
         # 收集所有可能的封面候选
         cover_candidates = []
 
@@ -347,51 +830,17 @@ class JinjiangCrawler:
                 cover_candidates.append(img.get('src'))
 
         # 选择最佳封面URL（优先晋江官方图床）
-        data['cover_url'] = get_best_cover_url(cover_candidates)
+        data['cover_url'] = self._best_cover_url(cover_candidates)
 
         # 2. 小说简介（文案）
         intro_div = soup.find('div', id='novelintro', attrs={"itemprop": "description"})
         if intro_div:
             data['intro'] = intro_div.get_text("\n", strip=True)
 
-        # 2. 主角/配角/其它信息
-        idx = page_text.find("主角：")
-        if idx != -1:
-            snippet = page_text[idx: idx + 200]
-            data['main_chars'] = None
-            data['support_chars'] = None
-            data['other_info'] = None
-            parts = snippet.split('┃')
-            for part in parts:
-                part = part.strip()
-                if part.startswith("主角："):
-                    data['main_chars'] = part.replace("主角：", "").strip()
-                elif part.startswith("配角："):
-                    data['support_chars'] = part.replace("配角：", "").strip()
-                elif part.startswith("其它："):
-                    data['other_info'] = part.replace("其它：", "").strip()
-
-        # 2.5 标签信息（新增）
-        # 尝试多种可能的标签位置
-        tags_patterns = [
-            r"文章标签[:：]\s*([^\n]+)",
-            r"标签[:：]\s*([^\n]+)",
-            r"搜索关键字[:：]\s*([^\n]+)"
-        ]
-
-        data['tags'] = None
-        for pattern in tags_patterns:
-            tags_match = re.search(pattern, page_text)
-            if tags_match:
-                tags_text = tags_match.group(1).strip()
-                # 清理标签文本，去除多余的空格和符号
-                tags_text = re.sub(r'\s+', ' ', tags_text)
-                tags_text = tags_text.replace('┃', '').strip()
-                if tags_text and tags_text not in ['无', '暂无', '-', '']:
-                    data['tags'] = tags_text
-                    break
+        # 主角/标签/统计/更新时间：整页文本正则
+        self._apply_page_text_fields(data, page_text)
 
-        # 如果上述方法都没找到，尝试从 span 标签中提取
+        # 如果正则没找到标签，尝试从 span 标签中提取
         if not data['tags']:
             # 查找包含标签的元素
             for span in soup.find_all('span'):
@@ -399,91 +848,30 @@ class JinjiangCrawler:
                 if '文章标签' in span_text or '标签' in span_text:
                     parent = span.parent
                     if parent:
-                        full_text = parent.get_text(strip=True)
-                        # 提取标签内容
-                        if '：' in full_text or ':' in full_text:
-                            tags_part = re.split(r'[:：]', full_text, 1)
-                            if len(tags_part) > 1:
-                                tags_text = tags_part[1].strip()
-                                tags_text = re.sub(r'\s+', ' ', tags_text)
-                                if tags_text and tags_text not in ['无', '暂无', '-', '']:
-                                    data['tags'] = tags_text
-                                    break
+                        tags_text = self._tags_from_label_text(parent.get_text(strip=True))
+                        if tags_text:
+                            data['tags'] = tags_text
+                            break
 
         # 3. 基本信息列表
         info_ul = soup.find('ul', attrs={'name': 'printright'})
         if info_ul:
-            li_tags = info_ul.find_all('li')
-            for li in li_tags:
-                text = li.get_text(strip=True)
-                if text.startswith("文章类型："):
-                    data['category'] = text.replace("文章类型：", "")
-                elif text.startswith("作品视角："):
-                    data['perspective'] = text.replace("作品视角：", "")
-                elif text.startswith("所属系列："):
-                    data['series'] = text.replace("所属系列：", "")
-                elif text.startswith("文章进度："):
-                    data['status'] = text.replace("文章进度：", "")
-                elif text.startswith("全文字数："):
-                    num_str = "".join(filter(str.isdigit, text))
-                    data['word_count'] = int(num_str) if num_str else None
-                elif text.startswith("版权转化："):
-                    if "尚未出版" in text:
-                        data['publish_status'] = "尚未出版"
-                    else:
-                        data['publish_status'] = "已出版" if li.find('img') else text.replace("版权转化：", "")
-                elif text.startswith("签约状态："):
-                    font_tag = li.find('font')
-                    if font_tag:
-                        data['sign_status'] = font_tag.get_text(strip=True)
-                    else:
-                        data['sign_status'] = text.replace("签约状态：", "")
-
-        # 4. 底部统计数据（使用更灵活的匹配方式）
-        # 初始化统计数据
-        data['review_count'] = None
-        data['favorite_count'] = None
-        data['nutrient_count'] = None
-        data['total_click_count'] = None
-        data['score'] = None
-
-        # 方法1: 尝试从整个页面文本中提取
-        # 书评数
-        m_review = re.search(r"总书评数[：:]\s*(\d+)", page_text)
-        if m_review:
-            data['review_count'] = int(m_review.group(1))
-
-        # 收藏数
-        m_fav = re.search(r"(?:当前)?(?:被)?收藏数[：:]\s*(\d+)", page_text)
-        if m_fav:
-            data['favorite_count'] = int(m_fav.group(1))
-
-        # 营养液
-        m_nutrient = re.search(r"营养液数[：:]\s*(\d+)", page_text)
-        if m_nutrient:
-            data['nutrient_count'] = int(m_nutrient.group(1))
-
-        # 文章积分
-        m_score = re.search(r"文章积分[：:]\s*([\d,]+)", page_text)
-        if m_score:
-            score_str = m_score.group(1).replace(',', '')
-            data['score'] = int(score_str) if score_str.isdigit() else None
-
-        # 点击数
-        m_click = re.search(r"(?:非V章节)?总点击数[：:]\s*(\d+)", page_text)
-        if m_click:
-            data['total_click_count'] = int(m_click.group(1))
-
-        # 5. 最新更新时间和章节数
-        if "最新更新" in page_text:
-            m3 = re.search(r"最新更新[:：](\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})", page_text)
-            if m3:
-                data['last_update_time'] = m3.group(1)
-        chapter_links = soup.find_all('a', href=re.compile(r'novelid=\d+&chapterid=\d+'))
+            for li in info_ul.find_all('li'):
+                font_tag = li.find('font')
+                self._apply_info_item(
+                    data,
+                    li.get_text(strip=True),
+                    li.find('img') is not None,
+                    font_tag.get_text(strip=True) if font_tag else None,
+                )
+
+        # 5. 章节数
+        chapter_links = soup.find_all('a', href=_RE_CHAPTER_HREF)
         data['chapter_count'] = len(chapter_links)
 
         return data
 
+    @traced("crawler.fetch_basicinfo")
     def _fetch_basicinfo(self, book_id) -> Dict:
         """
         调晋江移动端 novelbasicinfo 接口，返回原始 JSON dict（含限速）。
@@ -495,14 +883,14 @@ class JinjiangCrawler:
         """
         if not book_id:
             return {}
-        url = f"https://app.jjwxc.org/androidapi/novelbasicinfo?novelId={book_id}"
+        url = f"{JJWXC_APP_BASE}/androidapi/novelbasicinfo?novelId={book_id}"
         try:
-            time.sleep(random.uniform(1.0, 2.0))
-            resp = requests.get(url, headers=self._mobile_headers(), timeout=12)
+            _rate_limiter.wait(_MOBILE_HOST, 1.0, 2.0)
+            resp = self._get(url, self._mobile_headers(), 12, archive_kind="basicinfo", book_id=book_id)
             resp.encoding = "utf-8"
             return resp.json()
         except Exception as e:
-            print(f"⚠ 移动API获取失败 (book_id={book_id}): {e}")
+            logger.warning(f"移动API获取失败: {e}", extra={"book_id": book_id, "phase": "basicinfo"})
             return {}
 
     def fetch_mobile_extras(self, book_id) -> Dict:
@@ -515,8 +903,39 @@ class JinjiangCrawler:
         Returns:
             dict: 仅含成功解析到的字段，失败或缺字段时安全返回（不覆盖已有数据）。
         """
+        return self.parse_mobile_extras(self._fetch_basicinfo(book_id))
+
+    def fetch_mobile_extras_if_changed(self, book_id, state: Optional[Dict]) -> Tuple[Optional[Dict], Dict]:
+        """
+        条件抓取 novelbasicinfo（刷新用）。
+
+        Returns:
+            (extras, validators)：响应未变化时 extras 为 None；validators 见 fetch_if_changed
+
+        Raises:
+            CrawlerException: 请求失败
+        """
+        url = f"{JJWXC_APP_BASE}/androidapi/novelbasicinfo?novelId={book_id}"
+        try:
+            _rate_limiter.wait(_MOBILE_HOST, 1.0, 2.0)
+            resp, validators = self.fetch_if_changed(
+                url, self._mobile_headers(), 12, state, archive_kind="basicinfo", book_id=book_id
+            )
+            if resp is None:
+                return None, validators
+            resp.encoding = "utf-8"
+            return self.parse_mobile_extras(resp.json()), validators
+        except Exception as e:
+            raise CrawlerException(f"移动API获取失败 (book_id={book_id}): {e}")
+
+    @staticmethod
+    def parse_mobile_extras(d: Dict) -> Dict:
+        """
+        从 novelbasicinfo 原始 JSON 中提取统计数据 + 富字段（纯解析，不发请求）。
+
+        fetch_mobile_extras 与离线重新解析（scripts/reparse_archive.py）共用。
+        """
         extras: Dict = {}
-        d = self._fetch_basicinfo(book_id)
         if not d:
             return extras
 
@@ -557,7 +976,7 @@ class JinjiangCrawler:
                 extras[dst] = val
 
         # 文章积分：移动端是近似值（带万/亿），仅作为缺失时的兜底，
-        # 桌面端静态页能拿到精确整数，crawl_novel_complete 会优先保留它
+        # 桌面端静态页能拿到精确整数，merge_mobile_extras 会优先保留它
         score = _parse_cn_number(d.get("novelScore"))
         if score is not None:
             extras["score"] = score
@@ -592,6 +1011,101 @@ class JinjiangCrawler:
 
         return extras
 
+    # ── 目录发现：按 id 直接取书 / 从榜单页收集 id ─────────────────
+    def fetch_mobile_book(self, book_id) -> Optional[Dict]:
+        """
+        只用一次 novelbasicinfo 调用取一本书的完整入库行（目录发现用，比桌面详情页快且轻）。
+
+        Returns:
+            dict: parse_mobile_book 的结果；该 id 不存在（接口无书名）时返回 None
+
+        Raises:
+            CrawlerException: 网络错误或响应不是 JSON（调用方据此重试，而不是判为不存在）
+        """
+        url = f"{JJWXC_APP_BASE}/androidapi/novelbasicinfo?novelId={book_id}"
+        try:
+            _rate_limiter.wait(_MOBILE_HOST, 1.0, 2.0)
+            resp = self._get(url, self._mobile_headers(), 12, archive_kind="basicinfo", book_id=book_id)
+            resp.raise_for_status()
+            resp.encoding = "utf-8"
+            d = resp.json()
+        except Exception as e:
+            raise CrawlerException(f"移动API获取失败 (book_id={book_id}): {e}")
+        return self.parse_mobile_book(book_id, d)
+
+    @staticmethod
+    def parse_mobile_book(book_id, d: Dict) -> Optional[Dict]:
+        """
+        把 novelbasicinfo 原始 JSON 解析成与桌面端爬取同形的 book 行（纯解析）。
+
+        基本信息字段与桌面详情页一一对应（书名、作者、文章类型、视角、标签、进度、字数……），
+        统计与富字段复用 parse_mobile_extras。接口没有的字段保持缺失，
+        之后可由 fetch_cover_if_missing / 刷新调度按需补抓详情页。
+        """
+        if not isinstance(d, dict) or not d.get("novelName"):
+            return None
+
+        def _text(key):
+            v = d.get(key)
+            if v is None:
+                return None
+            v = html.unescape(str(v)).replace("<br>", "\n").replace("<br/>", "\n").strip()
+            return v or None
+
+        data: Dict = {
+            "book_id": int(book_id),
+            "title": _text("novelName"),
+            "author": _text("authorName"),
+            "intro": _text("novelIntro"),
+            "category": _text("novelClass"),
+            "perspective": _text("mainview"),
+            "series": _text("series"),
+            "main_chars": _text("protagonist"),
+            "support_chars": _text("costar"),
+            "other_info": _text("other"),
+            "last_update_time": _text("renewDate"),
+            "cover_url": _text("novelCover"),
+        }
+
+        # 标签：接口是逗号/空格分隔，统一成桌面端的空格分隔
+        tags = _text("novelTags")
+        if tags:
+            tags = " ".join(t for t in re.split(r"[,，\s]+", tags) if t)
+        data["tags"] = tags if tags not in _EMPTY_TAG_TEXTS else None
+
+        # 进度：novelStep 2 = 完结，其余视为连载
+        step = d.get("novelStep")
+        if step is not None:
+            data["status"] = "完结" if str(step) == "2" else "连载"
+
+        for src, dst in [("novelSize", "word_count"), ("novelChapterCount", "chapter_count")]:
+            digits = re.sub(r"[^\d]", "", str(d.get(src) or ""))
+            if digits:
+                data[dst] = int(digits)
+
+        data.update(JinjiangCrawler.parse_mobile_extras(d))
+        return {k: v for k, v in data.items() if v is not None}
+
+    def fetch_listing_ids(self, listing_url: str) -> list:
+        """
+        抓一个榜单/列表页，按出现顺序返回页面上所有作品的 novelid（去重）。
+
+        Raises:
+            CrawlerException: 请求失败
+        """
+        try:
+            _rate_limiter.wait(_DESKTOP_HOST, 2.0, 3.0)
+            resp = self._get(listing_url, self._get_headers(), 15)
+            resp.raise_for_status()
+        except Exception as e:
+            raise CrawlerException(f"获取列表页失败: {listing_url}, 原因: {str(e)}")
+        resp.encoding = "gb18030"
+        seen = {}
+        for m in _RE_LISTING_NOVELID.finditer(resp.text):
+            seen.setdefault(int(m.group(1)), None)
+        return list(seen)
+
+    @traced("crawler.crawl_novel_complete")
     def crawl_novel_complete(self, novel_name: str) -> Dict:
         """
         完整爬取流程：搜索 → 获取详情
@@ -621,17 +1135,26 @@ class JinjiangCrawler:
             **detail  # 所有详情字段
         }
 
-        # Step 4: 用移动端 API 覆盖统计数据（营养液/点击数等桌面端静态页抓不到）
-        # 并补充富字段（一句话简介/角色/关系）。
-        # 但桌面端的「文章积分」是精确整数，优于移动端的近似值（74.3亿），故予以保留
-        desktop_score = complete_data.get("score")
-        complete_data.update(self.fetch_mobile_extras(complete_data.get("book_id")))
-        if desktop_score is not None:
-            complete_data["score"] = desktop_score
+        # Step 4: 用移动端 API 覆盖统计数据并补充富字段
+        self.merge_mobile_extras(complete_data, self.fetch_mobile_extras(complete_data.get("book_id")))
 
         return complete_data
 
+    @staticmethod
+    def merge_mobile_extras(data: Dict, extras: Dict) -> Dict:
+        """
+        用移动端 API 覆盖统计数据（营养液/点击数等桌面端静态页抓不到）
+        并补充富字段（一句话简介/角色/关系）。
+        但桌面端的「文章积分」是精确整数，优于移动端的近似值（74.3亿），故予以保留。
+        """
+        desktop_score = data.get("score")
+        data.update(extras)
+        if desktop_score is not None:
+            data["score"] = desktop_score
+        return data
+
     # ── 章节试读（前 N 章免费正文）─────────────────────────────────
+    @traced("crawler.fetch_chapter_list")
     def fetch_chapter_list(self, book_id) -> list:
         """
         取小说章节列表（移动端 chapterList 接口）。
@@ -642,18 +1165,22 @@ class JinjiangCrawler:
         """
         if not book_id:
             return []
-        url = f"https://app.jjwxc.org/androidapi/chapterList?novelId={book_id}"
+        url = f"{JJWXC_APP_BASE}/androidapi/chapterList?novelId={book_id}"
         try:
-            time.sleep(random.uniform(1.0, 2.0))
-            resp = requests.get(url, headers=self._mobile_headers(), timeout=12)
+            _rate_limiter.wait(_MOBILE_HOST, 1.0, 2.0)
+            resp = self._get(url, self._mobile_headers(), 12, archive_kind="chapter_list", book_id=book_id)
             resp.encoding = "utf-8"
-            raw = resp.json().get("chapterlist", [])
+            payload = resp.json()
         except Exception as e:
-            print(f"⚠ 章节列表获取失败 (book_id={book_id}): {e}")
+            logger.warning(f"章节列表获取失败: {e}", extra={"book_id": book_id, "phase": "chapter_list"})
             return []
+        return self.parse_chapter_list(payload)
 
+    @staticmethod
+    def parse_chapter_list(payload: Dict) -> list:
+        """从 chapterList 原始 JSON 解析章节列表（纯解析，规则见 fetch_chapter_list）。"""
         chapters = []
-        for c in raw:
+        for c in payload.get("chapterlist", []):
             # 卷标题分隔项：chaptertype=1 且无正文（size=0），跳过
             if str(c.get("chaptertype")) == "1" or str(c.get("chaptersize")) in ("0", ""):
                 continue
@@ -665,6 +1192,7 @@ class JinjiangCrawler:
             })
         return chapters
 
+    @traced("crawler.fetch_chapter_content")
     def fetch_chapter_content(self, book_id, chapter_id) -> Dict:
         """
         取单章正文（移动端 chapterContent 接口）。
@@ -675,16 +1203,22 @@ class JinjiangCrawler:
         """
         if not book_id or not chapter_id:
             return {}
-        url = f"https://app.jjwxc.org/androidapi/chapterContent?novelId={book_id}&chapterId={chapter_id}"
+        url = f"{JJWXC_APP_BASE}/androidapi/chapterContent?novelId={book_id}&chapterId={chapter_id}"
         try:
-            time.sleep(random.uniform(1.0, 2.0))
-            resp = requests.get(url, headers=self._mobile_headers(), timeout=12)
+            _rate_limiter.wait(_MOBILE_HOST, 1.0, 2.0)
+            resp = self._get(url, self._mobile_headers(), 12, archive_kind="chapter_content",
+                             book_id=book_id, chapter_id=chapter_id)
             resp.encoding = "utf-8"
             d = resp.json()
         except Exception as e:
-            print(f"⚠ 章节正文获取失败 (book_id={book_id}, ch={chapter_id}): {e}")
+            logger.warning(f"章节正文获取失败: {e}",
+                           extra={"book_id": book_id, "chapter_id": chapter_id, "phase": "chapter_content"})
             return {}
+        return self.parse_chapter_content(d)
 
+    @staticmethod
+    def parse_chapter_content(d: Dict) -> Dict:
+        """从 chapterContent 原始 JSON 解析单章正文（纯解析）。"""
         return {
             "chapter_name": (d.get("chapterName") or "").strip(),
             "chapter_intro": html.unescape(str(d.get("chapterIntro") or "")).strip(),
@@ -702,10 +1236,21 @@ class JinjiangCrawler:
         content / author_say。失败/无免费章节返回 []。
         """
         chapters = self.fetch_chapter_list(book_id)
+        return self.assemble_free_chapters(
+            chapters, lambda chapter_id: self.fetch_chapter_content(book_id, chapter_id), n
+        )
+
+    @staticmethod
+    def assemble_free_chapters(chapters: list, get_content, n: int = 3) -> list:
+        """
+        从章节列表挑前 n 个非 VIP 章节，用 get_content(chapter_id) 取正文并组装成 chapter 行。
+
+        get_content 在线爬取时是 fetch_chapter_content，离线重新解析时从归档读。
+        """
         free = [c for c in chapters if not c["is_vip"]][:n]
         result = []
         for order, c in enumerate(free, 1):
-            detail = self.fetch_chapter_content(book_id, c["chapter_id"])
+            detail = get_content(c["chapter_id"])
             if not detail or not detail.get("content"):
                 continue
             result.append({
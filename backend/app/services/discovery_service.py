@@ -0,0 +1,285 @@
+"""
+目录发现：主动把晋江的书批量导入库里
+
+原先书库只在用户搜到库里没有的书时才增长，推荐候选池局限于被搜过的书，
+用户还要等 5~10 秒的实时爬取。发现流程：
+
+1. 发现源往 discovery_frontier 队列里投 id（按 book_id 去重，已入库的书直接跳过）
+   - ranking：抓榜单/列表页（DISCOVERY_RANKING_URLS），优先级高
+   - id_range：按 id 区间顺序扫描，断点记在 discovery_checkpoint，队列空了再补下一段
+2. 按优先级领取待抓 id，每本一次 novelbasicinfo（走爬虫的共享限速），解析成完整 book 行
+3. 攒满一批用 bulk_upsert_novels 一次事务写入，再把这批 id 标记为 done / missing
+
+队列和断点都在库里：进程中断后重跑，未标记的 id 仍是 pending，会被重新领取。
+同一时刻只应有一个发现进程在跑（领取不加行锁）。
+"""
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from ..config import (
+    DATABASE_URL,
+    DISCOVERY_RANKING_URLS,
+    DISCOVERY_ID_START,
+    DISCOVERY_ID_END,
+    DISCOVERY_ID_BATCH,
+    DISCOVERY_INTERVAL,
+    DISCOVERY_BUDGET,
+)
+from ..database.connection import get_db_connection
+from .crawler_service import JinjiangCrawler, CrawlerException
+from .novel_service import bulk_upsert_novels, get_existing_book_ids
+
+logger = logging.getLogger(__name__)
+
+_P = "%s" if DATABASE_URL else "?"
+
+SOURCE_RANKING = "ranking"
+SOURCE_ID_RANGE = "id_range"
+
+# 榜单上的书先抓（热门书对推荐候选池价值最大）
+_SOURCE_PRIORITY = {SOURCE_RANKING: 1.0, SOURCE_ID_RANGE: 0.0}
+_MAX_ATTEMPTS = 3     # 网络失败重试次数，超过标记 failed
+_WRITE_BATCH = 50     # 每批领取 / 写库的书数
+
+
+# ── 断点 ──────────────────────────────────────────────────────
+def get_checkpoint(source: str) -> Optional[str]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT position FROM discovery_checkpoint WHERE source = {_P}", (source,))
+        row = cursor.fetchone()
+        return dict(row)["position"] if row else None
+
+
+def set_checkpoint(source: str, position: str) -> None:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            INSERT INTO discovery_checkpoint (source, position, updated_at) VALUES ({_P}, {_P}, {_P})
+            ON CONFLICT (source) DO UPDATE SET
+                position = excluded.position, updated_at = excluded.updated_at
+        """, (source, position, time.time()))
+
+
+# ── 队列 ──────────────────────────────────────────────────────
+def enqueue(book_ids: Iterable[int], source: str, priority: Optional[float] = None) -> int:
+    """
+    把 id 投进发现队列，返回新入队的个数。
+
+    已入库的书、已在队列里的 id 都跳过；已在队列里仍 pending 的 id 若这次优先级更高则提级。
+    """
+    ids = list(dict.fromkeys(int(i) for i in book_ids))
+    if not ids:
+        return 0
+    ids = [i for i in ids if i not in get_existing_book_ids(ids)]
+    if not ids:
+        return 0
+    if priority is None:
+        priority = _SOURCE_PRIORITY.get(source, 0.0)
+
+    now = time.time()
+    placeholders = ", ".join([_P] * len(ids))
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT book_id FROM discovery_frontier WHERE book_id IN ({placeholders})", ids)
+        queued = {dict(row)["book_id"] for row in cursor.fetchall()}
+        cursor.executemany(f"""
+            INSERT INTO discovery_frontier (book_id, source, priority, enqueued_at, updated_at)
+            VALUES ({_P}, {_P}, {_P}, {_P}, {_P})
+            ON CONFLICT (book_id) DO UPDATE SET priority = excluded.priority
+            WHERE discovery_frontier.status = 'pending'
+              AND discovery_frontier.priority < excluded.priority
+        """, [(i, source, priority, now, now) for i in ids])
+    return len(ids) - len(queued)
+
+
+def _claim(limit: int) -> List[int]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT book_id FROM discovery_frontier
+            WHERE status = 'pending'
+            ORDER BY priority DESC, enqueued_at, book_id
+            LIMIT {_P}
+        """, (limit,))
+        return [dict(row)["book_id"] for row in cursor.fetchall()]
+
+
+def _mark(done: Sequence[tuple], retry: Sequence[tuple]) -> None:
+    """
+    done:  [(book_id, status)]，status 为 done / missing
+    retry: [(book_id, error)]，失败次数 +1，满 _MAX_ATTEMPTS 次标记 failed，否则留在 pending
+    """
+    now = time.time()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        if done:
+            cursor.executemany(
+                f"UPDATE discovery_frontier SET status = {_P}, updated_at = {_P} WHERE book_id = {_P}",
+                [(status, now, book_id) for book_id, status in done],
+            )
+        if retry:
+            cursor.executemany(f"""
+                UPDATE discovery_frontier SET
+                    attempts   = attempts + 1,
+                    status     = CASE WHEN attempts + 1 >= {_MAX_ATTEMPTS} THEN 'failed' ELSE 'pending' END,
+                    last_error = {_P},
+                    updated_at = {_P}
+                WHERE book_id = {_P}
+            """, [(error[:500], now, book_id) for book_id, error in retry])
+
+
+def reset_failed() -> int:
+    """把 failed 的 id 放回 pending（上游故障恢复后重试），返回个数。"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE discovery_frontier SET status = 'pending', attempts = 0 WHERE status = 'failed'"
+        )
+        return cursor.rowcount
+
+
+def frontier_status() -> Dict:
+    """队列各状态计数 + 各发现源断点。"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT status, COUNT(*) AS n FROM discovery_frontier GROUP BY status")
+        counts = {dict(r)["status"]: dict(r)["n"] for r in cursor.fetchall()}
+        cursor.execute("SELECT source, position, updated_at FROM discovery_checkpoint")
+        checkpoints = {dict(r)["source"]: dict(r) for r in cursor.fetchall()}
+    return {"counts": counts, "checkpoints": checkpoints}
+
+
+# ── 发现源 ────────────────────────────────────────────────────
+def seed_rankings(urls: Sequence[str] = DISCOVERY_RANKING_URLS,
+                  crawler: Optional[JinjiangCrawler] = None) -> Dict:
+    """抓各榜单页，把页面上的作品 id 投进队列。"""
+    crawler = crawler or JinjiangCrawler()
+    result = {"requests": 0, "found": 0, "enqueued": 0, "errors": 0}
+    for url in urls:
+        result["requests"] += 1
+        try:
+            ids = crawler.fetch_listing_ids(url)
+        except CrawlerException as e:
+            logger.warning(f"榜单抓取失败: {e}", extra={"phase": "discovery", "url": url})
+            result["errors"] += 1
+            continue
+        result["found"] += len(ids)
+        result["enqueued"] += enqueue(ids, SOURCE_RANKING)
+    return result
+
+
+def seed_id_range(count: int = DISCOVERY_ID_BATCH, start: int = DISCOVERY_ID_START,
+                  end: int = DISCOVERY_ID_END) -> int:
+    """
+    从断点起把下一段 [pos, pos+count) 的 id 投进队列并推进断点，返回本段 id 个数（扫完返回 0）。
+
+    先入队后推进断点：两步之间中断只会重投同一段，队列去重兜底。
+    """
+    pos = int(get_checkpoint(SOURCE_ID_RANGE) or start)
+    if pos >= end:
+        return 0
+    stop = min(pos + count, end)
+    enqueue(range(pos, stop), SOURCE_ID_RANGE)
+    set_checkpoint(SOURCE_ID_RANGE, str(stop))
+    return stop - pos
+
+
+# ── 抓取 + 批量入库 ───────────────────────────────────────────
+def run_discovery(budget: int = DISCOVERY_BUDGET, rankings: bool = True, id_range: bool = True,
+                  stop_event: Optional[threading.Event] = None,
+                  crawler: Optional[JinjiangCrawler] = None) -> Dict:
+    """
+    跑一轮发现：（可选）先刷新榜单入队，再按优先级消费队列，队列空了从 id 区间补货；
+    总上游请求数不超过 budget。有新书入库时失效推荐缓存。
+
+    Returns:
+        dict: requests / enqueued / imported / missing / retried / seconds
+    """
+    start = time.time()
+    crawler = crawler or JinjiangCrawler()
+    summary = {"requests": 0, "enqueued": 0, "imported": 0, "missing": 0, "retried": 0}
+
+    def _stopped() -> bool:
+        return stop_event is not None and stop_event.is_set()
+
+    if rankings:
+        seeded = seed_rankings(crawler=crawler)
+        summary["requests"] += seeded["requests"]
+        summary["enqueued"] += seeded["enqueued"]
+
+    while summary["requests"] < budget and not _stopped():
+        batch = _claim(min(_WRITE_BATCH, budget - summary["requests"]))
+        if not batch:
+            if id_range and seed_id_range():
+                continue
+            break
+
+        already = get_existing_book_ids(batch)  # 入队后又被用户搜索入库的书
+        rows, done, retry = [], [(i, "done") for i in batch if i in already], []
+        for book_id in batch:
+            if book_id in already:
+                continue
+            if _stopped():
+                break
+            summary["requests"] += 1
+            try:
+                row = crawler.fetch_mobile_book(book_id)
+            except CrawlerException as e:
+                retry.append((book_id, str(e)))
+                continue
+            if row is None:
+                done.append((book_id, "missing"))
+            else:
+                rows.append(row)
+
+        if rows:
+            if bulk_upsert_novels(rows):
+                done += [(row["book_id"], "done") for row in rows]
+                summary["imported"] += len(rows)
+            else:
+                retry += [(row["book_id"], "bulk upsert failed") for row in rows]
+        _mark(done, retry)
+        summary["missing"] += sum(1 for _, status in done if status == "missing")
+        summary["retried"] += len(retry)
+
+    if summary["imported"]:
+        # 延迟导入：recommendation_service → freshness_service → crawler，避免循环
+        from .recommendation_service import invalidate_recommendation_cache
+        invalidate_recommendation_cache()
+    summary["seconds"] = round(time.time() - start, 1)
+    return summary
+
+
+_scheduler_thread: Optional[threading.Thread] = None
+_scheduler_stop = threading.Event()
+
+
+def _scheduler_loop(interval: int) -> None:
+    while not _scheduler_stop.wait(interval):
+        try:
+            summary = run_discovery(stop_event=_scheduler_stop)
+            logger.info("目录发现完成", extra={"phase": "discovery", "duration_ms": summary["seconds"] * 1000,
+                                          **summary})
+        except Exception:
+            logger.exception("目录发现失败", extra={"phase": "discovery"})
+
+
+def start_discovery_scheduler(interval: int = DISCOVERY_INTERVAL) -> bool:
+    """启动进程内发现线程（interval <= 0 时不启动），返回是否已启动。"""
+    global _scheduler_thread
+    if interval <= 0 or (_scheduler_thread is not None and _scheduler_thread.is_alive()):
+        return False
+    _scheduler_stop.clear()
+    _scheduler_thread = threading.Thread(
+        target=_scheduler_loop, args=(interval,), name="catalog-discovery", daemon=True
+    )
+    _scheduler_thread.start()
+    return True
+
+
+def stop_discovery_scheduler() -> None:
+    """通知发现线程在当前这本书抓完后退出。"""
+    _scheduler_stop.set()
@@ -0,0 +1,273 @@
+"""
+抓取新鲜度 + 统计数据刷新调度
+
+fetch_stats_if_missing / fetch_cover_if_missing 只在字段为空时抓一次，之后收藏、营养液等统计
+再也不会更新。这里为每本书每类上游响应（basicinfo 移动端统计 / detail 详情页）记一行
+fetch_state（ETag / Last-Modified / 响应体哈希 / 上次抓取与上次变化时间），刷新时发条件请求：
+上游回 304 或响应体哈希不变就只更新 last_fetched，跳过解析和写库。
+
+刷新调度按「陈旧度 × 热度（favorite_count）」给书排优先级，每轮在固定请求预算
+（STATS_REFRESH_BUDGET）内刷新最该刷新的那批：
+- 可由 API 进程内的后台线程定时跑（STATS_REFRESH_INTERVAL > 0）
+- 或用 scripts/refresh_stats.py 作为外部定时任务跑
+"""
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from ..config import (
+    DATABASE_URL,
+    STATS_REFRESH_BUDGET,
+    STATS_REFRESH_INTERVAL,
+    STATS_MIN_AGE_HOURS,
+    STATS_MAX_AGE_HOURS,
+)
+from ..database.connection import get_db_connection
+from ..utils.tracing import db_query, traced
+from .crawler_service import JinjiangCrawler, CrawlerException
+from .novel_service import get_novel_by_id, insert_novel
+
+logger = logging.getLogger(__name__)
+
+_P = "%s" if DATABASE_URL else "?"
+
+FETCH_KINDS = ("detail", "basicinfo")
+
+# 桌面详情页也能抓到、但以移动端为准的统计字段：只刷新详情页时保留库里的移动端值
+_MOBILE_STAT_FIELDS = ("favorite_count", "review_count", "nutrient_count", "total_click_count")
+
+# 最近一个月内还在更新的书统计涨得快，刷新优先级额外加权
+_ACTIVE_DAYS = 30
+_ACTIVE_BOOST = 1.5
+
+
+# ── fetch_state 读写 ──────────────────────────────────────────
+@db_query("get_fetch_state")
+def get_fetch_state(book_id: int) -> Dict[str, Dict]:
+    """某本书各类响应的抓取状态：{kind: {etag, last_modified, content_hash, last_fetched, last_changed}}。"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM fetch_state WHERE book_id = {_P}", (book_id,))
+        return {row["kind"]: row for row in (dict(r) for r in cursor.fetchall())}
+
+
+@db_query("record_fetch")
+def record_fetch(book_id: int, kind: str, validators: Dict, changed: bool) -> None:
+    """记一次抓取：更新校验信息和 last_fetched；内容有变化时同时更新 last_changed。"""
+    now = time.time()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        # PostgreSQL 与 SQLite（3.24+）的 upsert 语法一致
+        cursor.execute(f"""
+            INSERT INTO fetch_state (
+                book_id, kind, etag, last_modified, content_hash, last_fetched, last_changed
+            ) VALUES ({_P}, {_P}, {_P}, {_P}, {_P}, {_P}, {_P})
+            ON CONFLICT (book_id, kind) DO UPDATE SET
+                etag          = excluded.etag,
+                last_modified = excluded.last_modified,
+                content_hash  = excluded.content_hash,
+                last_fetched  = excluded.last_fetched,
+                last_changed  = COALESCE(excluded.last_changed, fetch_state.last_changed)
+        """, (
+            book_id, kind,
+            validators.get("etag"), validators.get("last_modified"), validators.get("content_hash"),
+            now, now if changed else None,
+        ))
+
+
+def is_recently_fetched(book_id: int, kind: str = "basicinfo",
+                        hours: float = STATS_MIN_AGE_HOURS) -> bool:
+    """该类响应是否在 hours 小时内抓过（无论内容有没有变化）。"""
+    state = get_fetch_state(book_id).get(kind)
+    return bool(state and state.get("last_fetched")
+                and time.time() - state["last_fetched"] < hours * 3600)
+
+
+# ── 单本刷新 ──────────────────────────────────────────────────
+@traced()
+def refresh_book(book_id: int, kinds: Sequence[str] = ("basicinfo",),
+                 crawler: Optional[JinjiangCrawler] = None) -> Dict:
+    """
+    条件刷新一本书（书须已在库中）。
+
+    未变化的响应不解析、不写库；有变化时按在线爬取的合并规则写回 book。
+
+    Returns:
+        dict: book_id / requests（发出的上游请求数）/ changed（内容有变化的响应类型）/
+              written（是否写了库）/ novel（刷新后的行）/ errors
+    """
+    result = {"book_id": book_id, "requests": 0, "changed": [], "written": False,
+              "novel": None, "errors": []}
+    existing = get_novel_by_id(book_id)
+    if not existing:
+        result["errors"].append("not found")
+        return result
+
+    crawler = crawler or JinjiangCrawler()
+    states = get_fetch_state(book_id)
+    row = dict(existing)
+    # 有变化的响应的校验信息等写库成功后再记：写库失败（或中途退出）时保留旧哈希，下次刷新还能看出变化
+    pending: Dict[str, Dict] = {}
+
+    # 详情页先于移动端合并：移动端统计最后覆盖，桌面端精确积分由 merge_mobile_extras 保留
+    for kind in (k for k in FETCH_KINDS if k in kinds):
+        fetch = (crawler.fetch_novel_detail_if_changed if kind == "detail"
+                 else crawler.fetch_mobile_extras_if_changed)
+        result["requests"] += 1
+        try:
+            parsed, validators = fetch(book_id, states.get(kind))
+        except CrawlerException as e:
+            result["errors"].append(str(e))
+            continue
+        if parsed is None:
+            record_fetch(book_id, kind, validators, changed=False)
+            continue
+
+        pending[kind] = validators
+        result["changed"].append(kind)
+        if kind == "detail":
+            row.update(parsed)
+            for field in _MOBILE_STAT_FIELDS:
+                if existing.get(field) is not None:
+                    row[field] = existing[field]
+        else:
+            JinjiangCrawler.merge_mobile_extras(row, parsed)
+
+    # 响应变了但解析结果一样（如页面上无关区块变化）时也不写库
+    if row != existing:
+        result["written"] = insert_novel(row)
+        if not result["written"]:
+            result["errors"].append("write failed")
+            pending.clear()
+    for kind, validators in pending.items():
+        record_fetch(book_id, kind, validators, changed=True)
+    result["novel"] = row
+    return result
+
+
+# ── 刷新调度 ──────────────────────────────────────────────────
+def _is_active(last_update_time: Optional[str], now: float) -> bool:
+    if not last_update_time:
+        return False
+    try:
+        updated = datetime.strptime(last_update_time, "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        return False
+    return now - updated < _ACTIVE_DAYS * 86400
+
+
+def _refresh_priority(row: Dict, now: float) -> float:
+    """
+    刷新优先级 = 陈旧度 × 热度 ×（近期在更新 ? 1.5 : 1）。
+
+    陈旧度：距上次抓取的小时数 / STATS_MAX_AGE_HOURS，封顶 1；从没抓过的书按 1 计；
+    不足 STATS_MIN_AGE_HOURS 的书返回 0（不刷新）。热度：1 + log10(收藏量 + 1)。
+    """
+    last_fetched = row.get("last_fetched")
+    if last_fetched:
+        age_hours = (now - last_fetched) / 3600
+        if age_hours < STATS_MIN_AGE_HOURS:
+            return 0.0
+        staleness = min(age_hours / STATS_MAX_AGE_HOURS, 1.0)
+    else:
+        staleness = 1.0
+    popularity = 1.0 + math.log10((row.get("favorite_count") or 0) + 1)
+    boost = _ACTIVE_BOOST if _is_active(row.get("last_update_time"), now) else 1.0
+    return staleness * popularity * boost
+
+
+def plan_refresh(budget: int = STATS_REFRESH_BUDGET,
+                 kinds: Sequence[str] = ("basicinfo",)) -> List[Dict]:
+    """
+    按优先级挑出本轮要刷新的书：每本消耗 len(kinds) 个请求，总数不超过 budget。
+    陈旧度按 kinds 里第一类响应的 last_fetched 计算。
+
+    Returns:
+        list: [{book_id, title, favorite_count, last_fetched, priority}, ...]，优先级降序
+    """
+    per_book = max(len(kinds), 1)
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT b.book_id, b.title, b.favorite_count, b.last_update_time, f.last_fetched
+            FROM book b
+            LEFT JOIN fetch_state f ON f.book_id = b.book_id AND f.kind = {_P}
+        """, (kinds[0],))
+        rows = [dict(r) for r in cursor.fetchall()]
+
+    now = time.time()
+    for row in rows:
+        row["priority"] = _refresh_priority(row, now)
+    due = sorted((r for r in rows if r["priority"] > 0), key=lambda r: r["priority"], reverse=True)
+    return [
+        {k: r[k] for k in ("book_id", "title", "favorite_count", "last_fetched", "priority")}
+        for r in due[: budget // per_book]
+    ]
+
+
+def run_refresh_cycle(budget: int = STATS_REFRESH_BUDGET, kinds: Sequence[str] = ("basicinfo",),
+                      stop_event: Optional[threading.Event] = None) -> Dict:
+    """
+    跑一轮刷新：plan_refresh 选书 → 逐本 refresh_book（爬虫自带限速）。
+    有书写库时失效推荐缓存（收藏量参与热度排序）。stop_event 置位时在两本书之间提前结束。
+
+    Returns:
+        dict: planned / refreshed / requests / changed / written / errors / seconds
+    """
+    start = time.time()
+    plan = plan_refresh(budget, kinds)
+    crawler = JinjiangCrawler()
+    summary = {"planned": len(plan), "refreshed": 0, "requests": 0,
+               "changed": 0, "written": 0, "errors": 0}
+    for item in plan:
+        if stop_event is not None and stop_event.is_set():
+            break
+        result = refresh_book(item["book_id"], kinds, crawler)
+        summary["refreshed"] += 1
+        summary["requests"] += result["requests"]
+        summary["changed"] += bool(result["changed"])
+        summary["written"] += bool(result["written"])
+        summary["errors"] += bool(result["errors"])
+
+    if summary["written"]:
+        # 延迟导入：recommendation_service 依赖本模块
+        from .recommendation_service import invalidate_recommendation_cache
+        invalidate_recommendation_cache()
+    summary["seconds"] = round(time.time() - start, 1)
+    return summary
+
+
+_scheduler_thread: Optional[threading.Thread] = None
+_scheduler_stop = threading.Event()
+
+
+def _scheduler_loop(interval: int) -> None:
+    # 先等一个周期再跑：频繁重启部署时不会每次启动都打一轮上游
+    while not _scheduler_stop.wait(interval):
+        try:
+            summary = run_refresh_cycle(stop_event=_scheduler_stop)
+            logger.info("统计刷新完成", extra={"phase": "refresh", "duration_ms": summary["seconds"] * 1000,
+                                          **summary})
+        except Exception:
+            logger.exception("统计刷新失败", extra={"phase": "refresh"})
+
+
+def start_refresh_scheduler(interval: int = STATS_REFRESH_INTERVAL) -> bool:
+    """启动进程内刷新线程（interval <= 0 时不启动），返回是否已启动。"""
+    global _scheduler_thread
+    if interval <= 0 or (_scheduler_thread is not None and _scheduler_thread.is_alive()):
+        return False
+    _scheduler_stop.clear()
+    _scheduler_thread = threading.Thread(
+        target=_scheduler_loop, args=(interval,), name="stats-refresh", daemon=True
+    )
+    _scheduler_thread.start()
+    return True
+
+
+def stop_refresh_scheduler() -> None:
+    """通知刷新线程在当前这本书刷完后退出。"""
+    _scheduler_stop.set()
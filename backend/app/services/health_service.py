@@ -0,0 +1,142 @@
+"""
+存活 / 就绪检查
+
+/api/health 永远返回 healthy，连接池被占满、to_thread 线程池被爬虫堵住的实例也照样接流量。
+这里分两种检查：
+- 存活（/api/health/live）：进程能响应即可，只用于判断要不要重启
+- 就绪（/api/health/ready）：汇总数据库连接池占用、线程池排队深度、进行中的上游爬取、
+  缓存预热状态、上游错误率；任一饱和指标超过阈值时返回 503，让负载均衡先摘掉本实例
+
+上游错误率和预热进度只报告、不影响就绪：晋江故障时所有实例一样，摘流量没有意义；
+预热本来就设计为不推迟就绪。
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import anyio.to_thread
+
+from ..config import (
+    TO_THREAD_WORKERS,
+    READY_MAX_POOL_USAGE,
+    READY_MAX_THREAD_QUEUE,
+    READY_MAX_INFLIGHT_CRAWLS,
+)
+from ..database.connection import db_pool_stats, get_db_connection
+from ..utils.metrics import Gauge
+from ..utils.profiling import ProfilingThreadPoolExecutor
+from ..utils.scheduler_lock import holds_scheduler_lock
+from ..utils.shared_cache import shared_cache_status
+from .ann_service import ann_index_status
+from .chapter_service import user_crawls_in_flight
+from .crawler_service import crawl_health
+from .warmup_service import warmup_status
+
+# 数据库探活的超时（秒）：线程池排队或连接池卡住时，探活本身也会超时
+_DB_PING_TIMEOUT = 2.0
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def install_thread_pool(loop: asyncio.AbstractEventLoop) -> ThreadPoolExecutor:
+    """
+    显式创建 asyncio.to_thread 使用的默认线程池（大小 TO_THREAD_WORKERS），以便观测排队深度；
+    线程池同时负责把单请求 cProfile 带进工作线程（见 utils/profiling.py）。lifespan 启动时调用。
+    """
+    global _executor
+    _executor = ProfilingThreadPoolExecutor(max_workers=TO_THREAD_WORKERS, thread_name_prefix="to-thread")
+    loop.set_default_executor(_executor)
+    return _executor
+
+
+def thread_pool_stats() -> Dict:
+    """to_thread 线程池：workers（上限）/ threads（已创建）/ busy / queued（排队未开始的任务）。"""
+    if _executor is None:
+        return {"workers": None, "threads": None, "busy": None, "queued": 0}
+    threads = len(_executor._threads)
+    idle_sem = getattr(_executor, "_idle_semaphore", None)
+    idle = idle_sem._value if idle_sem is not None else 0
+    return {
+        "workers": _executor._max_workers,
+        "threads": threads,
+        "busy": max(threads - idle, 0),
+        "queued": _executor._work_queue.qsize(),
+    }
+
+
+# 饱和度指标：抓取 /metrics 时现取，和就绪检查看的是同一组数
+Gauge("novelmind_db_pool_in_use", "数据库连接占用数", function=lambda: db_pool_stats()["in_use"])
+Gauge("novelmind_thread_pool_queued", "to_thread 线程池排队任务数", function=lambda: thread_pool_stats()["queued"])
+Gauge("novelmind_thread_pool_busy", "to_thread 线程池忙碌线程数", function=lambda: thread_pool_stats()["busy"])
+Gauge("novelmind_crawler_in_flight", "进行中的上游请求数", function=lambda: crawl_health()["in_flight"])
+
+
+def _ping_db() -> float:
+    start = time.perf_counter()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+    return (time.perf_counter() - start) * 1000
+
+
+async def check_database(skip: bool = False) -> Dict:
+    """数据库探活（在线程池里跑 SELECT 1），返回 ok / latency_ms / error。"""
+    if skip:
+        return {"ok": False, "error": "skipped: thread pool saturated"}
+    try:
+        latency = await asyncio.wait_for(asyncio.to_thread(_ping_db), timeout=_DB_PING_TIMEOUT)
+        return {"ok": True, "latency_ms": round(latency, 1)}
+    except asyncio.TimeoutError:
+        return {"ok": False, "error": f"timeout after {_DB_PING_TIMEOUT}s"}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+async def readiness_report() -> Dict:
+    """
+    汇总就绪检查。
+
+    Returns:
+        dict: ready（bool）/ reasons（不就绪的原因）/ checks（各项明细）
+    """
+    pool = db_pool_stats()
+    threads = thread_pool_stats()
+    # Starlette 的同步 BackgroundTasks（封面 / 统计补全）跑在 anyio 的线程池里，单独报告
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    threads["background"] = {"busy": limiter.borrowed_tokens, "workers": limiter.total_tokens}
+    crawls = crawl_health()
+    crawls["chapter_crawls"] = user_crawls_in_flight()
+
+    reasons: List[str] = []
+    if pool["usage"] is not None and pool["usage"] >= READY_MAX_POOL_USAGE:
+        reasons.append(f"db pool usage {pool['in_use']}/{pool['max']}")
+    if threads["queued"] > READY_MAX_THREAD_QUEUE:
+        reasons.append(f"thread pool queue depth {threads['queued']}")
+    crawling = crawls["in_flight"] + crawls["waiting_rate_limit"]
+    if crawling > READY_MAX_INFLIGHT_CRAWLS:
+        reasons.append(f"{crawling} upstream requests in flight")
+
+    # 已经饱和时不再往线程池里塞探活任务
+    database = await check_database(skip=bool(reasons))
+    if not database["ok"] and not reasons:
+        reasons.append(f"database: {database['error']}")
+
+    return {
+        "ready": not reasons,
+        "reasons": reasons,
+        "checks": {
+            "database": {**database, "pool": pool},
+            "thread_pool": threads,
+            "crawler": crawls,
+            "warmup": warmup_status(),
+            "worker": {
+                "pid": os.getpid(),
+                "scheduler": holds_scheduler_lock(),
+                "shared_cache": shared_cache_status(),
+                "ann_index": ann_index_status(),
+            },
+        },
+    }
@@ -0,0 +1,355 @@
+"""
+图片代理：磁盘 LRU 缓存 + 共享异步 HTTP 客户端 + 流式转发
+
+封面是 QPS 最高的接口。原实现在事件循环线程里用阻塞的 requests.get 整张下载、
+整张放内存，且每次都回源。现在：
+- 命中：直接 FileResponse 发磁盘文件（不进 Python 内存）
+- 未命中：共享 httpx.AsyncClient 流式下载，每个分块同时推给客户端和写入缓存临时文件，
+  下载完原子改名入库；下载任务独立于请求，客户端中途断开也会把缓存写完
+- 同一 URL 的并发未命中合并成一次回源，后到的请求等首个下载完成后直接读缓存
+- 缓存按 URL 的 sha256 分桶存放，总大小超过 IMAGE_CACHE_MAX_BYTES 时按最近访问时间淘汰
+  （访问时刷新文件 mtime，进程重启后按 mtime 重建 LRU 顺序）
+
+LRU 索引只在事件循环线程里读写，不需要加锁。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+from fastapi.responses import FileResponse, StreamingResponse
+
+from ..config import IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, IMAGE_UPSTREAM_BASE
+
+# 只允许代理这些图床的图片（安全考虑）
+ALLOWED_IMAGE_DOMAINS = {
+    'sinaimg.cn',
+    'jjwxc.net',
+    'bmp.ovh',
+    'loli.net',
+    'jd.com',
+    'huluxia.com',
+    'bdstatic.com',
+}
+
+_ORIGIN_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Referer': 'https://www.jjwxc.net/',
+    'DNT': '1',
+}
+
+RESPONSE_HEADERS = {
+    'Cache-Control': 'public, max-age=86400',  # 浏览器缓存1天
+    'Access-Control-Allow-Origin': '*',         # 允许跨域
+}
+
+_CHUNK_SIZE = 64 * 1024
+_MAX_IMAGE_BYTES = 10 * 1024 * 1024   # 单张原图上限，防止被当成任意大文件下载器
+_DEFAULT_CONTENT_TYPE = 'image/jpeg'
+
+
+class ImageFetchError(Exception):
+    """回源失败（网络错误、非 2xx、超过大小上限）"""
+    pass
+
+
+def validate_image_url(url: str) -> None:
+    """校验代理目标：必须是 http/https、且主机属于白名单图床。不合法抛 ValueError。"""
+    parsed = urlparse(url)
+    # 必须是 http/https 且 netloc 非空，防止 file:// 等协议
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        raise ValueError("不支持的图片URL格式")
+    # 用 netloc（hostname）校验，防止路径伪装绕过（如 evil.com/jjwxc.net/img）
+    hostname = parsed.hostname or ''
+    if not any(hostname == d or hostname.endswith('.' + d) for d in ALLOWED_IMAGE_DOMAINS):
+        raise ValueError("不支持的图片域名")
+
+
+_RE_SINAIMG_HOST = re.compile(r'ww(\d+)\.sinaimg\.cn')
+
+
+def canonical_image_url(url: str) -> str:
+    """
+    规范化图片 URL（缓存键以此为准）：新浪图床 http://wwN.sinaimg.cn 统一成 https://wxN.sinaimg.cn，
+    与前端 getProxiedImageUrl 的改写一致，前端请求和预热任务落到同一份缓存。
+    """
+    if url.startswith('http://') and 'sinaimg.cn' in url:
+        url = _RE_SINAIMG_HOST.sub(r'wx\1.sinaimg.cn', url.replace('http://', 'https://', 1))
+    return url
+
+
+# ── 共享 HTTP 客户端 ──────────────────────────────────────────
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_image_client() -> httpx.AsyncClient:
+    """共享客户端（首次调用时创建；建 SSL 上下文约耗 100~200ms，应用启动时预先调用一次）。"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers=_ORIGIN_HEADERS,
+            timeout=httpx.Timeout(10.0),
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        )
+    return _client
+
+
+async def close_image_client() -> None:
+    """应用关闭时释放连接池。"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# ── 磁盘缓存 + LRU 索引 ───────────────────────────────────────
+def cache_key(url: str) -> str:
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def original_path(key: str) -> Path:
+    """原图缓存路径：<IMAGE_CACHE_DIR>/ab/<sha256>.bin，元数据在同名 .json。"""
+    return Path(IMAGE_CACHE_DIR) / key[:2] / f"{key}.bin"
+
+
+def _meta_path(path: Path) -> Path:
+    return path.with_suffix('.json')
+
+
+# key（文件路径字符串）→ 字节数；顺序即 LRU 顺序（末尾最新）
+_lru: "OrderedDict[str, int]" = OrderedDict()
+_lru_bytes = 0
+_lru_loaded = False
+
+
+def _scan_cache_dir() -> list:
+    """扫描缓存目录，返回 [(mtime, path, size)]（按 mtime 升序）。在线程里跑。"""
+    entries = []
+    root = Path(IMAGE_CACHE_DIR)
+    if root.exists():
+        for path in root.glob('*/*'):
+            if path.suffix in ('.json', '.tmp'):
+                continue
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, str(path), st.st_size))
+    entries.sort()
+    return entries
+
+
+async def _ensure_lru_loaded() -> None:
+    global _lru_loaded, _lru_bytes
+    if _lru_loaded:
+        return
+    entries = await asyncio.to_thread(_scan_cache_dir)
+    if not _lru_loaded:
+        for _, path, size in entries:
+            _lru[path] = size
+            _lru_bytes += size
+        _lru_loaded = True
+
+
+def _remove_file(path: str) -> None:
+    for p in (Path(path), _meta_path(Path(path))):
+        try:
+            p.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def register_cached_file(path: Path) -> None:
+    """新文件写入缓存后登记到 LRU，并按总量上限淘汰最久未访问的文件。"""
+    global _lru_bytes
+    key = str(path)
+    size = path.stat().st_size
+    _lru_bytes += size - _lru.pop(key, 0)
+    _lru[key] = size
+    while _lru_bytes > IMAGE_CACHE_MAX_BYTES and len(_lru) > 1:
+        old_key, old_size = _lru.popitem(last=False)
+        _lru_bytes -= old_size
+        _remove_file(old_key)
+
+
+def touch_cached_file(path: Path) -> bool:
+    """
+    命中检查：文件在缓存里就刷新其 LRU 位置和 mtime，返回 True；不在（或已被淘汰）返回 False。
+    """
+    key = str(path)
+    if key not in _lru:
+        # 其它进程（如 scripts/warm_thumbnails.py）写入的文件：收编进本进程的 LRU
+        try:
+            register_cached_file(path)
+        except FileNotFoundError:
+            return False
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        # 被其它进程淘汰了
+        _remove_from_lru(key)
+        return False
+    _lru.move_to_end(key)
+    return True
+
+
+def _remove_from_lru(key: str) -> None:
+    global _lru_bytes
+    _lru_bytes -= _lru.pop(key, 0)
+
+
+def _read_content_type(path: Path) -> str:
+    try:
+        return json.loads(_meta_path(path).read_text(encoding='utf-8')).get('content_type') or _DEFAULT_CONTENT_TYPE
+    except (FileNotFoundError, ValueError):
+        return _DEFAULT_CONTENT_TYPE
+
+
+def cache_stats() -> Dict:
+    return {"files": len(_lru), "bytes": _lru_bytes, "max_bytes": IMAGE_CACHE_MAX_BYTES,
+            "inflight": len(_inflight)}
+
+
+# ── 回源下载（tee 到客户端 + 缓存文件）─────────────────────────
+_DONE = object()
+
+
+class _Download:
+    """一次回源下载：首个请求订阅分块流，并发的后到请求等 finished 后读缓存。"""
+
+    def __init__(self):
+        self.chunks: asyncio.Queue = asyncio.Queue()
+        self.started = asyncio.Event()        # 拿到响应头（或失败）
+        self.finished = asyncio.Event()       # 缓存文件就位（或失败）
+        self.content_type = _DEFAULT_CONTENT_TYPE
+        self.error: Optional[Exception] = None
+
+
+_inflight: Dict[str, _Download] = {}
+# 持有下载任务的强引用，防止事件循环只留弱引用时任务被回收
+_tasks: set = set()
+
+
+def _start_download(url: str, path: Path) -> _Download:
+    dl = _Download()
+    _inflight[str(path)] = dl
+    task = asyncio.create_task(_download(url, path, dl))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return dl
+
+
+def _origin_url(url: str) -> str:
+    """实际回源地址：配置了 IMAGE_UPSTREAM_BASE（压测假上游）时换掉协议和主机。"""
+    if not IMAGE_UPSTREAM_BASE:
+        return url
+    parsed = urlparse(url)
+    return IMAGE_UPSTREAM_BASE + parsed.path + (f"?{parsed.query}" if parsed.query else "")
+
+
+async def _download(url: str, path: Path, dl: _Download) -> None:
+    tmp = path.with_suffix(f'.{os.getpid()}.{id(dl)}.tmp')
+    try:
+        async with get_image_client().stream('GET', _origin_url(url)) as resp:
+            if resp.status_code >= 400:
+                raise ImageFetchError(f"HTTP {resp.status_code}")
+            dl.content_type = resp.headers.get('Content-Type', _DEFAULT_CONTENT_TYPE)
+            dl.started.set()
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            size = 0
+            with open(tmp, 'wb') as f:
+                async for chunk in resp.aiter_bytes(_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > _MAX_IMAGE_BYTES:
+                        raise ImageFetchError(f"图片超过 {_MAX_IMAGE_BYTES} 字节")
+                    f.write(chunk)
+                    dl.chunks.put_nowait(chunk)
+
+        _meta_path(path).write_text(
+            json.dumps({'url': url, 'content_type': dl.content_type, 'fetched_at': time.time()}),
+            encoding='utf-8',
+        )
+        os.replace(tmp, path)
+        register_cached_file(path)
+    except Exception as e:
+        dl.error = e if isinstance(e, ImageFetchError) else ImageFetchError(str(e))
+        try:
+            tmp.unlink()
+        except FileNotFoundError:
+            pass
+    finally:
+        dl.started.set()
+        dl.chunks.put_nowait(_DONE)
+        dl.finished.set()
+        _inflight.pop(str(path), None)
+
+
+async def _stream_chunks(dl: _Download):
+    while True:
+        chunk = await dl.chunks.get()
+        if chunk is _DONE:
+            if dl.error is not None:
+                # 已经发出响应头，只能中断连接
+                raise dl.error
+            return
+        yield chunk
+
+
+async def fetch_original(url: str) -> Path:
+    """
+    确保原图在缓存里并返回其路径（同一 URL 并发调用合并为一次回源）。
+    缩略图流水线等内部调用方用它；失败抛 ImageFetchError。
+    """
+    await _ensure_lru_loaded()
+    url = canonical_image_url(url)
+    path = original_path(cache_key(url))
+    if touch_cached_file(path):
+        return path
+    dl = _inflight.get(str(path)) or _start_download(url, path)
+    await dl.finished.wait()
+    if dl.error is not None:
+        raise dl.error
+    return path
+
+
+async def get_image_response(url: str):
+    """
+    代理一张图片：命中缓存发文件，未命中流式回源（同时写缓存），并发未命中合并。
+
+    Raises:
+        ImageFetchError: 回源失败（尚未发出任何字节时）
+    """
+    await _ensure_lru_loaded()
+    url = canonical_image_url(url)
+    path = original_path(cache_key(url))
+
+    if touch_cached_file(path):
+        return FileResponse(path, media_type=_read_content_type(path),
+                            headers={**RESPONSE_HEADERS, 'X-Cache': 'HIT'})
+
+    dl = _inflight.get(str(path))
+    if dl is not None:
+        # 已有同 URL 的回源在进行：等它写完缓存后直接发文件
+        await dl.finished.wait()
+        if dl.error is not None:
+            raise dl.error
+        return FileResponse(path, media_type=dl.content_type,
+                            headers={**RESPONSE_HEADERS, 'X-Cache': 'COALESCED'})
+
+    dl = _start_download(url, path)
+    await dl.started.wait()
+    if dl.error is not None:
+        raise dl.error
+    return StreamingResponse(_stream_chunks(dl), media_type=dl.content_type,
+                             headers={**RESPONSE_HEADERS, 'X-Cache': 'MISS'})
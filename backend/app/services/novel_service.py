@@ -2,9 +2,14 @@
 小说查询和数据库操作服务
 兼容 SQLite（开发）和 PostgreSQL（生产）
 """
+import logging
 from typing import Optional, Dict, List
 from ..config import DATABASE_URL
 from ..database.connection import get_db_connection
+from ..utils.tracing import db_query
+from ..utils.similarity import parse_tags
+
+logger = logging.getLogger(__name__)
 
 # PostgreSQL 用 %s，SQLite 用 ?
 _P = "%s" if DATABASE_URL else "?"
@@ -18,6 +23,7 @@ def normalize_cover_url(cover_url: str, book_id: int) -> str:
     return cover_url
 
 
+@db_query("search_novel_exact")
 def search_novel_exact(novel_name: str) -> Optional[Dict]:
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -26,6 +32,7 @@ def search_novel_exact(novel_name: str) -> Optional[Dict]:
         return dict(row) if row else None
 
 
+@db_query("search_novel_fuzzy")
 def search_novel_fuzzy(keyword: str, limit: int = 10) -> List[Dict]:
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -36,6 +43,7 @@ def search_novel_fuzzy(keyword: str, limit: int = 10) -> List[Dict]:
         return [dict(row) for row in cursor.fetchall()]
 
 
+@db_query("get_novel_by_id")
 def get_novel_by_id(book_id: int) -> Optional[Dict]:
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -62,6 +70,60 @@ def get_all_novels(exclude_id: Optional[int] = None, limit: Optional[int] = None
         return [dict(row) for row in cursor.fetchall()]
 
 
+@db_query("get_popular_book_ids")
+def get_popular_book_ids(limit: int) -> List[int]:
+    """收藏量最高的 limit 本书的 id（收藏量降序）。"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT book_id FROM book WHERE favorite_count IS NOT NULL "
+            f"ORDER BY favorite_count DESC LIMIT {_P}",
+            (limit,),
+        )
+        return [dict(row)["book_id"] for row in cursor.fetchall()]
+
+
+@db_query("get_novels_by_ids")
+def get_novels_by_ids(book_ids: List[int]) -> Dict[int, Dict]:
+    """按 id 批量取书，一次查询返回 {book_id: 小说字典}（不存在的 id 不出现在结果里）。"""
+    if not book_ids:
+        return {}
+    placeholders = ", ".join([_P] * len(book_ids))
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM book WHERE book_id IN ({placeholders})", list(book_ids))
+        return {row["book_id"]: row for row in (dict(r) for r in cursor.fetchall())}
+
+
+def _signal_conditions(targets: List[Dict]) -> tuple:
+    """
+    把若干目标小说的召回信号拼成 OR 条件：
+    同类型 / 同视角 / 同作者 / 任一标签重叠，返回 (条件列表, 参数列表)。
+    """
+    conditions: List[str] = []
+    params: list = []
+
+    for field in ("category", "perspective", "author"):
+        values = list(dict.fromkeys(t.get(field) for t in targets if t.get(field)))
+        if values:
+            conditions.append(f"{field} IN ({', '.join([_P] * len(values))})")
+            params.extend(values)
+
+    # 标签重叠走 book_tag 关联表：精确成员匹配 + idx_book_tag_tag 索引，
+    # 不再对 tags 长串做 LIKE '%tag%' 全表扫描
+    tags = list(dict.fromkeys(tag for t in targets for tag in parse_tags(t.get("tags"))))
+    if tags:
+        placeholders = ", ".join([_P] * len(tags))
+        conditions.append(
+            "book_id IN (SELECT bt.book_id FROM book_tag bt "
+            f"JOIN tag t ON t.tag_id = bt.tag_id WHERE t.name IN ({placeholders}))"
+        )
+        params.extend(tags)
+
+    return conditions, params
+
+
+@db_query("get_candidate_novels")
 def get_candidate_novels(target_novel: Dict) -> List[Dict]:
     """
     推荐候选集预筛选：只返回与目标小说至少共享一个信号
@@ -71,131 +133,186 @@ def get_candidate_novels(target_novel: Dict) -> List[Dict]:
     因此该预筛选保证零漏召回（no false negatives），同时把候选集
     从全表 5000+ 条缩减到通常几百条，大幅降低 DB 传输与 Python 计算量。
 
-    注：tags 用 LIKE '%tag%' 做超集匹配（可能含少量误召回），
-    最终 Python 精算会修正分数，不影响结果正确性。
+    注：标签命中按 book_tag 关联表精确匹配，与打分时的标签集合交集语义一致，
+    不会漏召回，也没有 LIKE 子串匹配带来的误召回。
     """
-    book_id = target_novel["book_id"]
-    conditions: List[str] = []
-    params: list = [book_id]
-
-    for field in ("category", "perspective", "author"):
-        val = target_novel.get(field)
-        if val:
-            conditions.append(f"{field} = {_P}")
-            params.append(val)
-
-    tags = (target_novel.get("tags") or "").split()
-    for tag in tags:
-        tag = tag.strip()
-        if tag:
-            conditions.append(f"tags LIKE {_P}")
-            params.append(f"%{tag}%")
+    conditions, signal_params = _signal_conditions([target_novel])
 
     # 目标小说没有任何可匹配信号 → 无候选
     if len(conditions) == 0:
         return []
 
     where_clause = " OR ".join(conditions)
-    query = f"SELECT * FROM book WHERE book_id != {_P} AND ({where_clause})"
+    # 固定按 book_id 排序：同分候选的先后不随执行计划变化，批量召回（共享池）也按同样顺序切分
+    query = f"SELECT * FROM book WHERE book_id != {_P} AND ({where_clause}) ORDER BY book_id"
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, [target_novel["book_id"], *signal_params])
+        return [dict(row) for row in cursor.fetchall()]
 
+
+@db_query("get_candidate_novels_for_targets")
+def get_candidate_novels_for_targets(targets: List[Dict]) -> List[Dict]:
+    """
+    批量推荐的共享候选池：一次查询取回与任一目标共享信号的全部小说。
+
+    池子是各目标候选集的并集（含目标本身），调用方按单个目标的信号
+    再在内存里切出各自的候选集，避免 N 个目标各跑一次候选查询。
+    """
+    conditions, params = _signal_conditions(targets)
+    if not conditions:
+        return []
+
+    query = f"SELECT * FROM book WHERE {' OR '.join(conditions)} ORDER BY book_id"
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(query, params)
         return [dict(row) for row in cursor.fetchall()]
 
 
+# book 表全部列（插入顺序）；insert_novel / bulk_upsert_novels 共用
+_BOOK_COLUMNS = (
+    "book_id", "title", "author", "intro", "tags", "main_chars", "support_chars",
+    "other_info", "category", "perspective", "series", "status", "word_count",
+    "publish_status", "sign_status", "first_pub_time", "last_update_time",
+    "chapter_count", "review_count", "favorite_count", "nutrient_count",
+    "total_click_count", "score", "cover_url",
+    "intro_short", "characters", "character_relations",
+)
+
+_COLUMN_LIST = ", ".join(_BOOK_COLUMNS)
+_VALUE_LIST = ", ".join([_P] * len(_BOOK_COLUMNS))
+
+if DATABASE_URL:
+    # PostgreSQL upsert
+    _UPSERT_BOOK_SQL = (
+        f"INSERT INTO book ({_COLUMN_LIST}) VALUES ({_VALUE_LIST}) "
+        f"ON CONFLICT (book_id) DO UPDATE SET "
+        + ", ".join(f"{col} = EXCLUDED.{col}" for col in _BOOK_COLUMNS[1:])
+    )
+else:
+    # SQLite upsert
+    _UPSERT_BOOK_SQL = f"INSERT OR REPLACE INTO book ({_COLUMN_LIST}) VALUES ({_VALUE_LIST})"
+
+
+def _book_values(novel_data: dict) -> tuple:
+    values = [novel_data.get(col) for col in _BOOK_COLUMNS]
+    values[_BOOK_COLUMNS.index("cover_url")] = normalize_cover_url(
+        novel_data.get('cover_url'), novel_data.get('book_id')
+    )
+    return tuple(values)
+
+
+@db_query("insert_novel")
 def insert_novel(novel_data: dict) -> bool:
     try:
-        book_id = novel_data.get('book_id')
-        cover_url = normalize_cover_url(novel_data.get('cover_url'), book_id)
-
-        values = (
-            book_id,
-            novel_data.get('title'),
-            novel_data.get('author'),
-            novel_data.get('intro'),
-            novel_data.get('tags'),
-            novel_data.get('main_chars'),
-            novel_data.get('support_chars'),
-            novel_data.get('other_info'),
-            novel_data.get('category'),
-            novel_data.get('perspective'),
-            novel_data.get('series'),
-            novel_data.get('status'),
-            novel_data.get('word_count'),
-            novel_data.get('publish_status'),
-            novel_data.get('sign_status'),
-            novel_data.get('first_pub_time'),
-            novel_data.get('last_update_time'),
-            novel_data.get('chapter_count'),
-            novel_data.get('review_count'),
-            novel_data.get('favorite_count'),
-            novel_data.get('nutrient_count'),
-            novel_data.get('total_click_count'),
-            novel_data.get('score'),
-            cover_url,
-            novel_data.get('intro_short'),
-            novel_data.get('characters'),
-            novel_data.get('character_relations'),
-        )
-
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            if DATABASE_URL:
-                # PostgreSQL upsert
-                cursor.execute("""
-                    INSERT INTO book (
-                        book_id, title, author, intro, tags, main_chars, support_chars,
-                        other_info, category, perspective, series, status, word_count,
-                        publish_status, sign_status, first_pub_time, last_update_time,
-                        chapter_count, review_count, favorite_count, nutrient_count,
-                        total_click_count, score, cover_url,
-                        intro_short, characters, character_relations
-                    ) VALUES (
-                        %s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s
-                    )
-                    ON CONFLICT (book_id) DO UPDATE SET
-                        title = EXCLUDED.title,
-                        author = EXCLUDED.author,
-                        intro = EXCLUDED.intro,
-                        tags = EXCLUDED.tags,
-                        main_chars = EXCLUDED.main_chars,
-                        support_chars = EXCLUDED.support_chars,
-                        other_info = EXCLUDED.other_info,
-                        category = EXCLUDED.category,
-                        perspective = EXCLUDED.perspective,
-                        series = EXCLUDED.series,
-                        status = EXCLUDED.status,
-                        word_count = EXCLUDED.word_count,
-                        publish_status = EXCLUDED.publish_status,
-                        sign_status = EXCLUDED.sign_status,
-                        first_pub_time = EXCLUDED.first_pub_time,
-                        last_update_time = EXCLUDED.last_update_time,
-                        chapter_count = EXCLUDED.chapter_count,
-                        review_count = EXCLUDED.review_count,
-                        favorite_count = EXCLUDED.favorite_count,
-                        nutrient_count = EXCLUDED.nutrient_count,
-                        total_click_count = EXCLUDED.total_click_count,
-                        score = EXCLUDED.score,
-                        cover_url = EXCLUDED.cover_url,
-                        intro_short = EXCLUDED.intro_short,
-                        characters = EXCLUDED.characters,
-                        character_relations = EXCLUDED.character_relations
-                """, values)
-            else:
-                # SQLite upsert
-                cursor.execute("""
-                    INSERT OR REPLACE INTO book (
-                        book_id, title, author, intro, tags, main_chars, support_chars,
-                        other_info, category, perspective, series, status, word_count,
-                        publish_status, sign_status, first_pub_time, last_update_time,
-                        chapter_count, review_count, favorite_count, nutrient_count,
-                        total_click_count, score, cover_url,
-                        intro_short, characters, character_relations
-                    ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-                """, values)
+            cursor.execute(_UPSERT_BOOK_SQL, _book_values(novel_data))
+            # 同一事务内同步标签关联表，book.tags 与 book_tag 不会不一致
+            _sync_book_tags(cursor, novel_data.get('book_id'), novel_data.get('tags'))
+
+        # 提交成功后增量刷新 ANN 索引（延迟导入：ann_service 依赖 tag_idf → database）
+        from .ann_service import update_ann_index
+        update_ann_index(novel_data)
         return True
 
     except Exception as e:
-        print(f"插入小说数据失败: {e}")
+        logger.error(f"插入小说数据失败: {e}", extra={"book_id": novel_data.get("book_id"), "phase": "db_write"})
         return False
+
+
+@db_query("bulk_upsert_novels")
+def bulk_upsert_novels(novels: List[Dict]) -> int:
+    """
+    批量 upsert 多本书（目录发现 / 批量导入用）：一个事务、一次 executemany，
+    标签关联表在同一事务内同步。返回写入的书数，失败整批回滚返回 0。
+
+    与 insert_novel 一样是整行覆盖，调用方需自行合并已有字段。
+    """
+    if not novels:
+        return 0
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(_UPSERT_BOOK_SQL, [_book_values(n) for n in novels])
+            for n in novels:
+                _sync_book_tags(cursor, n.get('book_id'), n.get('tags'))
+
+        from .ann_service import update_ann_index
+        for n in novels:
+            update_ann_index(n)
+        return len(novels)
+
+    except Exception as e:
+        logger.error(f"批量写入小说数据失败: {e}", extra={"books": len(novels), "phase": "db_write"})
+        return 0
+
+
+@db_query("get_existing_book_ids")
+def get_existing_book_ids(book_ids: List[int]) -> set:
+    """给定 id 中已在库里的那些。"""
+    if not book_ids:
+        return set()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        placeholders = ", ".join([_P] * len(book_ids))
+        cursor.execute(f"SELECT book_id FROM book WHERE book_id IN ({placeholders})", list(book_ids))
+        return {dict(row)["book_id"] for row in cursor.fetchall()}
+
+
+# ── 标签关联表（tag / book_tag）───────────────────────────────
+def _sync_book_tags(cursor, book_id: int, tags_str: Optional[str]) -> None:
+    """把一本书的 tags 串展开写入 tag 字典与 book_tag 关联表（先删后插，幂等）。"""
+    cursor.execute(f"DELETE FROM book_tag WHERE book_id = {_P}", (book_id,))
+    names = list(dict.fromkeys(parse_tags(tags_str)))
+    if not names:
+        return
+
+    placeholders = ", ".join([_P] * len(names))
+    select_sql = f"SELECT tag_id, name FROM tag WHERE name IN ({placeholders})"
+    cursor.execute(select_sql, names)
+    tag_ids = {dict(row)["name"]: dict(row)["tag_id"] for row in cursor.fetchall()}
+
+    # 只插入字典里还没有的新标签（少耗 PG 序列号）；多个写入方（搜索回填、目录发现、统计刷新、
+    # 其他 worker）可能同时插同一个新标签，ON CONFLICT 让后到的跳过，再统一重查拿 tag_id
+    missing = [n for n in names if n not in tag_ids]
+    if missing:
+        cursor.executemany(f"INSERT INTO tag (name) VALUES ({_P}) ON CONFLICT (name) DO NOTHING",
+                           [(n,) for n in missing])
+        cursor.execute(select_sql, names)
+        tag_ids = {dict(row)["name"]: dict(row)["tag_id"] for row in cursor.fetchall()}
+
+    cursor.executemany(
+        f"INSERT INTO book_tag (book_id, tag_id) VALUES ({_P}, {_P}) ON CONFLICT (book_id, tag_id) DO NOTHING",
+        [(book_id, tag_ids[n]) for n in names],
+    )
+
+
+def rebuild_book_tags() -> int:
+    """
+    从 book.tags 全量重建 book_tag 关联表（迁移/回填用），返回处理的书数。
+
+    与并发的入库写同一批行也安全（见 _sync_book_tags）。调度 worker 启动时在关联表为空时调用一次
+    （backfill_book_tags_if_empty）；手动全量重建见 scripts/backfill_book_tags.py。
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT book_id, tags FROM book")
+        rows = [dict(row) for row in cursor.fetchall()]
+        for row in rows:
+            _sync_book_tags(cursor, row["book_id"], row["tags"])
+    return len(rows)
+
+
+def backfill_book_tags_if_empty() -> int:
+    """标签关联表首次上线：库里有带标签的书但关联表为空时回填一次，返回回填的书数（不需要时为 0）。"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM book_tag) AS filled, "
+                       "EXISTS (SELECT 1 FROM book WHERE tags IS NOT NULL) AS has_tags")
+        state = dict(cursor.fetchone())
+    if not state["has_tags"] or state["filled"]:
+        return 0
+    return rebuild_book_tags()
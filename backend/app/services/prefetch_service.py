@@ -0,0 +1,173 @@
+"""
+试读章节预取
+
+用户看到推荐列表后最常做的就是点开某本书的试读抽屉；库里没有章节时要现场爬 4~20 秒。
+推荐接口返回后，把排名前 PREFETCH_TOP_N 本书放进预取队列，由一个后台线程逐本爬好：
+- 队列按「在推荐列表里的名次」排序，第 1 名先爬
+- 全局预算 PREFETCH_BUDGET_PER_HOUR 本/小时（令牌桶），超出的直接丢弃，不排队
+- 优先级低于用户请求：单线程，每个上游请求前先让路给进行中的用户爬取（见 chapter_service）
+- 同一本书用户打开时预取正在爬，用户请求等它爬完直接读库，不会重复爬
+
+命中率：预取成功的书之后被用户打开一次记一次命中，hit_ratio = 命中数 / 预取成功数；
+打开时还在队列或正在爬的记为 late（预取来不及）。见 /api/prefetch/stats。
+"""
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from ..config import PREFETCH_TOP_N, PREFETCH_BUDGET_PER_HOUR, PREFETCH_QUEUE_SIZE
+from .chapter_service import get_or_fetch_chapters, has_chapters
+
+logger = logging.getLogger(__name__)
+
+# 预取成功、还没被打开过的书最多记这么多本（更早的视为没被用上）
+_MAX_TRACKED = 2000
+
+
+class _TokenBucket:
+    """每小时 capacity 个令牌，匀速补充。"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 3600)
+        self.updated = now
+
+    def take(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def remaining(self) -> int:
+        with self._lock:
+            self._refill()
+            return int(self.tokens)
+
+
+_queue: "queue.PriorityQueue" = queue.PriorityQueue(maxsize=PREFETCH_QUEUE_SIZE)
+_seq = itertools.count()
+_budget = _TokenBucket(PREFETCH_BUDGET_PER_HOUR)
+
+_lock = threading.Lock()
+_queued = set()                                  # 在队列里或正在爬的书
+_prefetched: "OrderedDict[int, float]" = OrderedDict()  # 预取成功、尚未被打开的书 → 完成时间
+_stats = {
+    "queued": 0,            # 入队本数
+    "dropped": 0,           # 队列满丢弃
+    "skipped_existing": 0,  # 轮到时库里已有章节
+    "skipped_budget": 0,    # 预算用尽
+    "fetched": 0,           # 预取成功
+    "failed": 0,            # 爬取失败 / 无免费章节
+    "hits": 0,              # 预取成功后被用户打开
+    "late": 0,              # 用户打开时还在队列 / 正在爬
+    "opens": 0,             # 试读接口总请求数
+}
+
+_worker_thread: Optional[threading.Thread] = None
+_worker_stop = threading.Event()
+
+
+def schedule_chapter_prefetch(recommendations: List[Dict], top_n: int = PREFETCH_TOP_N) -> int:
+    """把推荐列表前 top_n 本放进预取队列（不阻塞，预取线程未启动时什么都不做），返回入队本数。"""
+    if _worker_thread is None or not _worker_thread.is_alive():
+        return 0
+    added = 0
+    for rank, rec in enumerate(recommendations[:top_n]):
+        book_id = rec["book_id"]
+        with _lock:
+            if book_id in _queued or book_id in _prefetched:
+                continue
+            try:
+                _queue.put_nowait((rank, next(_seq), book_id))
+            except queue.Full:
+                _stats["dropped"] += 1
+                continue
+            _queued.add(book_id)
+            _stats["queued"] += 1
+        added += 1
+    return added
+
+
+def record_chapter_open(book_id: int) -> None:
+    """试读接口每次请求调用一次，统计预取命中。"""
+    with _lock:
+        _stats["opens"] += 1
+        if _prefetched.pop(book_id, None) is not None:
+            _stats["hits"] += 1
+        elif book_id in _queued:
+            _stats["late"] += 1
+
+
+def prefetch_stats() -> Dict:
+    with _lock:
+        stats = dict(_stats)
+        pending = len(_queued)
+    stats["hit_ratio"] = round(stats["hits"] / stats["fetched"], 3) if stats["fetched"] else None
+    stats["pending"] = pending
+    stats["budget_remaining"] = _budget.remaining()
+    stats["running"] = _worker_thread is not None and _worker_thread.is_alive()
+    return stats
+
+
+def _prefetch_one(book_id: int) -> None:
+    if has_chapters(book_id):
+        with _lock:
+            _stats["skipped_existing"] += 1
+        return
+    if not _budget.take():
+        with _lock:
+            _stats["skipped_budget"] += 1
+        return
+
+    chapters = get_or_fetch_chapters(book_id, background=True)
+    with _lock:
+        if chapters:
+            _stats["fetched"] += 1
+            _prefetched[book_id] = time.time()
+            while len(_prefetched) > _MAX_TRACKED:
+                _prefetched.popitem(last=False)
+        else:
+            _stats["failed"] += 1
+
+
+def _worker_loop() -> None:
+    while not _worker_stop.is_set():
+        try:
+            _, _, book_id = _queue.get(timeout=1)
+        except queue.Empty:
+            continue
+        try:
+            _prefetch_one(book_id)
+        except Exception:
+            logger.exception("试读预取失败", extra={"book_id": book_id, "phase": "prefetch"})
+        finally:
+            with _lock:
+                _queued.discard(book_id)
+
+
+def start_prefetch_worker(top_n: int = PREFETCH_TOP_N) -> bool:
+    """启动预取线程（top_n <= 0 时不启动），返回是否已启动。"""
+    global _worker_thread
+    if top_n <= 0 or (_worker_thread is not None and _worker_thread.is_alive()):
+        return False
+    _worker_stop.clear()
+    _worker_thread = threading.Thread(target=_worker_loop, name="chapter-prefetch", daemon=True)
+    _worker_thread.start()
+    return True
+
+
+def stop_prefetch_worker() -> None:
+    """通知预取线程在当前这本书爬完后退出。"""
+    _worker_stop.set()
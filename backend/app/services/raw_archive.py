@@ -0,0 +1,165 @@
+"""
+爬虫原始响应归档（内容寻址 + gzip 压缩，落本地磁盘）
+
+每次请求晋江的原始字节（桌面详情页 HTML、novelbasicinfo / chapterList / chapterContent JSON）
+按 sha256 存成 objects/ab/abcdef….gz，相同内容只存一份；另有 index.db（SQLite）
+记录 (url, kind, book_id, chapter_id, fetched_at, sha256)。
+
+用途：
+- 改进解析逻辑后，用 scripts/reparse_archive.py 直接从归档重建 book / chapter，
+  不必以 2~3 秒一本的速度重新爬全库
+- 作为离线 fixture 来源（如把详情页导出给 scripts/verify_detail_parser.py 做回归）
+
+未设置 RAW_ARCHIVE_DIR 时归档关闭，archive_response 直接返回。
+"""
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ..config import RAW_ARCHIVE_DIR
+
+logger = logging.getLogger(__name__)
+
+# 各类响应的文本编码（解析时按此解码原始字节）
+ARCHIVE_ENCODINGS = {
+    "detail": "gb18030",
+    "basicinfo": "utf-8",
+    "chapter_list": "utf-8",
+    "chapter_content": "utf-8",
+}
+
+_CREATE_INDEX = """
+CREATE TABLE IF NOT EXISTS response (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    url         TEXT NOT NULL,
+    kind        TEXT NOT NULL,
+    book_id     INTEGER,
+    chapter_id  INTEGER,
+    fetched_at  REAL NOT NULL,
+    sha256      TEXT NOT NULL,
+    size        INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_response_book ON response(book_id, kind, fetched_at);
+CREATE INDEX IF NOT EXISTS idx_response_url  ON response(url, fetched_at);
+"""
+
+_init_lock = threading.Lock()
+_initialized_dirs = set()
+
+
+def archive_enabled() -> bool:
+    return bool(RAW_ARCHIVE_DIR)
+
+
+def _root(archive_dir: Optional[str]) -> Path:
+    return Path(archive_dir or RAW_ARCHIVE_DIR)
+
+
+def _connect(archive_dir: Optional[str] = None) -> sqlite3.Connection:
+    root = _root(archive_dir)
+    conn = sqlite3.connect(root / "index.db", timeout=30)
+    conn.row_factory = sqlite3.Row
+    if str(root) not in _initialized_dirs:
+        with _init_lock:
+            if str(root) not in _initialized_dirs:
+                root.mkdir(parents=True, exist_ok=True)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_CREATE_INDEX)
+                _initialized_dirs.add(str(root))
+    return conn
+
+
+def _blob_path(root: Path, sha256: str) -> Path:
+    return root / "objects" / sha256[:2] / f"{sha256}.gz"
+
+
+def archive_response(
+    kind: str,
+    url: str,
+    content: bytes,
+    book_id: Optional[int] = None,
+    chapter_id: Optional[int] = None,
+) -> Optional[str]:
+    """归档一份原始响应，返回其 sha256；归档关闭时返回 None。归档失败只打日志，不影响爬取。"""
+    if not archive_enabled() or content is None:
+        return None
+    try:
+        root = _root(None)
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = _blob_path(root, sha256)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(gzip.compress(content, compresslevel=6))
+            os.replace(tmp, path)
+
+        conn = _connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO response (url, kind, book_id, chapter_id, fetched_at, sha256, size) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (url, kind, book_id, chapter_id, time.time(), sha256, len(content)),
+                )
+        finally:
+            conn.close()
+        return sha256
+    except Exception as e:
+        logger.warning(f"原始响应归档失败 ({kind} {url}): {e}", extra={"book_id": book_id, "phase": "archive"})
+        return None
+
+
+def load_blob(sha256: str, archive_dir: Optional[str] = None) -> bytes:
+    """按 sha256 取回原始字节。"""
+    return gzip.decompress(_blob_path(_root(archive_dir), sha256).read_bytes())
+
+
+def load_text(entry: Dict, archive_dir: Optional[str] = None) -> str:
+    """按响应类型的编码把归档条目解码成文本。"""
+    return load_blob(entry["sha256"], archive_dir).decode(ARCHIVE_ENCODINGS.get(entry["kind"], "utf-8"), "replace")
+
+
+def list_archived_book_ids(archive_dir: Optional[str] = None) -> List[int]:
+    """归档里出现过的所有 book_id（升序）。"""
+    conn = _connect(archive_dir)
+    try:
+        rows = conn.execute(
+            "SELECT DISTINCT book_id FROM response WHERE book_id IS NOT NULL ORDER BY book_id"
+        ).fetchall()
+        return [row["book_id"] for row in rows]
+    finally:
+        conn.close()
+
+
+def latest_responses(book_id: int, archive_dir: Optional[str] = None) -> Dict:
+    """
+    取某本书每类响应的最新一份归档条目。
+
+    Returns:
+        dict: {"detail": 条目, "basicinfo": 条目, "chapter_list": 条目,
+               "chapter_content": {chapter_id: 条目}}，缺失的类型不出现
+    """
+    conn = _connect(archive_dir)
+    try:
+        rows = conn.execute(
+            "SELECT kind, chapter_id, url, sha256, fetched_at FROM response "
+            "WHERE book_id = ? ORDER BY fetched_at",
+            (book_id,),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    latest: Dict = {}
+    for row in rows:
+        entry = dict(row)
+        if entry["kind"] == "chapter_content":
+            latest.setdefault("chapter_content", {})[entry["chapter_id"]] = entry
+        else:
+            latest[entry["kind"]] = entry
+    return latest
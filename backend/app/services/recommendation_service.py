@@ -1,57 +1,172 @@
 """
 推荐算法服务
 """
+import base64
+import hashlib
+import json
+import logging
 import math
 import time
 import threading
+from array import array
+from collections import Counter
 from typing import List, Dict, Optional, Tuple
-from ..utils.similarity import calculate_multidimensional_similarity
+from ..config import JJWXC_WEB_BASE
+from ..utils.similarity import calculate_multidimensional_similarity, calculate_profile_similarity
 from ..utils.tag_idf import get_tag_idf, get_default_idf, clear_tag_idf_cache
-from .novel_service import get_novel_by_id, get_candidate_novels, insert_novel
+from ..utils import shared_cache
+from ..utils.metrics import CACHE_EVENTS, REC_CANDIDATES, REC_SCORING_SECONDS
+from ..utils.tracing import span, traced
+from .novel_service import (
+    get_novel_by_id,
+    get_novels_by_ids,
+    get_candidate_novels,
+    get_candidate_novels_for_targets,
+    insert_novel,
+)
 from .crawler_service import JinjiangCrawler
+from .ann_service import get_ann_candidate_ids
+from .freshness_service import is_recently_fetched, refresh_book
+
+logger = logging.getLogger(__name__)
 
 
 # ── 推荐结果 TTL 缓存 ────────────────────────────────────────────
 # 小说静态数据变化很慢，缓存 5 分钟可大幅减少重复查询 + 重算
 _CACHE_TTL = 300       # 秒
 _CACHE_MAX_SIZE = 1000  # 最大缓存条目数，防止无限增长
-_rec_cache: Dict[Tuple[int, int], Tuple[float, Dict]] = {}
+_rec_cache: Dict[Tuple, Tuple[float, Dict]] = {}
 _cache_lock = threading.Lock()
 
 
-def _cache_get(key: Tuple[int, int]) -> Optional[Dict]:
+# 完整排行缓存（分页用）：存压缩后的 (book_id, 分数, chips, 理由)，单条体积小，容量单独控制
+_RANKING_CACHE_MAX_SIZE = 200
+_ranking_cache: Dict[Tuple, Tuple[float, List[Tuple]]] = {}
+
+# 推荐快照版本号：每次 invalidate 自增，分页游标据此判断所依赖的排行是否已过期。
+# 启用共享缓存层时等于共享失效代数，任一 worker 签发的游标在其他 worker 上同样有效
+_snapshot_version = 0
+# 本进程缓存最后一次对齐到的共享失效代数
+_synced_generation = 0
+
+
+# 热门请求计数：(book_id, limit, mode) → 请求次数。进程退出时存盘，下次启动按它预热（见 warmup_service）
+_HOT_KEYS_MAX = 5000
+_hot_keys: Counter = Counter()
+_hot_lock = threading.Lock()
+
+
+def _record_hot_key(key: Tuple) -> None:
+    with _hot_lock:
+        _hot_keys[key] += 1
+        if len(_hot_keys) > _HOT_KEYS_MAX:
+            # 只保留较热的一半，冷门长尾不值得预热
+            kept = _hot_keys.most_common(_HOT_KEYS_MAX // 2)
+            _hot_keys.clear()
+            _hot_keys.update(dict(kept))
+
+
+def get_hot_keys(n: Optional[int] = None) -> List[Tuple[Tuple, int]]:
+    """最热的 n 个推荐请求：[((book_id, limit, mode), 次数), ...]，次数降序。"""
+    with _hot_lock:
+        return _hot_keys.most_common(n)
+
+
+def seed_hot_keys(entries: List[Tuple[Tuple, int]], decay: float = 0.5) -> None:
+    """用上个进程保存的计数（按 decay 衰减）打底，让长期热门的书不会因一次重启就掉出列表。"""
+    with _hot_lock:
+        for key, count in entries:
+            _hot_keys[tuple(key)] += max(1, int(count * decay))
+
+
+def _cache_name(store: Dict) -> str:
+    return "ranking" if store is _ranking_cache else "recommendation"
+
+
+def _sync_shared_generation() -> None:
+    """其他进程 invalidate 过（共享失效代数变了）时清空本进程的缓存。"""
+    global _snapshot_version, _synced_generation
+    if not shared_cache.enabled():
+        return
+    generation = shared_cache.generation()
+    if generation == _synced_generation:
+        return
     with _cache_lock:
-        entry = _rec_cache.get(key)
-        if entry is None:
-            return None
-        expire_ts, value = entry
-        if expire_ts < time.time():
-            _rec_cache.pop(key, None)
-            return None
-        return value
+        _rec_cache.clear()
+        _ranking_cache.clear()
+        _snapshot_version = _synced_generation = generation
+    CACHE_EVENTS.inc(cache="recommendation", event="invalidation")
+    clear_tag_idf_cache()
 
 
-def _cache_set(key: Tuple[int, int], value: Dict) -> None:
+def _cache_get(key: Tuple, store: Optional[Dict] = None):
+    store = _rec_cache if store is None else store
+    _sync_shared_generation()
+    with _cache_lock:
+        entry = store.get(key)
+        if entry is not None and entry[0] < time.time():
+            store.pop(key, None)
+            CACHE_EVENTS.inc(cache=_cache_name(store), event="expired")
+            entry = None
+    CACHE_EVENTS.inc(cache=_cache_name(store), event="miss" if entry is None else "hit")
+    if entry is not None:
+        return entry[1]
+    # 本进程未命中：看其他 worker 是否已经算过，取到后回填本进程缓存
+    value = shared_cache.get(_cache_name(store), key)
+    if value is not None:
+        _cache_set(key, value, store, _RANKING_CACHE_MAX_SIZE if store is _ranking_cache else _CACHE_MAX_SIZE,
+                   share=False)
+    return value
+
+
+def _cache_set(key: Tuple, value, store: Optional[Dict] = None, max_size: int = _CACHE_MAX_SIZE,
+               share: bool = True, version: Optional[int] = None) -> None:
+    """
+    写缓存。version 传开始计算前的 _snapshot_version：计算期间有过 invalidate（本进程或经共享代数
+    同步来的）时结果可能基于旧数据，直接丢弃；共享层也按这个代数分区写入。
+    """
+    store = _rec_cache if store is None else store
+    if version is not None and version != _snapshot_version:
+        return
+    if share:
+        shared_cache.put(_cache_name(store), key, value, _CACHE_TTL,
+                         start_generation=version if shared_cache.enabled() else None)
     with _cache_lock:
         # 超过容量上限：先清掉已过期条目，仍超限则按过期时间淘汰最旧的
-        if len(_rec_cache) >= _CACHE_MAX_SIZE:
+        if len(store) >= max_size:
             now = time.time()
-            expired = [k for k, (ts, _) in _rec_cache.items() if ts < now]
+            expired = [k for k, (ts, _) in store.items() if ts < now]
             for k in expired:
-                _rec_cache.pop(k, None)
-            if len(_rec_cache) >= _CACHE_MAX_SIZE:
-                oldest = min(_rec_cache, key=lambda k: _rec_cache[k][0])
-                _rec_cache.pop(oldest, None)
-        _rec_cache[key] = (time.time() + _CACHE_TTL, value)
+                store.pop(k, None)
+            if expired:
+                CACHE_EVENTS.inc(len(expired), cache=_cache_name(store), event="expired")
+            if len(store) >= max_size:
+                oldest = min(store, key=lambda k: store[k][0])
+                store.pop(oldest, None)
+                CACHE_EVENTS.inc(cache=_cache_name(store), event="eviction")
+        store[key] = (time.time() + _CACHE_TTL, value)
 
 
 def invalidate_recommendation_cache() -> None:
-    """数据更新后可调用，清空推荐缓存 + 标签 IDF 缓存（新书会改变标签频率）。"""
+    """
+    数据更新后可调用，清空推荐缓存 + 标签 IDF 缓存（新书会改变标签频率）。
+
+    启用共享缓存层时同时让共享代数 +1，其他 worker 最迟 SHARED_CACHE_SYNC_INTERVAL 秒后跟着清空。
+    """
+    global _snapshot_version, _synced_generation
+    generation = shared_cache.bump_generation()
     with _cache_lock:
         _rec_cache.clear()
+        _ranking_cache.clear()
+        if generation is None:
+            _snapshot_version += 1
+        else:
+            _snapshot_version = _synced_generation = generation
+    CACHE_EVENTS.inc(cache="recommendation", event="invalidation")
     clear_tag_idf_cache()
 
 
+@traced()
 def fetch_cover_if_missing(novel: Dict) -> Dict:
     """
     检查小说封面，如果缺失则实时爬取
@@ -70,10 +185,11 @@ def fetch_cover_if_missing(novel: Dict) -> Dict:
     if not novel.get('book_id'):
         return novel
 
+    start = time.perf_counter()
     try:
         # 实时爬取封面
         crawler = JinjiangCrawler()
-        novel_url = f"https://www.jjwxc.net/onebook.php?novelid={novel['book_id']}"
+        novel_url = f"{JJWXC_WEB_BASE}/onebook.php?novelid={novel['book_id']}"
 
         # 只爬取封面信息
         detail = crawler.fetch_novel_detail(novel_url)
@@ -86,9 +202,14 @@ def fetch_cover_if_missing(novel: Dict) -> Dict:
             updated_novel = {**novel, 'cover_url': detail['cover_url']}
             insert_novel(updated_novel)
 
-            print(f"✓ 已为《{novel.get('title')}》爬取封面")
+            # 每本书一条、量大，按 LOG_SAMPLE_EVERY 抽样输出
+            logger.info(f"已为《{novel.get('title')}》爬取封面", extra={
+                "book_id": novel["book_id"], "phase": "cover", "sample": "cover_ok",
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1)})
     except Exception as e:
-        print(f"✗ 爬取《{novel.get('title')}》封面失败: {e}")
+        logger.warning(f"爬取《{novel.get('title')}》封面失败: {e}", extra={
+            "book_id": novel["book_id"], "phase": "cover",
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1)})
 
     return novel
 
@@ -110,6 +231,7 @@ def _quality_factor(novel: Dict) -> float:
     return 1.0 + _POPULARITY_BOOST * norm
 
 
+@traced()
 def fetch_stats_if_missing(novel: Dict) -> Dict:
     """
     检查小说「统计数据 + 富字段」，缺失则通过移动端 API 实时补全并写回数据库。
@@ -117,6 +239,7 @@ def fetch_stats_if_missing(novel: Dict) -> Dict:
     判定标准：nutrient_count 或 intro_short 为空就触发补全
     （营养液数桌面端抓不到、一句话简介是新增字段，历史入库的书都缺）。
     一次 basicinfo 调用同时拿统计 + 简介/角色/关系。
+    已补全的书之后由 freshness_service 的刷新调度按陈旧度定期刷新。
 
     Args:
         novel: 小说数据字典
@@ -132,17 +255,23 @@ def fetch_stats_if_missing(novel: Dict) -> Dict:
     if not novel.get('book_id'):
         return novel
 
-    try:
-        crawler = JinjiangCrawler()
-        extras = crawler.fetch_mobile_extras(novel['book_id'])
+    # 近期刚抓过仍缺字段 → 上游本就没有（如无一句话简介），不必每次浏览都再打一次上游
+    if is_recently_fetched(novel['book_id'], "basicinfo"):
+        return novel
 
-        if extras:
-            novel.update(extras)
-            # 写回数据库，下次直接命中
-            insert_novel(novel)
-            print(f"✓ 已为《{novel.get('title')}》补全统计+富字段")
+    start = time.perf_counter()
+    try:
+        # 条件请求：响应没变就不解析、不写库；有变化时 refresh_book 负责写回数据库
+        result = refresh_book(novel['book_id'], ("basicinfo",))
+        if result["written"]:
+            novel.update(result["novel"])
+            logger.info(f"已为《{novel.get('title')}》补全统计+富字段", extra={
+                "book_id": novel["book_id"], "phase": "stats", "sample": "stats_ok",
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1)})
     except Exception as e:
-        print(f"✗ 补全《{novel.get('title')}》失败: {e}")
+        logger.warning(f"补全《{novel.get('title')}》失败: {e}", extra={
+            "book_id": novel["book_id"], "phase": "stats",
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1)})
 
     return novel
 
@@ -153,30 +282,14 @@ def backfill_missing_stats(recommendations: List[Dict]) -> None:
         fetch_stats_if_missing(rec)
 
 
-def get_recommendations(
+def _score_candidates(
     target_novel: Dict,
-    limit: int = 10,
-    weights: Optional[dict] = None
+    candidate_novels: List[Dict],
+    weights: Optional[dict],
+    tag_idf: Dict[str, float],
+    default_idf: float,
 ) -> List[Dict]:
-    """
-    基于目标小说推荐相似作品。
-
-    Args:
-        target_novel: 已查询好的目标小说字典（调用方负责查询，避免重复 DB 往返）
-        limit: 推荐数量（默认10本）
-        weights: 自定义相似度权重配置
-
-    Returns:
-        List[dict]: 推荐小说列表，每项含 similarity_score 和 match_reasons
-    """
-    # 候选集预筛选：只取与目标至少共享一个信号的小说，
-    # 而非全表 5000+ 条，DB 传输与 Python 计算量都大幅下降
-    candidate_novels = get_candidate_novels(target_novel)
-
-    # 标签 IDF 权重表只加载一次，供本次所有候选共用
-    tag_idf = get_tag_idf()
-    default_idf = get_default_idf()
-
+    """对候选逐一打分，返回按「相似度 × 热度」排好序的完整推荐列表（score=0 的丢弃）。"""
     recommendations = []
     for candidate in candidate_novels:
         similarity_score, match_reasons, match_summary = calculate_multidimensional_similarity(
@@ -202,42 +315,490 @@ def get_recommendations(
     # 内部排序字段不外泄给前端
     for rec in recommendations:
         rec.pop("_rank_score", None)
+    return recommendations
+
+
+# 召回模式：exact 为精确预筛选（零漏召回），ann 为 MinHash LSH 近似召回（宽泛标签目标快得多）
+RETRIEVAL_MODES = ("exact", "ann")
+
+
+def _retrieve_candidates(target_novel: Dict, mode: str = "exact") -> List[Dict]:
+    """按召回模式取候选集；没有标签的目标 ANN 无从下手，退回精确召回。"""
+    if mode == "ann" and (target_novel.get("tags") or "").strip():
+        ids = get_ann_candidate_ids(target_novel)
+        rows = get_novels_by_ids(ids)
+        return [rows[bid] for bid in ids if bid in rows]
+    return get_candidate_novels(target_novel)
+
+
+@traced()
+def get_recommendations(
+    target_novel: Dict,
+    limit: int = 10,
+    weights: Optional[dict] = None,
+    mode: str = "exact",
+) -> List[Dict]:
+    """
+    基于目标小说推荐相似作品。
+
+    Args:
+        target_novel: 已查询好的目标小说字典（调用方负责查询，避免重复 DB 往返）
+        limit: 推荐数量（默认10本）
+        weights: 自定义相似度权重配置
+        mode: 召回模式，"exact"（默认）或 "ann"
+
+    Returns:
+        List[dict]: 推荐小说列表，每项含 similarity_score 和 match_reasons
+    """
+    # 候选集预筛选：只取与目标至少共享一个信号的小说，
+    # 而非全表 5000+ 条，DB 传输与 Python 计算量都大幅下降
+    candidate_novels = _retrieve_candidates(target_novel, mode)
+    REC_CANDIDATES.observe(len(candidate_novels), mode=mode)
+
+    # 标签 IDF 权重表只加载一次，供本次所有候选共用
+    tag_idf = get_tag_idf()
+    default_idf = get_default_idf()
+
+    with REC_SCORING_SECONDS.time(mode=mode), span("score", candidates=len(candidate_novels)):
+        recommendations = _score_candidates(target_novel, candidate_novels, weights, tag_idf, default_idf)
     return recommendations[:limit]
 
 
-def get_recommendation_summary(book_id: int, limit: int = 10) -> Dict:
+def _build_summary(target_novel: Dict, recommendations: List[Dict]) -> Dict:
+    """拼装接口返回的推荐摘要：目标小说简要信息 + 推荐列表。"""
+    return {
+        "target_novel": {
+            "book_id": target_novel["book_id"],
+            "title": target_novel["title"],
+            "author": target_novel.get("author"),
+            "category": target_novel.get("category"),
+            "tags": target_novel.get("tags")
+        },
+        "recommendations": recommendations
+    }
+
+
+# 推荐列表卡片实际渲染的字段：compact 模式只返回这些，
+# 去掉 intro / characters / character_relations / 主配角等列表里不显示的大字段
+COMPACT_FIELDS = (
+    "book_id", "title", "author", "cover_url", "category", "tags", "status", "word_count",
+    "favorite_count", "review_count", "score", "similarity_score", "match_reasons",
+    "match_summary", "url", "source_book_ids",
+)
+
+
+def _compact_list(recommendations: List[Dict]) -> List[Dict]:
+    return [{k: rec[k] for k in COMPACT_FIELDS if k in rec} for rec in recommendations]
+
+
+def compact_recommendations(data: Dict) -> Dict:
+    """
+    把推荐接口返回的数据（单本 / 分页 / 批量 / 书架）裁剪成列表视图所需字段。
+
+    返回新字典，不修改入参（入参可能是缓存里的对象）。
+    """
+    data = dict(data)
+    for key in ("recommendations", "merged"):
+        if key in data:
+            data[key] = _compact_list(data[key])
+    if "results" in data:
+        data["results"] = [compact_recommendations(summary) for summary in data["results"]]
+    return data
+
+
+@traced()
+def get_recommendation_summary(book_id: int, limit: int = 10, mode: str = "exact",
+                               track: bool = True) -> Dict:
     """
     获取推荐摘要（包含目标小说和推荐列表）。
 
     封面补全（fetch_cover_if_missing）已从此函数移出，
     改由调用方通过 BackgroundTasks 异步执行，不阻塞响应。
 
-    结果带 5 分钟 TTL 缓存，相同 (book_id, limit) 的请求直接命中缓存。
+    结果带 5 分钟 TTL 缓存，相同 (book_id, limit) 的请求直接命中缓存
+    （ANN 模式的结果单独缓存，键里带上模式）。
+    track=False 时不计入热门请求（预热自身的调用）；不存在的书不计入，免得被存盘、下次启动去预热。
     """
-    cache_key = (book_id, limit)
+    cache_key = (book_id, limit) if mode == "exact" else (book_id, limit, mode)
     cached = _cache_get(cache_key)
     if cached is not None:
+        if track:
+            _record_hot_key((book_id, limit, mode))
         return cached
+    version = _snapshot_version
 
     target_novel = get_novel_by_id(book_id)
     if not target_novel:
         raise ValueError(f"小说ID {book_id} 不存在")
+    if track:
+        _record_hot_key((book_id, limit, mode))
 
     # 复用已查询的 target_novel，无需在 get_recommendations 内再查一次
-    recommendations = get_recommendations(target_novel, limit)
+    recommendations = get_recommendations(target_novel, limit, mode=mode)
 
-    result = {
-        "target_novel": {
-            "book_id": target_novel["book_id"],
-            "title": target_novel["title"],
-            "author": target_novel.get("author"),
-            "category": target_novel.get("category"),
-            "tags": target_novel.get("tags")
+    result = _build_summary(target_novel, recommendations)
+
+    _cache_set(cache_key, result, version=version)
+    return result
+
+
+def evaluate_ann_recall(book_ids: List[int], k: int = 10) -> Dict:
+    """
+    度量 ANN 模式相对精确模式的召回质量。
+
+    对每个目标分别跑精确与 ANN 推荐，统计 recall@k（ANN 前 k 覆盖了精确前 k 的比例）
+    以及两种模式的平均候选集大小。
+
+    Returns:
+        dict: {"books", "k", "recall_at_k", "exact_candidates", "ann_candidates", "per_book": [...]}
+    """
+    tag_idf = get_tag_idf()
+    default_idf = get_default_idf()
+    per_book = []
+    for target in get_novels_by_ids(book_ids).values():
+        exact_pool = _retrieve_candidates(target, "exact")
+        ann_pool = _retrieve_candidates(target, "ann")
+        exact_top = [r["book_id"] for r in _score_candidates(target, exact_pool, None, tag_idf, default_idf)[:k]]
+        ann_top = [r["book_id"] for r in _score_candidates(target, ann_pool, None, tag_idf, default_idf)[:k]]
+        per_book.append({
+            "book_id": target["book_id"],
+            "recall": len(set(exact_top) & set(ann_top)) / len(exact_top) if exact_top else 1.0,
+            "exact_candidates": len(exact_pool),
+            "ann_candidates": len(ann_pool),
+        })
+
+    n = len(per_book) or 1
+    return {
+        "books": len(per_book),
+        "k": k,
+        "recall_at_k": sum(b["recall"] for b in per_book) / n,
+        "exact_candidates": sum(b["exact_candidates"] for b in per_book) / n,
+        "ann_candidates": sum(b["ann_candidates"] for b in per_book) / n,
+        "per_book": per_book,
+    }
+
+
+# ── 批量推荐 ────────────────────────────────────────────────────
+# 书架页一次要给 20~30 本书各出推荐：共享一次目标查询、一次候选池查询、
+# 一份 IDF 快照，命中缓存的直接复用，其余在同一个线程里一起打分。
+_SIGNAL_FIELDS = ("category", "perspective", "author")
+
+
+def _index_candidate_pool(pool: List[Dict]) -> Dict[Tuple[str, str], List[int]]:
+    """给共享候选池建倒排：(信号类型, 值) → 池内下标列表。"""
+    index: Dict[Tuple[str, str], List[int]] = {}
+    for i, novel in enumerate(pool):
+        for field in _SIGNAL_FIELDS:
+            if novel.get(field):
+                index.setdefault((field, novel[field]), []).append(i)
+        for tag in set((novel.get("tags") or "").split()):
+            index.setdefault(("tags", tag), []).append(i)
+    return index
+
+
+def _select_from_pool(
+    target_novel: Dict,
+    pool: List[Dict],
+    index: Dict[Tuple[str, str], List[int]],
+) -> List[Dict]:
+    """从共享池里切出单个目标的候选集，与 get_candidate_novels 的召回条件一致。"""
+    keys = [(field, target_novel[field]) for field in _SIGNAL_FIELDS if target_novel.get(field)]
+    keys += [("tags", tag) for tag in set((target_novel.get("tags") or "").split())]
+    hits = set()
+    for key in keys:
+        hits.update(index.get(key, ()))
+    # 池按 book_id 排序，按池内顺序输出，同分时的先后与单本查询（同样 ORDER BY book_id）一致
+    return [
+        pool[i] for i in sorted(hits)
+        if pool[i]["book_id"] != target_novel["book_id"]
+    ]
+
+
+def _merge_rankings(summaries: List[Dict], seed_ids: set, limit: int) -> List[Dict]:
+    """把多本书的推荐列表合并去重成一份排行：同一本书取各来源中的最高分，种子书本身剔除。"""
+    merged: Dict[int, Dict] = {}
+    for summary in summaries:
+        source_id = summary["target_novel"]["book_id"]
+        for rec in summary["recommendations"]:
+            bid = rec["book_id"]
+            if bid in seed_ids:
+                continue
+            entry = merged.get(bid)
+            if entry is None:
+                merged[bid] = {**rec, "source_book_ids": [source_id]}
+                continue
+            entry["source_book_ids"].append(source_id)
+            if rec["similarity_score"] > entry["similarity_score"]:
+                merged[bid] = {**rec, "source_book_ids": entry["source_book_ids"]}
+
+    ranked = sorted(
+        merged.values(),
+        key=lambda r: r["similarity_score"] * _quality_factor(r),
+        reverse=True,
+    )
+    return ranked[:limit]
+
+
+@traced()
+def get_recommendation_batch(book_ids: List[int], limit: int = 10, merge: bool = False) -> Dict:
+    """
+    批量获取多本书的推荐摘要。
+
+    Args:
+        book_ids: 目标小说 id 列表（重复 id 只算一次，返回顺序与入参一致）
+        limit: 每本书的推荐数量
+        merge: 为 True 时额外返回合并去重后的整体排行（剔除目标书本身）
+
+    Returns:
+        dict: {"results": [推荐摘要...], "missing": [不存在的 id], "merged": [...]（仅 merge 时）}
+    """
+    ordered_ids = list(dict.fromkeys(book_ids))
+    summaries: Dict[int, Dict] = {}
+
+    # 已算过的直接复用单本接口的缓存
+    pending = []
+    for bid in ordered_ids:
+        cached = _cache_get((bid, limit))
+        if cached is not None:
+            summaries[bid] = cached
+        else:
+            pending.append(bid)
+    version = _snapshot_version
+
+    missing: List[int] = []
+    if pending:
+        targets = get_novels_by_ids(pending)
+        missing = [bid for bid in pending if bid not in targets]
+
+        pool = get_candidate_novels_for_targets(list(targets.values()))
+        index = _index_candidate_pool(pool)
+        tag_idf = get_tag_idf()
+        default_idf = get_default_idf()
+
+        for bid, target in targets.items():
+            candidates = _select_from_pool(target, pool, index)
+            recommendations = _score_candidates(target, candidates, None, tag_idf, default_idf)[:limit]
+            summary = _build_summary(target, recommendations)
+            _cache_set((bid, limit), summary, version=version)
+            summaries[bid] = summary
+
+    results = [summaries[bid] for bid in ordered_ids if bid in summaries]
+    data = {"results": results, "missing": missing}
+    if merge:
+        data["merged"] = _merge_rankings(results, set(ordered_ids), limit)
+    return data
+
+
+# ── 游标分页（「更多相似」无限滚动）─────────────────────────────
+# 首次请求把目标书的完整排行算一次并缓存（按快照版本区分），之后每页只是一次切片
+# + 一次按主键取当页书籍详情，不再重算整个排行。
+class CursorExpiredException(Exception):
+    """分页游标所属的推荐快照已失效（期间有新书入库、缓存被清空、排行被重算且次序变了）"""
+    pass
+
+
+def _encode_cursor(book_id: int, version: int, offset: int, digest: str) -> str:
+    raw = json.dumps({"b": book_id, "v": version, "o": offset, "d": digest}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[int, int, int, Optional[str]]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return int(data["b"]), int(data["v"]), int(data["o"]), data.get("d")
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+def _ranking_digest(ranking: List[Tuple]) -> str:
+    """
+    排行次序的摘要，写进游标。
+
+    同一快照版本下排行也可能被重算（本进程缓存过期、换了 worker），期间统计刷新改了收藏数
+    （质量因子）次序就会变；游标带上摘要，次序对不上时让客户端从头加载，而不是重复或漏掉条目。
+    """
+    return hashlib.blake2b(array("q", (entry[0] for entry in ranking)).tobytes(), digest_size=8).hexdigest()
+
+
+def _get_full_ranking(target_novel: Dict, version: int) -> List[Tuple]:
+    """取目标书在指定快照下的完整排行（压缩形式），未命中则算一次并缓存。"""
+    key = (target_novel["book_id"], version)
+    ranking = _cache_get(key, _ranking_cache)
+    if ranking is not None:
+        return ranking
+
+    recommendations = _score_candidates(
+        target_novel,
+        get_candidate_novels(target_novel),
+        None,
+        get_tag_idf(),
+        get_default_idf(),
+    )
+    ranking = [
+        (rec["book_id"], rec["similarity_score"], rec["match_reasons"], rec["match_summary"])
+        for rec in recommendations
+    ]
+    _cache_set(key, ranking, _ranking_cache, _RANKING_CACHE_MAX_SIZE, version=version)
+    return ranking
+
+
+@traced()
+def get_recommendation_page(book_id: int, cursor: Optional[str] = None, page_size: int = 20) -> Dict:
+    """
+    分页获取推荐，不受单次 limit≤50 限制。
+
+    Args:
+        book_id: 目标小说 id
+        cursor: 上一页返回的 next_cursor；不传则从第一页开始
+        page_size: 每页数量
+
+    Returns:
+        dict: {"target_novel", "recommendations", "total", "next_cursor"（没有下一页为 None）}
+
+    Raises:
+        ValueError: 小说不存在 / 游标无效或与 book_id 不匹配
+        CursorExpiredException: 游标对应的快照已失效，需从第一页重新开始
+    """
+    _sync_shared_generation()
+    version = _snapshot_version
+    offset, cursor_digest = 0, None
+    if cursor:
+        cursor_book_id, cursor_version, offset, cursor_digest = _decode_cursor(cursor)
+        if cursor_book_id != book_id or offset < 0:
+            raise ValueError("无效的分页游标")
+        if cursor_version != version:
+            raise CursorExpiredException("推荐数据已更新，请从第一页重新加载")
+
+    target_novel = get_novel_by_id(book_id)
+    if not target_novel:
+        raise ValueError(f"小说ID {book_id} 不存在")
+
+    ranking = _get_full_ranking(target_novel, version)
+    digest = _ranking_digest(ranking)
+    if cursor and cursor_digest != digest:
+        raise CursorExpiredException("推荐数据已更新，请从第一页重新加载")
+    page = ranking[offset:offset + page_size]
+    rows = get_novels_by_ids([entry[0] for entry in page])
+
+    recommendations = []
+    for bid, similarity_score, match_reasons, match_summary in page:
+        if bid not in rows:
+            continue
+        recommendations.append({
+            **rows[bid],
+            "similarity_score": similarity_score,
+            "match_reasons": match_reasons,
+            "match_summary": match_summary,
+            "url": f"https://www.jjwxc.net/onebook.php?novelid={bid}"
+        })
+
+    next_offset = offset + page_size
+    result = _build_summary(target_novel, recommendations)
+    result["total"] = len(ranking)
+    result["next_cursor"] = (
+        _encode_cursor(book_id, version, next_offset, digest) if next_offset < len(ranking) else None
+    )
+    return result
+
+
+# ── 书架推荐（多本种子书 → 一份聚合画像）─────────────────────────
+def _build_shelf_profile(
+    seeds: List[Dict],
+    tag_idf: Dict[str, float],
+    default_idf: float,
+) -> Dict:
+    """
+    从 N 本种子书构建聚合画像：IDF 加权的标签画像 + 类型/视角/作者分布。
+
+    标签画像权重 = idf(标签) × 含该标签的种子占比，书架上反复出现的题材权重最高；
+    类型/视角/作者记为 {取值: 种子占比}。
+    """
+    n = len(seeds)
+    # dict 保持插入顺序：键序即标签在种子里首次出现的先后（一本种子时就是它自己的标签顺序）
+    tag_counts: Dict[str, int] = {}
+    dists: Dict[str, Dict[str, float]] = {"category": {}, "perspective": {}, "author": {}}
+    for seed in seeds:
+        for tag in dict.fromkeys((seed.get("tags") or "").split()):
+            tag_counts[tag] = tag_counts.get(tag, 0) + 1
+        for field, dist in dists.items():
+            val = seed.get(field)
+            if val:
+                dist[val] = dist.get(val, 0.0) + 1.0 / n
+
+    return {
+        "tag_weights": {
+            tag: tag_idf.get(tag, default_idf) * cnt / n
+            for tag, cnt in tag_counts.items()
         },
-        "recommendations": recommendations
+        "tag_order": list(tag_counts),
+        "seed_count": n,
+        **dists,
     }
 
-    _cache_set(cache_key, result)
+
+@traced()
+def get_shelf_recommendations(book_ids: List[int], limit: int = 10) -> Dict:
+    """
+    书架推荐：以多本书为种子，按聚合画像一次性给整库候选打分。
+
+    候选池与批量推荐共用一次查询（与任一种子共享信号的书），种子书本身剔除；
+    打分沿用单本推荐的语义（加权 Jaccard + 类型/视角/作者 + 热度质量因子），
+    只有一本种子时结果与单本推荐一致。
+
+    Args:
+        book_ids: 种子小说 id 列表
+        limit: 推荐数量
+
+    Returns:
+        dict: {"seeds": [种子简要信息], "missing": [不存在的 id], "recommendations": [...]}
+
+    Raises:
+        ValueError: 所有种子 id 都不存在
+    """
+    seed_ids = sorted(set(book_ids))
+    cache_key = ("shelf", tuple(seed_ids), limit)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+    version = _snapshot_version
+
+    seeds = get_novels_by_ids(seed_ids)
+    if not seeds:
+        raise ValueError(f"小说ID {seed_ids} 均不存在")
+
+    tag_idf = get_tag_idf()
+    default_idf = get_default_idf()
+    profile = _build_shelf_profile(list(seeds.values()), tag_idf, default_idf)
+
+    recommendations = []
+    for candidate in get_candidate_novels_for_targets(list(seeds.values())):
+        if candidate["book_id"] in seeds:
+            continue
+        similarity_score, match_reasons, match_summary = calculate_profile_similarity(
+            profile, candidate, tag_idf=tag_idf, default_idf=default_idf,
+        )
+        if similarity_score > 0:
+            recommendations.append({
+                **candidate,
+                "similarity_score": round(similarity_score, 2),
+                "_rank_score": similarity_score * _quality_factor(candidate),
+                "match_reasons": match_reasons,
+                "match_summary": match_summary,
+                "url": f"https://www.jjwxc.net/onebook.php?novelid={candidate['book_id']}"
+            })
+
+    recommendations.sort(key=lambda x: x["_rank_score"], reverse=True)
+    recommendations = recommendations[:limit]
+    for rec in recommendations:
+        rec.pop("_rank_score", None)
+
+    result = {
+        "seeds": [_build_summary(seeds[bid], [])["target_novel"] for bid in seed_ids if bid in seeds],
+        "missing": [bid for bid in seed_ids if bid not in seeds],
+        "recommendations": recommendations,
+    }
+    _cache_set(cache_key, result, version=version)
     return result
 
 
@@ -0,0 +1,191 @@
+"""
+封面缩略图：按宽度缩放 + 转码 WebP / AVIF，派生图与原图一起落在图片代理的磁盘缓存里
+
+卡片和推荐列表只按缩略图尺寸显示封面，原样转发几百 KB 的原图很浪费。
+/api/proxy/image?url=…&w=240 时：
+- 宽度就近向上取到 THUMBNAIL_WIDTHS 里的档位（派生图数量有上限）
+- 按 Accept 协商格式：AVIF > WebP > JPEG
+- 派生图存为 <sha256>.w240.webp，与原图 <sha256>.bin 同目录，共用同一个 LRU 配额
+- 缩放和编码是 CPU 密集操作，放进进程池做，不占事件循环也不受 GIL 限制
+- 同一派生图的并发请求合并为一次编码
+
+Pillow 是可选依赖：未安装时 ?w= 被忽略，直接返回原图。
+scripts/warm_thumbnails.py 可为库里所有 book.cover_url 预先生成缩略图。
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi.responses import FileResponse
+
+from ..config import THUMBNAIL_WIDTHS, THUMBNAIL_WORKERS
+from .image_proxy import (
+    RESPONSE_HEADERS,
+    ImageFetchError,
+    cache_key,
+    canonical_image_url,
+    fetch_original,
+    get_image_response,
+    original_path,
+    register_cached_file,
+    touch_cached_file,
+)
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, features as _pil_features
+except ImportError:  # Pillow 缺失时不做缩略图，?w= 回退为原图
+    Image = None
+    _pil_features = None
+
+
+def _supports(fmt: str) -> bool:
+    if _pil_features is None:
+        return False
+    try:
+        return bool(_pil_features.check(fmt))
+    except ValueError:  # 旧版 Pillow 不认识该特性名
+        return False
+
+
+SUPPORTED_FORMATS = tuple(f for f in ("avif", "webp") if _supports(f)) + (("jpeg",) if Image else ())
+
+_MEDIA_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg"}
+_EXTENSIONS = {"avif": "avif", "webp": "webp", "jpeg": "jpg"}
+# 封面缩略图的画质档：240px WebP 约 8~15KB
+_QUALITY = {"avif": 50, "webp": 75, "jpeg": 80}
+
+
+class ThumbnailError(Exception):
+    """原图无法解码或编码失败"""
+    pass
+
+
+def thumbnails_enabled() -> bool:
+    return Image is not None
+
+
+def snap_width(width: int) -> int:
+    """就近向上取到允许的宽度档位；超过最大档取最大档。"""
+    for w in sorted(THUMBNAIL_WIDTHS):
+        if width <= w:
+            return w
+    return max(THUMBNAIL_WIDTHS)
+
+
+def negotiate_format(accept: str) -> str:
+    """按请求的 Accept 头挑编码：浏览器声明支持且本机 Pillow 能编的最优格式。"""
+    accept = accept or ""
+    for fmt in ("avif", "webp"):
+        if fmt in SUPPORTED_FORMATS and _MEDIA_TYPES[fmt] in accept:
+            return fmt
+    return "jpeg"
+
+
+def derivative_path(url: str, width: int, fmt: str) -> Path:
+    """派生图路径：与原图同目录，<sha256>.w<宽度>.<扩展名>。"""
+    key = cache_key(canonical_image_url(url))
+    return original_path(key).with_name(f"{key}.w{width}.{_EXTENSIONS[fmt]}")
+
+
+# ── 进程池里执行的编码函数（模块级，便于 pickle）──────────────
+def _render(src: str, dst: str, width: int, fmt: str) -> int:
+    """把 src 缩放到 width 宽（不放大）并编码为 fmt 写到 dst，返回字节数。"""
+    with Image.open(src) as img:
+        img.load()
+        has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+        if fmt == "jpeg" or not has_alpha:
+            img = img.convert("RGB")
+        else:
+            img = img.convert("RGBA")
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS)
+
+        tmp = f"{dst}.{os.getpid()}.tmp"
+        save_kwargs = {"quality": _QUALITY[fmt]}
+        if fmt == "jpeg":
+            save_kwargs.update(optimize=True, progressive=True)
+        elif fmt == "webp":
+            save_kwargs.update(method=4)
+        img.save(tmp, format=fmt.upper(), **save_kwargs)
+    os.replace(tmp, dst)
+    return os.path.getsize(dst)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_rendering: Dict[str, asyncio.Future] = {}
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+    return _pool
+
+
+def shutdown_thumbnail_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def ensure_thumbnail(url: str, width: int, fmt: str) -> Path:
+    """
+    确保某张图的派生图在缓存里并返回路径（原图不在则先回源；同一派生图并发请求只编码一次）。
+
+    Raises:
+        ImageFetchError: 原图回源失败
+        ThumbnailError: 原图无法解码 / 编码失败
+    """
+    dst = derivative_path(url, width, fmt)
+    if touch_cached_file(dst):
+        return dst
+
+    pending = _rendering.get(str(dst))
+    if pending is None:
+        pending = asyncio.get_running_loop().create_future()
+        _rendering[str(dst)] = pending
+        try:
+            src = await fetch_original(url)
+            await asyncio.get_running_loop().run_in_executor(_get_pool(), _render, str(src), str(dst), width, fmt)
+            register_cached_file(dst)
+            pending.set_result(dst)
+        except ImageFetchError as e:
+            pending.set_exception(e)
+        except Exception as e:
+            pending.set_exception(ThumbnailError(str(e)))
+        finally:
+            _rendering.pop(str(dst), None)
+            if not pending.done():  # 发起请求被取消（客户端断开）：别让等待者永远挂着
+                pending.set_exception(ThumbnailError("缩略图生成被取消"))
+            # 没有其它等待者时也要取走异常，避免 "exception was never retrieved" 警告
+            pending.exception()
+    return await asyncio.shield(pending)
+
+
+async def get_thumbnail_response(url: str, width: int, accept: str):
+    """
+    返回缩略图响应；Pillow 不可用或原图无法解码（如 GIF 动图损坏）时回退为原图代理。
+
+    Raises:
+        ImageFetchError: 原图回源失败
+    """
+    if not thumbnails_enabled():
+        return await get_image_response(url)
+
+    width = snap_width(width)
+    fmt = negotiate_format(accept)
+    try:
+        path = await ensure_thumbnail(url, width, fmt)
+    except ThumbnailError as e:
+        logger.warning(f"缩略图生成失败，回退原图: {e}", extra={"phase": "thumbnail", "url": url})
+        return await get_image_response(url)
+
+    return FileResponse(path, media_type=_MEDIA_TYPES[fmt],
+                        headers={**RESPONSE_HEADERS, 'Vary': 'Accept'})
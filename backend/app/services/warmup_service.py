@@ -0,0 +1,144 @@
+"""
+启动预热：重启 / 发版后先把推荐缓存和标签 IDF 算好
+
+进程刚起来时 _rec_cache 和 IDF 缓存都是空的，第一波流量全部要做候选扫描 + 打分。
+lifespan 里启动一个后台线程（不阻塞启动，/api/health 可看进度）：
+1. 加载标签 IDF
+2. 按上个进程退出时保存的热门请求列表（WARMUP_HOT_KEYS_PATH）逐个预算推荐，
+   不足 WARMUP_TOP_N 个（或首次部署没有列表）时用收藏量最高的书补齐，limit 用 WARMUP_LIMIT
+
+热门请求列表在进程退出时由 save_hot_keys 写盘（本进程计数 + 上个进程计数衰减后的合计）。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ..config import WARMUP_TOP_N, WARMUP_LIMIT, WARMUP_HOT_KEYS_PATH
+from ..utils.tag_idf import get_tag_idf
+from .novel_service import get_popular_book_ids
+from .recommendation_service import RETRIEVAL_MODES, get_hot_keys, get_recommendation_summary, seed_hot_keys
+
+logger = logging.getLogger(__name__)
+
+_status_lock = threading.Lock()
+_status: Dict = {"state": "idle"}
+
+_warmup_thread: Optional[threading.Thread] = None
+_warmup_stop = threading.Event()
+
+
+def _update_status(**fields) -> None:
+    with _status_lock:
+        _status.update(fields)
+
+
+def warmup_status() -> Dict:
+    """预热进度：state（idle / disabled / running / done / stopped / failed）、source、total、completed、errors、seconds。"""
+    with _status_lock:
+        return dict(_status)
+
+
+# ── 热门请求列表持久化 ─────────────────────────────────────────
+def load_hot_keys(path: str = WARMUP_HOT_KEYS_PATH) -> List[Tuple[Tuple, int]]:
+    """读上个进程保存的热门请求列表，文件不存在或损坏时返回空列表。"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+        return [((int(book_id), int(limit), mode), int(count))
+                for book_id, limit, mode, count in entries if mode in RETRIEVAL_MODES]
+    except FileNotFoundError:
+        return []
+    except (ValueError, TypeError) as e:
+        logger.warning(f"热门请求列表无法解析，忽略 ({path}): {e}", extra={"phase": "warmup"})
+        return []
+
+
+def save_hot_keys(path: str = WARMUP_HOT_KEYS_PATH, n: int = WARMUP_TOP_N) -> int:
+    """把最热的 n 个推荐请求写盘（原子替换），返回写入条数。"""
+    entries = [[book_id, limit, mode, count] for (book_id, limit, mode), count in get_hot_keys(n)]
+    if not entries:
+        return 0
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"热门请求列表保存失败 ({path}): {e}", extra={"phase": "warmup"})
+        return 0
+    return len(entries)
+
+
+# ── 预热 ──────────────────────────────────────────────────────
+def _plan_keys(top_n: int, path: str) -> Tuple[str, List[Tuple[int, int, str]]]:
+    """先取保存的热门请求，不足 top_n 时用收藏量最高的书补齐。"""
+    saved = load_hot_keys(path)
+    # 上个进程的计数打底，本进程退出时保存的列表不会只剩重启后这一小段时间的流量
+    seed_hot_keys(saved)
+    keys = [key for key, _ in saved[:top_n]]
+    if len(keys) >= top_n:
+        return "hot_keys", keys
+
+    planned = {(book_id, limit) for book_id, limit, mode in keys if mode == "exact"}
+    for book_id in get_popular_book_ids(top_n):
+        if len(keys) >= top_n:
+            break
+        if (book_id, WARMUP_LIMIT) not in planned:
+            keys.append((book_id, WARMUP_LIMIT, "exact"))
+    return ("hot_keys+popular" if saved else "popular"), keys
+
+
+def run_warmup(top_n: int = WARMUP_TOP_N, path: str = WARMUP_HOT_KEYS_PATH,
+               stop_event: Optional[threading.Event] = None) -> Dict:
+    """同步跑一遍预热（start_warmup 在后台线程里调用），返回最终状态。"""
+    start = time.time()
+    _update_status(state="running", source=None, total=0, completed=0, errors=0,
+                   started_at=start, seconds=None)
+    try:
+        get_tag_idf()
+        source, keys = _plan_keys(top_n, path)
+        _update_status(source=source, total=len(keys))
+        for book_id, limit, mode in keys:
+            if stop_event is not None and stop_event.is_set():
+                break
+            try:
+                get_recommendation_summary(book_id, limit, mode, track=False)
+            except Exception:
+                # 书已被删除等：跳过，不影响其余预热
+                with _status_lock:
+                    _status["errors"] += 1
+            with _status_lock:
+                _status["completed"] += 1
+        stopped = stop_event is not None and stop_event.is_set()
+        _update_status(state="stopped" if stopped else "done", seconds=round(time.time() - start, 1))
+    except Exception as e:
+        logger.exception("启动预热失败", extra={"phase": "warmup"})
+        _update_status(state="failed", error=str(e), seconds=round(time.time() - start, 1))
+    return warmup_status()
+
+
+def start_warmup(top_n: int = WARMUP_TOP_N) -> bool:
+    """启动后台预热线程（top_n <= 0 时不启动），返回是否已启动。"""
+    global _warmup_thread
+    if top_n <= 0:
+        _update_status(state="disabled")
+        return False
+    if _warmup_thread is not None and _warmup_thread.is_alive():
+        return False
+    _warmup_stop.clear()
+    _update_status(state="running")
+    _warmup_thread = threading.Thread(
+        target=run_warmup, args=(top_n,), kwargs={"stop_event": _warmup_stop},
+        name="cache-warmup", daemon=True,
+    )
+    _warmup_thread.start()
+    return True
+
+
+def stop_warmup() -> None:
+    """通知预热线程在当前这本书算完后退出。"""
+    _warmup_stop.set()
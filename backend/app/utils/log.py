@@ -0,0 +1,172 @@
+"""
+结构化异步日志：业务线程只把记录放进有界队列，由后台线程格式化并写 stdout。
+
+- 根 logger 只挂一个 QueueHandler：msg % args 和异常堆栈在调用方线程定型后入队，
+  队列满时丢弃并计数（LOG_RECORDS_DROPPED），绝不阻塞请求线程
+- QueueListener 线程负责格式化和写出：LOG_FORMAT=json 时每行一个 JSON 对象，
+  text 时是本地开发用的可读格式（附加字段拼在行尾）
+- 每条记录自动带上当前请求的 request_id（RequestIdMiddleware 写入 ContextVar，
+  asyncio.to_thread / BackgroundTasks 会复制 context，线程池里的日志也能关联到请求）
+- 业务字段用 extra 传：logger.info("封面已补全", extra={"book_id": 1, "phase": "cover", "duration_ms": 12.3})
+- 高频日志在 extra 里带 sample="键"，同一个键每 LOG_SAMPLE_EVERY 条只输出 1 条，记录里带 sampled=N
+
+setup_logging() 在 app.main 导入时调用；命令行脚本在 main() 开头调用 setup_logging(fmt="text")。
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from ..config import LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE, LOG_SAMPLE_EVERY
+from .metrics import LOG_RECORDS_DROPPED
+
+_request_id: ContextVar[Optional[str]] = ContextVar("novelmind_request_id", default=None)
+
+# LogRecord 自带的属性；其余属性都是 extra 传进来的业务字段
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+def set_request_id(request_id: Optional[str]):
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token) -> None:
+    _request_id.reset(token)
+
+
+def get_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict:
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED and not k.startswith("_")}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            data["request_id"] = record.request_id
+        data.update(_extra_fields(record))
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if getattr(record, "request_id", None):
+            fields = {"request_id": record.request_id, **fields}
+        if fields:
+            head, sep, tail = line.partition("\n")
+            line = head + "  " + " ".join(f"{k}={v}" for k, v in fields.items()) + sep + tail
+        return line
+
+
+class _ContextFilter(logging.Filter):
+    """在调用方线程里取 request_id（ContextVar 到了监听线程就读不到了）。"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = _request_id.get()
+        return True
+
+
+class _SampleFilter(logging.Filter):
+    """带 sample 键的记录每 every 条放行 1 条（第 1、every+1、… 条）。"""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(every, 1)
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample", None)
+        if key is None or self.every == 1 or record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            n = self._counts.get(key, 0)
+            self._counts[key] = n + 1
+        if n % self.every:
+            return False
+        record.sampled = self.every
+        return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 参数和异常在这里就定型：监听线程处理时原对象可能已被修改，traceback 也不该跨线程持有
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(level=record.levelname)
+
+
+_listener: Optional[QueueListener] = None
+_stream: Optional[logging.Handler] = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> None:
+    """把根 logger 换成队列 + 后台写出线程；重复调用无副作用。"""
+    global _listener, _stream
+    with _setup_lock:
+        if _listener is not None:
+            return
+        _stream = stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(LOG_QUEUE_SIZE)
+        handler = _NonBlockingQueueHandler(log_queue)
+        handler.addFilter(_ContextFilter())
+        handler.addFilter(_SampleFilter(LOG_SAMPLE_EVERY))
+
+        root = logging.getLogger()
+        root.handlers = [handler]
+        root.setLevel(level)
+        # uvicorn 自带的 handler 是同步写 stderr 的，改为交给根 logger
+        for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+            uv_logger = logging.getLogger(name)
+            uv_logger.handlers = []
+            uv_logger.propagate = True
+
+        _listener = QueueListener(log_queue, stream)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """写完队列里剩余的日志后停掉后台线程（进程退出时调用）；之后的日志直接同步写出。"""
+    global _listener
+    with _setup_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+        logging.getLogger().handlers = [_stream]
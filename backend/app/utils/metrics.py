@@ -0,0 +1,247 @@
+"""
+进程内指标（Prometheus 文本格式），/metrics 输出。
+
+不依赖 prometheus_client：只实现用得到的 Counter / Gauge / Histogram + 标签，线程安全。
+指标定义集中在本文件末尾，各模块 import 对应指标对象直接记录：
+- HTTP 路由延迟（api/metrics.py 的 MetricsMiddleware 记录，route 取路由模板）
+- 数据库查询耗时（按查询名）、推荐候选集大小与打分耗时
+- 推荐缓存 / 标签 IDF 缓存的命中、未命中、淘汰
+- 爬虫请求耗时（按主机和接口路径）与结果
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 秒级延迟的默认分桶：1ms ~ 30s（覆盖缓存命中到实时爬取）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，收到 {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return super().render() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items
+        ]
+
+
+class Gauge(_Metric):
+    """瞬时值：可 set，也可挂一个回调在抓取时现取（如连接池占用）。"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function = function
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception:
+                return []
+            items = [((), value)] if value is not None else []
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return super().render() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签：[各桶计数..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                row[index] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """计时上下文：with HIST.time(query="x"): ...（异常也记录）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels) -> Callable:
+        """计时装饰器。"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self, **labels) -> Tuple[int, float]:
+        """(count, sum)，脚本 / 调试用。"""
+        with self._lock:
+            row = self._values.get(self._key(labels))
+        return (int(row[-1]), row[-2]) if row else (0, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = super().render()
+        for key, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                le = f'le="{float(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {int(cumulative)}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, inf)} {int(row[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(row[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {int(row[-1])}")
+        return lines
+
+
+class _Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标重复注册: {metric.name}")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = _Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+# ── 指标定义 ──────────────────────────────────────────────────
+HTTP_REQUEST_SECONDS = Histogram(
+    "novelmind_http_request_duration_seconds", "HTTP 请求处理耗时（按路由模板）",
+    ("method", "route", "status"),
+)
+HTTP_IN_PROGRESS = Gauge(
+    "novelmind_http_requests_in_progress", "正在处理的 HTTP 请求数", ("method",),
+)
+
+DB_QUERY_SECONDS = Histogram(
+    "novelmind_db_query_duration_seconds", "数据库查询耗时（按查询名）", ("query",),
+)
+
+REC_CANDIDATES = Histogram(
+    "novelmind_recommendation_candidates", "推荐候选集大小", ("mode",),
+    buckets=(10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+)
+REC_SCORING_SECONDS = Histogram(
+    "novelmind_recommendation_scoring_duration_seconds", "推荐候选打分耗时", ("mode",),
+)
+CACHE_EVENTS = Counter(
+    "novelmind_cache_events_total", "缓存事件：hit / miss / expired / eviction / invalidation", ("cache", "event"),
+)
+
+CRAWLER_REQUEST_SECONDS = Histogram(
+    "novelmind_crawler_request_duration_seconds", "上游请求耗时（不含限速等待）", ("host", "endpoint"),
+)
+CRAWLER_REQUESTS = Counter(
+    "novelmind_crawler_requests_total", "上游请求结果：ok / not_modified / not_found / http_error / error",
+    ("host", "endpoint", "outcome"),
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "novelmind_log_records_dropped_total", "日志队列满被丢弃的记录数", ("level",),
+)
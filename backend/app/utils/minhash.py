@@ -0,0 +1,112 @@
+"""
+加权 MinHash 签名 + LSH 分桶，用于标签集合的近似近邻（ANN）召回。
+
+签名采用「指数竞赛」式加权 MinHash：第 i 个哈希位取
+    argmin_t  E_i(t) / w_t ，  E_i(t) = -ln U_i(t)，U_i(t) 由 (i, t) 确定性哈希得到
+两本书第 i 位相同的概率等于它们的概率 Jaccard；当同一标签在两本书里权重相同
+（都取全局 idf(t)）时，它恰好就是 calculate_tag_similarity 用的 IDF 加权 Jaccard。
+
+LSH 把签名切成 bands 段、每段 rows 位，任一段完全相同即落入同一个桶。
+相似度为 s 的两本书被召回的概率约为 1 - (1 - s^rows)^bands。
+"""
+import hashlib
+import math
+import threading
+from typing import Dict, Iterable, List, Set, Tuple
+
+_U64 = float(1 << 64)
+
+
+def _tag_id(tag: str) -> int:
+    """标签的稳定整数 id（跨进程一致，不依赖 Python 的随机化 hash）。"""
+    return int.from_bytes(hashlib.blake2b(tag.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class WeightedMinHash:
+    """给 {标签: 权重} 生成定长的加权 MinHash 签名。"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        self.num_perm = num_perm
+        self._seed = seed.to_bytes(8, "big")
+        # 标签词表不大（几千个），每个标签的 num_perm 个指数样本算一次后常驻
+        self._samples: Dict[str, Tuple[List[float], int]] = {}
+        self._lock = threading.Lock()
+
+    def _tag_samples(self, tag: str) -> Tuple[List[float], int]:
+        cached = self._samples.get(tag)
+        if cached is not None:
+            return cached
+
+        raw = b""
+        block = 0
+        data = tag.encode("utf-8")
+        while len(raw) < self.num_perm * 8:
+            raw += hashlib.blake2b(
+                data, digest_size=64, key=self._seed, salt=block.to_bytes(16, "big")
+            ).digest()
+            block += 1
+        samples = [
+            -math.log((int.from_bytes(raw[i * 8:(i + 1) * 8], "big") + 0.5) / _U64)
+            for i in range(self.num_perm)
+        ]
+        entry = (samples, _tag_id(tag))
+        with self._lock:
+            self._samples[tag] = entry
+        return entry
+
+    def signature(self, weights: Dict[str, float]) -> Tuple[int, ...]:
+        """生成签名；空集合返回空元组（不参与分桶）。"""
+        items = [(self._tag_samples(t), w) for t, w in weights.items() if w > 0]
+        if not items:
+            return ()
+        sig = []
+        for i in range(self.num_perm):
+            best = min(items, key=lambda it: it[0][0][i] / it[1])
+            sig.append(best[0][1])
+        return tuple(sig)
+
+
+class MinHashLSH:
+    """签名分段分桶的倒排索引：key（book_id）→ 签名，(段号, 段哈希) → key 集合。"""
+
+    def __init__(self, bands: int, rows: int):
+        self.bands = bands
+        self.rows = rows
+        self._buckets: List[Dict[int, Set[int]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[int, Tuple[int, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _band_keys(self, sig: Tuple[int, ...]) -> Iterable[Tuple[int, int]]:
+        for b in range(self.bands):
+            yield b, hash(sig[b * self.rows:(b + 1) * self.rows])
+
+    def insert(self, key: int, sig: Tuple[int, ...]) -> None:
+        """插入或更新一条签名（已存在则先从旧桶里摘掉）。"""
+        self.remove(key)
+        if not sig:
+            return
+        self._signatures[key] = sig
+        for b, h in self._band_keys(sig):
+            self._buckets[b].setdefault(h, set()).add(key)
+
+    def remove(self, key: int) -> None:
+        old = self._signatures.pop(key, None)
+        if old is None:
+            return
+        for b, h in self._band_keys(old):
+            bucket = self._buckets[b].get(h)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[b][h]
+
+    def query(self, sig: Tuple[int, ...]) -> Set[int]:
+        """返回与签名至少有一段完全相同的所有 key。"""
+        if not sig:
+            return set()
+        hits: Set[int] = set()
+        for b, h in self._band_keys(sig):
+            hits.update(self._buckets[b].get(h, ()))
+        return hits
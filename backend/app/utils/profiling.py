@@ -0,0 +1,313 @@
+"""
+线上性能剖析：统计式栈采样（全部线程）+ 单请求 cProfile。
+
+- 栈采样：定时用 sys._current_frames() 抓所有线程的 Python 调用栈，按「折叠栈」计数
+  （每行 `线程;外层函数;…;内层函数 次数`，flamegraph.pl / inferno / speedscope 可直接画火焰图）。
+  不插桩、不挂 setprofile，开销只和采样频率、线程数成正比；每次采样的耗时单独统计，
+  summary 里的 overhead 就是采样线程占用的时间比例
+  · 按需：sample_for() 阻塞采样 N 秒，同一时间只允许一个
+  · 常驻：PROFILE_CONTINUOUS_HZ > 0 时后台线程低频采样，持续累积，可随时取走 / 清零
+- 单请求 cProfile：ProfilingMiddleware 对带 X-Profile: 1 的请求开启。事件循环线程上的剖析
+  覆盖整个请求（期间其他请求在事件循环上的少量工作也会混进来）；to_thread 提交的任务由
+  ProfilingThreadPoolExecutor 在工作线程里各自剖析，最后合并成一份 pstats
+
+空闲线程（等锁 / 等队列 / 事件循环 select）默认不计入，否则火焰图会被它们占满。
+"""
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import partial
+from typing import Deque, Dict, List, Optional
+
+from ..config import PROFILING_TOKEN, PROFILE_CONTINUOUS_HZ, PROFILE_BUFFER_SIZE
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 栈顶是这些函数的线程视为空闲：(文件名, 函数名)
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),  # ThreadPoolExecutor 空闲线程阻塞在 C 层 SimpleQueue.get
+}
+_MAX_DEPTH = 128
+# 不同折叠栈的条数上限，超出后新栈计入 _TRUNCATED，常驻采样内存有界
+_MAX_STACKS = 5000
+_TRUNCATED = "[其他栈（超出上限未单独记录）]"
+
+
+class ProfilerBusyError(Exception):
+    """已有按需剖析在进行"""
+    pass
+
+
+def check_admin_token(token: Optional[str]) -> bool:
+    return bool(PROFILING_TOKEN) and token is not None and hmac.compare_digest(token, PROFILING_TOKEN)
+
+
+# ── 栈采样 ──────────────────────────────────────────────────────
+_labels: Dict = {}
+
+
+def _label(code) -> str:
+    """帧标签 `文件:函数`：本项目代码用相对 backend/ 的路径，第三方库取最后两级路径。"""
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        if path.startswith(_BACKEND_DIR + os.sep):
+            short = os.path.relpath(path, _BACKEND_DIR)
+        else:
+            short = "/".join(path.replace(os.sep, "/").rsplit("/", 2)[-2:])
+        label = _labels[code] = f"{short}:{code.co_name}".replace(";", ",")
+    return label
+
+
+def _thread_group(name: str) -> str:
+    # to-thread_3 / Thread-7 (worker) 这类编号去掉，同一线程池的栈合并到一起
+    name = re.sub(r"^Thread-\d+", "Thread", name)
+    return re.sub(r"[_-]\d+$", "", name).replace(";", ",")
+
+
+class StackSampler:
+    """定时抓取全部线程的调用栈，按折叠栈计数。"""
+
+    def __init__(self, hz: float, include_idle: bool = False):
+        self.hz = hz
+        self.interval = 1.0 / hz
+        self.include_idle = include_idle
+        self.counts: Counter = Counter()
+        self.ticks = 0
+        self.cost = 0.0            # 采样本身的累计耗时（秒）
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def sample_once(self, skip_ident: Optional[int] = None) -> None:
+        start = time.perf_counter()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == skip_ident:
+                continue
+            if not self.include_idle and (
+                    os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_LEAVES:
+                continue
+            labels = []
+            while frame is not None and len(labels) < _MAX_DEPTH:
+                labels.append(_label(frame.f_code))
+                frame = frame.f_back
+            labels.append(_thread_group(names.get(ident, str(ident))))
+            stacks.append(";".join(reversed(labels)))
+        with self._lock:
+            for key in stacks:
+                if key in self.counts or len(self.counts) < _MAX_STACKS:
+                    self.counts[key] += 1
+                else:
+                    self.counts[_TRUNCATED] += 1
+            self.ticks += 1
+            self.cost += time.perf_counter() - start
+
+    def run(self, stop: threading.Event, seconds: Optional[float] = None) -> None:
+        """在当前线程上循环采样，直到 stop 被设置或满 seconds 秒；落后时不追补。"""
+        me = threading.get_ident()
+        deadline = None if seconds is None else time.perf_counter() + seconds
+        next_at = time.perf_counter()
+        while not stop.is_set():
+            self.sample_once(skip_ident=me)
+            now = time.perf_counter()
+            if deadline is not None and now >= deadline:
+                break
+            next_at = max(next_at + self.interval, now)
+            stop.wait(next_at - now)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts.clear()
+            self.ticks = 0
+            self.cost = 0.0
+            self.started_at = time.time()
+
+    def collapsed(self) -> str:
+        with self._lock:
+            items = self.counts.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def summary(self, top: int = 30) -> Dict:
+        """采样概况 + 自身耗时（栈顶）/ 累计耗时（栈上任意位置）最高的函数。"""
+        with self._lock:
+            items = list(self.counts.items())
+            ticks, cost, started_at = self.ticks, self.cost, self.started_at
+        total = sum(count for _, count in items) or 1
+        self_counts: Counter = Counter()
+        cumulative: Counter = Counter()
+        for stack, count in items:
+            frames = stack.split(";")[1:] or [stack]
+            self_counts[frames[-1]] += count
+            for frame in set(frames):
+                cumulative[frame] += count
+        elapsed = max(time.time() - started_at, 1e-9)
+        return {
+            "hz": self.hz,
+            "seconds": round(elapsed, 1),
+            "ticks": ticks,
+            "samples": total if items else 0,
+            "distinct_stacks": len(items),
+            "overhead": round(cost / elapsed, 5),
+            "top_self": [{"frame": f, "samples": n, "ratio": round(n / total, 4)}
+                         for f, n in self_counts.most_common(top)],
+            "top_cumulative": [{"frame": f, "samples": n, "ratio": round(n / total, 4)}
+                               for f, n in cumulative.most_common(top)],
+        }
+
+
+_on_demand_lock = threading.Lock()
+
+
+def sample_for(seconds: float, hz: float, include_idle: bool = False) -> StackSampler:
+    """阻塞采样 seconds 秒（调用方放进 asyncio.to_thread），同一时间只允许一个按需剖析。"""
+    if not _on_demand_lock.acquire(blocking=False):
+        raise ProfilerBusyError("已有按需剖析在进行")
+    try:
+        sampler = StackSampler(hz, include_idle)
+        sampler.run(threading.Event(), seconds)
+        return sampler
+    finally:
+        _on_demand_lock.release()
+
+
+# ── 常驻低频采样 ────────────────────────────────────────────────
+_continuous: Optional[StackSampler] = None
+_continuous_thread: Optional[threading.Thread] = None
+_continuous_stop = threading.Event()
+
+
+def start_continuous_profiler(hz: float = PROFILE_CONTINUOUS_HZ) -> bool:
+    """启动常驻采样线程（hz <= 0 或未配置管理员令牌时不启动），返回是否已启动。"""
+    global _continuous, _continuous_thread
+    if hz <= 0 or not PROFILING_TOKEN or (_continuous_thread is not None and _continuous_thread.is_alive()):
+        return False
+    _continuous_stop.clear()
+    _continuous = StackSampler(hz)
+    _continuous_thread = threading.Thread(target=_continuous.run, args=(_continuous_stop,),
+                                          name="stack-sampler", daemon=True)
+    _continuous_thread.start()
+    return True
+
+
+def stop_continuous_profiler() -> None:
+    _continuous_stop.set()
+
+
+def continuous_sampler() -> Optional[StackSampler]:
+    return _continuous
+
+
+# ── 单请求 cProfile ─────────────────────────────────────────────
+_request_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("novelmind_request_profile", default=None)
+
+
+class RequestProfile:
+    """一个请求的 cProfile 结果：事件循环线程一份 + 每个 to_thread 任务一份，取用时合并。"""
+
+    def __init__(self, name: str):
+        self.profile_id = os.urandom(8).hex()
+        self.name = name
+        self.started_at = time.time()
+        self.duration_ms: Optional[float] = None
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._loop_profile = cProfile.Profile()
+        self._profiles: List[cProfile.Profile] = [self._loop_profile]
+
+    def _run_profiled(self, fn, *args, **kwargs):
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            with self._lock:
+                self._profiles.append(profile)
+
+    def wrap(self, fn):
+        return partial(self._run_profiled, fn)
+
+    def stats(self, stream=None) -> pstats.Stats:
+        with self._lock:
+            profiles = list(self._profiles)
+        stats = pstats.Stats(profiles[0], stream=stream)
+        for profile in profiles[1:]:
+            # 工作线程里可能什么 Python 调用都没记到，空 profile 不能参与合并
+            if profile.getstats():
+                stats.add(profile)
+        return stats
+
+    def text(self, sort: str = "cumulative", limit: int = 50) -> str:
+        buf = io.StringIO()
+        self.stats(stream=buf).strip_dirs().sort_stats(sort).print_stats(limit)
+        return buf.getvalue()
+
+    def pstats_bytes(self) -> bytes:
+        """与 Stats.dump_stats 相同的格式，可直接交给 snakeviz / pstats 打开。"""
+        return marshal.dumps(self.stats().stats)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            parts = len(self._profiles)
+        return {"profile_id": self.profile_id, "name": self.name, "started_at": self.started_at,
+                "duration_ms": self.duration_ms, "threads": parts}
+
+
+class ProfilingThreadPoolExecutor(ThreadPoolExecutor):
+    """asyncio.to_thread 的默认线程池：提交时当前请求开了 cProfile，就让任务在工作线程里也被剖析。"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        profile = _request_profile.get()
+        if profile is not None:
+            fn = profile.wrap(fn)
+        return super().submit(fn, *args, **kwargs)
+
+
+# cProfile 每个线程同时只能有一个，事件循环线程上的请求剖析一次只开一个
+_request_lock = threading.Lock()
+_recent_lock = threading.Lock()
+_recent: Deque[RequestProfile] = deque(maxlen=PROFILE_BUFFER_SIZE)
+
+
+def start_request_profile(name: str):
+    """在事件循环线程上开启请求剖析，返回 (profile, token)；已有请求在剖析时返回 (None, None)。"""
+    if not _request_lock.acquire(blocking=False):
+        return None, None
+    profile = RequestProfile(name)
+    token = _request_profile.set(profile)
+    profile._loop_profile.enable()
+    return profile, token
+
+
+def finish_request_profile(profile: RequestProfile, token) -> None:
+    profile._loop_profile.disable()
+    _request_profile.reset(token)
+    _request_lock.release()
+    profile.duration_ms = round((time.perf_counter() - profile._start) * 1000, 3)
+    with _recent_lock:
+        _recent.append(profile)
+
+
+def recent_request_profiles() -> List[Dict]:
+    with _recent_lock:
+        profiles = list(_recent)
+    return [p.to_dict() for p in reversed(profiles)]
+
+
+def get_request_profile(profile_id: str) -> Optional[RequestProfile]:
+    with _recent_lock:
+        return next((p for p in _recent if p.profile_id == profile_id), None)
@@ -0,0 +1,50 @@
+"""
+多 worker 部署时选出唯一运行后台调度的进程。
+
+统计刷新、目录发现、目录快照生成这类调度每个进程都起一份的话，上游请求和全表扫描会按 worker 数成倍增加。
+启动时非阻塞地对 SCHEDULER_LOCK_PATH 加排他文件锁，拿到的 worker 运行调度并一直持有到退出；
+该 worker 退出（或崩溃）后锁由系统释放，gunicorn 拉起的替补 worker 启动时会重新拿到。
+"""
+import os
+from typing import Optional
+
+from ..config import SCHEDULER_LOCK_PATH
+
+# fcntl 只有 Unix 有；没有时每个进程都当作持锁者（与单进程部署行为一致）
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_lock_fd: Optional[int] = None
+
+
+def acquire_scheduler_lock(path: str = SCHEDULER_LOCK_PATH) -> bool:
+    """尝试成为调度进程，返回本进程是否持有锁（重复调用幂等）。"""
+    global _lock_fd
+    if _lock_fd is not None or not path or fcntl is None:
+        return True
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    _lock_fd = fd
+    return True
+
+
+def release_scheduler_lock() -> None:
+    global _lock_fd
+    if _lock_fd is None:
+        return
+    fcntl.flock(_lock_fd, fcntl.LOCK_UN)
+    os.close(_lock_fd)
+    _lock_fd = None
+
+
+def holds_scheduler_lock() -> bool:
+    return _lock_fd is not None or not SCHEDULER_LOCK_PATH or fcntl is None
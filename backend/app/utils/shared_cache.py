@@ -0,0 +1,290 @@
+"""
+跨进程共享缓存层：多 worker 部署时挂在各进程内存缓存之后的第二级缓存。
+
+- 本地内存缓存未命中时先查共享层，命中就直接用，不再重算；算出的结果同时写回共享层
+- 失效代数（generation）：invalidate 时共享代数 +1。每个 worker 最多每 SHARED_CACHE_SYNC_INTERVAL
+  秒读一次代数，变了就清空本进程缓存——命令行脚本默认也连同一个共享层，它们的 invalidate 同样会传到 worker
+- 共享层的键按代数分区：调用方在开始计算前读代数、写入时传给 put(start_generation=...)，
+  结果写进计算开始时的分区；期间有人 invalidate 过（代数已变）就直接丢弃，旧数据算出的结果不会被读到
+- 条目和代数按数据库分区（DATABASE_URL / SQLITE_PATH 的摘要）：共用一个缓存文件或 Redis 的进程
+  只有连的是同一个库才互相可见
+- 后端：sqlite（同机 worker 共用一个 WAL 模式的文件）/ redis（可选依赖，跨实例共享）
+- 值用 pickle 序列化（只在本服务自己的进程之间传递）；共享层出错时记日志（限频）并当作未命中，
+  服务退回纯进程内缓存，不影响请求
+"""
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Hashable, Optional
+
+from ..config import (
+    DATABASE_URL,
+    SQLITE_PATH,
+    SHARED_CACHE_BACKEND,
+    SHARED_CACHE_PATH,
+    SHARED_CACHE_REDIS_URL,
+    SHARED_CACHE_MAX_ENTRIES,
+    SHARED_CACHE_SYNC_INTERVAL,
+)
+from .metrics import CACHE_EVENTS
+
+# redis 可选：只有 SHARED_CACHE_BACKEND=redis 时需要
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+_REDIS_PREFIX = "novelmind:"
+# SQLite 后端每写入这么多条顺带清一次过期条目
+_PURGE_EVERY = 500
+# 共享层故障时每次读写都会失败，带堆栈的告警最多这么多秒记一条，期间被压下的次数记在下一条里
+_ERROR_LOG_INTERVAL = 60.0
+
+_DISABLED = ("", "none", "off")
+# 本进程连的数据库的摘要，用来给共享层的条目和代数分区（不把连接串本身写进缓存）
+_SCOPE = hashlib.blake2b((DATABASE_URL or os.path.abspath(SQLITE_PATH)).encode(), digest_size=8).hexdigest()
+
+
+class _SqliteBackend:
+    """同机多进程共享的 SQLite 文件；每个线程一个连接，WAL 模式下读不阻塞写。"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int, scope: str):
+        self.path = path
+        self.max_entries = max_entries
+        self.scope = scope
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (scope TEXT NOT NULL, key TEXT NOT NULL, generation INTEGER NOT NULL, "
+            "value BLOB NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (scope, key))"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS generations (scope TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO generations (scope, value) VALUES (?, 0)", (scope,))
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=2.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, generation: int) -> Optional[bytes]:
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE scope = ? AND key = ? AND generation = ? AND expires_at >= ?",
+            (self.scope, key, generation, time.time()),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def set(self, key: str, generation: int, value: bytes, ttl: float) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (scope, key, generation, value, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (self.scope, key, generation, value, now + ttl),
+        )
+        with self._writes_lock:
+            self._writes += 1
+            purge = self._writes % _PURGE_EVERY == 0
+        if purge:
+            conn.execute("DELETE FROM cache WHERE expires_at < ? OR (scope = ? AND generation < ?)",
+                         (now, self.scope, generation))
+            (count,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY expires_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def generation(self) -> int:
+        row = self._conn().execute("SELECT value FROM generations WHERE scope = ?", (self.scope,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE generations SET value = value + 1 WHERE scope = ?", (self.scope,))
+            (generation,) = conn.execute("SELECT value FROM generations WHERE scope = ?", (self.scope,)).fetchone()
+            # 旧分区已不可能被读到，直接删掉
+            conn.execute("DELETE FROM cache WHERE scope = ? AND generation < ?", (self.scope, generation))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return generation
+
+    def location(self) -> str:
+        return self.path
+
+
+class _RedisBackend:
+    """Redis 兼容服务：条目靠 TTL 过期，旧分区的键不主动删除。"""
+
+    name = "redis"
+
+    def __init__(self, url: str, scope: str):
+        if redis is None:
+            raise RuntimeError("SHARED_CACHE_BACKEND=redis 需要安装 redis 包")
+        self.url = url
+        self._prefix = f"{_REDIS_PREFIX}{scope}:"
+        self._client = redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+    def get(self, key: str, generation: int) -> Optional[bytes]:
+        return self._client.get(f"{self._prefix}g{generation}:{key}")
+
+    def set(self, key: str, generation: int, value: bytes, ttl: float) -> None:
+        self._client.set(f"{self._prefix}g{generation}:{key}", value, ex=max(int(ttl), 1))
+
+    def generation(self) -> int:
+        return int(self._client.get(f"{self._prefix}generation") or 0)
+
+    def bump(self) -> int:
+        return int(self._client.incr(f"{self._prefix}generation"))
+
+    def location(self) -> str:
+        # 不把 URL 里的密码带出去
+        return self.url.rsplit("@", 1)[-1]
+
+
+_backend = None
+_backend_pid: Optional[int] = None
+_backend_lock = threading.Lock()
+
+# 共享代数的本地副本：(代数, 读取时刻)
+_generation = 0
+_generation_read_at = float("-inf")
+
+_error_lock = threading.Lock()
+_error_logged_at = float("-inf")
+_errors_suppressed = 0
+
+
+def _get_backend():
+    """按配置创建后端（每个进程一次，fork 出来的 worker 不复用父进程的连接）；未启用或创建失败返回 None。"""
+    global _backend, _backend_pid, _generation_read_at
+    if SHARED_CACHE_BACKEND in _DISABLED:
+        return None
+    if _backend_pid == os.getpid():
+        return _backend
+    with _backend_lock:
+        if _backend_pid != os.getpid():
+            try:
+                if SHARED_CACHE_BACKEND == "redis":
+                    _backend = _RedisBackend(SHARED_CACHE_REDIS_URL, _SCOPE)
+                elif SHARED_CACHE_BACKEND == "sqlite":
+                    _backend = _SqliteBackend(SHARED_CACHE_PATH, SHARED_CACHE_MAX_ENTRIES, _SCOPE)
+                else:
+                    raise RuntimeError(f"未知的 SHARED_CACHE_BACKEND: {SHARED_CACHE_BACKEND}")
+            except Exception:
+                logger.exception("共享缓存层初始化失败，退回进程内缓存", extra={"phase": "shared_cache"})
+                _backend = None
+            _backend_pid = os.getpid()
+            _generation_read_at = float("-inf")
+    return _backend
+
+
+def enabled() -> bool:
+    return _get_backend() is not None
+
+
+def _failed(op: str) -> None:
+    """记一次共享层故障：指标每次都计，告警按 _ERROR_LOG_INTERVAL 限频（故障期间每个请求都会走到这里）。"""
+    global _error_logged_at, _errors_suppressed
+    CACHE_EVENTS.inc(cache="shared", event="error")
+    now = time.monotonic()
+    with _error_lock:
+        if now - _error_logged_at < _ERROR_LOG_INTERVAL:
+            _errors_suppressed += 1
+            return
+        suppressed, _errors_suppressed = _errors_suppressed, 0
+        _error_logged_at = now
+    logger.warning(f"共享缓存{op}失败", exc_info=True, extra={"phase": "shared_cache", "suppressed": suppressed})
+
+
+def generation() -> int:
+    """当前共享失效代数；距上次读取不足 SHARED_CACHE_SYNC_INTERVAL 秒时直接用本地副本。"""
+    global _generation, _generation_read_at
+    backend = _get_backend()
+    if backend is None:
+        return _generation
+    now = time.monotonic()
+    if now - _generation_read_at < SHARED_CACHE_SYNC_INTERVAL:
+        return _generation
+    try:
+        _generation = backend.generation()
+    except Exception:
+        _failed("读取代数")
+    # 失败也推迟下次读取，共享层故障时不在每个请求上重试
+    _generation_read_at = now
+    return _generation
+
+
+def bump_generation() -> Optional[int]:
+    """让所有进程的缓存失效，返回新代数；未启用或失败时返回 None。"""
+    global _generation, _generation_read_at
+    backend = _get_backend()
+    if backend is None:
+        return None
+    try:
+        _generation = backend.bump()
+    except Exception:
+        _failed("失效")
+        return None
+    _generation_read_at = time.monotonic()
+    CACHE_EVENTS.inc(cache="shared", event="invalidation")
+    return _generation
+
+
+def get(namespace: str, key: Hashable) -> Optional[Any]:
+    """取共享层里当前代数下的条目；未启用、未命中或出错都返回 None。"""
+    backend = _get_backend()
+    if backend is None:
+        return None
+    try:
+        raw = backend.get(f"{namespace}:{key!r}", generation())
+        value = None if raw is None else pickle.loads(raw)
+    except Exception:
+        _failed("读取")
+        return None
+    CACHE_EVENTS.inc(cache="shared", event="miss" if value is None else "hit")
+    return value
+
+
+def put(namespace: str, key: Hashable, value: Any, ttl: float, start_generation: Optional[int] = None) -> None:
+    """
+    把条目写进共享层；未启用或出错时什么都不做。
+
+    start_generation 传开始计算前 generation() 的返回值：代数已经变了（计算期间有 invalidate）就不写，
+    否则写进该代数的分区。不传时按当前代数写，只适合与数据无关、不会过时的值。
+    """
+    backend = _get_backend()
+    if backend is None:
+        return
+    current = generation()
+    if start_generation is not None and start_generation != current:
+        return
+    try:
+        backend.set(f"{namespace}:{key!r}", current, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ttl)
+    except Exception:
+        _failed("写入")
+
+
+def shared_cache_status() -> dict:
+    """供就绪检查展示：后端、位置和本进程看到的失效代数（不访问共享层，可在事件循环上调用）。"""
+    backend = _get_backend()
+    if backend is None:
+        return {"backend": None}
+    return {"backend": backend.name, "location": backend.location(), "generation": _generation}
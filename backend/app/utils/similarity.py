@@ -4,6 +4,14 @@
 from typing import Optional, List, Dict
 
 
+# 默认维度权重（完结状态不计入相似度）；单本推荐与书架推荐共用
+DEFAULT_WEIGHTS = {
+    "tags": 0.55,
+    "category": 0.18,
+    "perspective": 0.17,
+    "author": 0.1,
+}
+
 # 区分度极低的「基调」标签：几乎人人都有，单独命中不构成有意义的相似。
 # 生成推荐理由时把它们从「核心匹配」里剔除，避免出现「仅凭正剧凑数」的假理由。
 GENERIC_MOOD_TAGS = frozenset({"正剧", "轻松", "温馨"})
@@ -84,6 +92,38 @@ def _build_match_summary(
     return "，".join(p for p in lead if p) + "。"
 
 
+def _split_common_tags(ordered_tags: List[str], tags2: str) -> tuple[List[str], List[str]]:
+    """按 ordered_tags 的顺序取出 tags2 里也有的标签，分成「实质题材」与「基调」两类。"""
+    seen = set(tags2.split())
+    common_specific: List[str] = []
+    common_mood: List[str] = []
+    for t in ordered_tags:
+        if t in seen and t not in common_specific and t not in common_mood:
+            (common_mood if t in GENERIC_MOOD_TAGS else common_specific).append(t)
+    return common_specific, common_mood
+
+
+def _build_match_reasons(
+    common_specific: List[str],
+    common_mood: List[str],
+    category_match: bool,
+    perspective_match: str,
+    author_match: str,
+) -> List[str]:
+    """chips：短标签药丸（前端最多显示 2 个），优先放有区分度的题材标签。"""
+    reasons: List[str] = list(common_specific[:2])
+    if author_match and len(reasons) < 2:
+        reasons.append("同作者")
+    if not reasons:
+        if perspective_match:
+            reasons.append(f"{perspective_match}视角")
+        elif category_match:
+            reasons.append("同题材")
+        elif common_mood:
+            reasons.append(common_mood[0])
+    return reasons
+
+
 def calculate_tag_similarity(
     tags1: Optional[str],
     tags2: Optional[str],
@@ -181,16 +221,8 @@ def calculate_multidimensional_similarity(
         >>> print(f"匹配标签: {reasons}")
         >>> print(f"推荐理由: {summary}")
     """
-    # 默认权重配置（完结状态已移除）
-    default_weights = {
-        "tags": 0.55,
-        "category": 0.18,
-        "perspective": 0.17,
-        "author": 0.1
-    }
-
     # 使用自定义权重或默认权重
-    w = weights or default_weights
+    w = weights or DEFAULT_WEIGHTS
 
     score = 0.0
 
@@ -204,11 +236,8 @@ def calculate_multidimensional_similarity(
     common_mood: List[str] = []      # 低区分度的基调标签（正剧/轻松等）
     if tag_sim > 0:
         score += tag_sim * w["tags"]
-        # 保留原始顺序，把共同标签分成「实质题材」与「基调」两类
-        seen = set(tags2.split())
-        for t in tags1.split():
-            if t in seen and t not in common_specific and t not in common_mood:
-                (common_mood if t in GENERIC_MOOD_TAGS else common_specific).append(t)
+        # 保留目标标签的原始顺序
+        common_specific, common_mood = _split_common_tags(tags1.split(), tags2)
 
     # 2. 类型匹配
     category_match = bool(
@@ -236,17 +265,7 @@ def calculate_multidimensional_similarity(
         author_match = novel2["author"]
 
     # ── 生成理由 ───────────────────────────────────────────────────
-    # chips：短标签药丸（前端最多显示 2 个），优先放有区分度的题材标签
-    reasons: List[str] = list(common_specific[:2])
-    if author_match and len(reasons) < 2:
-        reasons.append("同作者")
-    if not reasons:
-        if perspective_match:
-            reasons.append(f"{perspective_match}视角")
-        elif category_match:
-            reasons.append("同题材")
-        elif common_mood:
-            reasons.append(common_mood[0])
+    reasons = _build_match_reasons(common_specific, common_mood, category_match, perspective_match, author_match)
 
     # summary：一句「为什么相似」的人话
     summary = _build_match_summary(
@@ -260,6 +279,115 @@ def calculate_multidimensional_similarity(
     return final_score, reasons, summary
 
 
+def calculate_profile_tag_similarity(
+    profile_weights: Dict[str, float],
+    tags2: Optional[str],
+    idf: Dict[str, float],
+    default_idf: float = 1.0,
+) -> float:
+    """
+    标签画像 vs 单本小说的广义加权 Jaccard：Σmin(p, c) / Σmax(p, c)。
+
+    画像权重 p_t = idf(t) × 含该标签的种子书占比；候选书的权重 c_t = idf(t)。
+    只有一本种子书时 p_t 就是 idf(t)，结果与 calculate_tag_similarity(…, idf) 完全一致。
+
+    Args:
+        profile_weights: {标签: 画像权重}
+        tags2: 候选小说的标签字符串
+        idf: {标签: IDF} 权重表
+        default_idf: idf 表里没有的标签的兜底权重
+
+    Returns:
+        float: 相似度分数，范围[0, 1]
+    """
+    if not profile_weights or not tags2:
+        return 0.0
+    set2 = set(tags2.strip().split())
+    if not set2:
+        return 0.0
+
+    inter_w = 0.0
+    union_w = 0.0
+    for t in set2:
+        union_w += idf.get(t, default_idf)
+        if t in profile_weights:
+            inter_w += profile_weights[t]
+    for t, p in profile_weights.items():
+        if t not in set2:
+            union_w += p
+    return inter_w / union_w if union_w > 0 else 0.0
+
+
+def calculate_profile_similarity(
+    profile: dict,
+    novel2: dict,
+    weights: Optional[dict] = None,
+    tag_idf: Optional[Dict[str, float]] = None,
+    default_idf: float = 1.0,
+) -> tuple[float, List[str], str]:
+    """
+    计算「多本种子书聚合画像」与一本候选小说的相似度（书架推荐用）。
+
+    维度与 calculate_multidimensional_similarity 相同，区别在于目标侧是分布而非单值：
+    - 标签：广义加权 Jaccard（见 calculate_profile_tag_similarity）
+    - 类型 / 视角 / 作者：权重 × 候选取值在种子书中的占比
+
+    Args:
+        profile: 画像字典，含 tag_weights / tag_order（标签在种子里首次出现的顺序）/ seed_count /
+                 category / perspective / author（后三者均为 {取值: 种子占比}）
+        novel2: 候选小说的字典数据
+        weights: 权重配置字典
+        tag_idf: {标签: IDF} 权重表
+        default_idf: idf 表里没有的标签的兜底权重
+
+    Returns:
+        tuple: (相似度分数[0-100], 匹配标签列表, 推荐理由整句)
+    """
+    w = weights or DEFAULT_WEIGHTS
+    tag_weights: Dict[str, float] = profile.get("tag_weights") or {}
+    tags2 = novel2.get("tags") or ""
+
+    score = 0.0
+    tag_sim = calculate_profile_tag_similarity(tag_weights, tags2, tag_idf or {}, default_idf)
+
+    common_specific: List[str] = []
+    common_mood: List[str] = []
+    if tag_sim > 0:
+        score += tag_sim * w["tags"]
+        # 多本种子时按画像权重从高到低（越是书架共性的标签越靠前，同权重按种子里出现的先后）；
+        # 只有一本种子时按它的标签顺序，理由与单本推荐一致
+        tag_order = profile.get("tag_order") or list(tag_weights)
+        if profile.get("seed_count", 0) > 1:
+            rank = {t: i for i, t in enumerate(tag_order)}
+            tag_order = sorted(tag_order, key=lambda t: (-tag_weights.get(t, 0.0), rank[t]))
+        common_specific, common_mood = _split_common_tags(tag_order, tags2)
+
+    category_share = (profile.get("category") or {}).get(novel2.get("category"), 0.0)
+    if category_share > 0:
+        score += w["category"] * category_share
+
+    perspective_match = ""
+    perspective_share = (profile.get("perspective") or {}).get(novel2.get("perspective"), 0.0)
+    if perspective_share > 0:
+        score += w["perspective"] * perspective_share
+        perspective_match = novel2["perspective"]
+
+    author_match = ""
+    author_share = (profile.get("author") or {}).get(novel2.get("author"), 0.0)
+    if author_share > 0:
+        score += w["author"] * author_share
+        author_match = novel2["author"]
+
+    reasons = _build_match_reasons(common_specific, common_mood, category_share > 0, perspective_match, author_match)
+
+    summary = _build_match_summary(
+        novel2, common_specific, common_mood,
+        category_share > 0, perspective_match, author_match, tag_sim,
+    )
+
+    return score * 100, reasons, summary
+
+
 if __name__ == "__main__":
     # 测试标签相似度计算
     tags_a = "强强 江湖 三教九流 正剧"
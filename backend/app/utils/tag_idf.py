@@ -5,36 +5,46 @@
 - 「正剧 / 轻松 / 甜文」这类几乎人人都有的高频标签 → IDF 低 → 权重小
 - 「破镜重圆 / 复仇虐渣」这类稀有强信号标签 → IDF 高 → 权重大
 
-从全库标签一次性统计文档频率（DF），结果缓存在内存；
+从 book_tag 关联表一次性统计文档频率（DF），结果缓存在内存；
 新书入库后调用 clear_tag_idf_cache() 失效重算（已接入 invalidate_recommendation_cache）。
+多 worker 部署时统计结果也放进共享缓存层，只有第一个未命中的进程去查库。
 """
 import math
 import threading
 from typing import Dict, Optional
 
 from ..database.connection import get_db_connection
+from . import shared_cache
+from .metrics import CACHE_EVENTS
+from .tracing import db_query
 
 _idf_cache: Optional[Dict[str, float]] = None
 _default_idf: float = 1.0          # 未登录标签（如实时爬取的新书带了库里没有的标签）的兜底权重
 _lock = threading.Lock()
+# 共享缓存层里的 IDF 不靠 TTL 过期，靠 invalidate 换代失效；这里只是兜底上限
+_SHARED_TTL = 86400
 
 
+@db_query("tag_idf")
 def _compute_tag_idf() -> Dict[str, float]:
-    """扫描全库 tags 字段，计算每个标签的平滑 IDF。"""
+    """按 book_tag 关联表统计每个标签的文档频率，计算平滑 IDF。"""
     global _default_idf
     doc_freq: Dict[str, int] = {}
-    total_docs = 0
 
+    # 走 book_tag 关联表：DF 是 (tag_id, book_id) 索引上的 GROUP BY，无需扫全表拆 tags 串。
+    # 关联表主键 (book_id, tag_id) 保证同书重复标签只计一次，与原先按 set 统计一致
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT tags FROM book")
+        cursor.execute("SELECT COUNT(DISTINCT book_id) AS total FROM book_tag")
+        total_docs = dict(cursor.fetchone())["total"] or 0
+        cursor.execute(
+            "SELECT t.name AS name, c.df AS df FROM "
+            "(SELECT tag_id, COUNT(*) AS df FROM book_tag GROUP BY tag_id) c "
+            "JOIN tag t ON t.tag_id = c.tag_id"
+        )
         for row in cursor.fetchall():
-            tags = (dict(row).get("tags") or "").split()
-            if not tags:
-                continue
-            total_docs += 1
-            for tag in set(tags):
-                doc_freq[tag] = doc_freq.get(tag, 0) + 1
+            row = dict(row)
+            doc_freq[row["name"]] = row["df"]
 
     if total_docs == 0:
         return {}
@@ -52,11 +62,23 @@ def _compute_tag_idf() -> Dict[str, float]:
 
 def get_tag_idf() -> Dict[str, float]:
     """返回 {标签: IDF}，首次调用时从库里计算并缓存。"""
-    global _idf_cache
+    global _idf_cache, _default_idf
     if _idf_cache is None:
         with _lock:
             if _idf_cache is None:
-                _idf_cache = _compute_tag_idf()
+                CACHE_EVENTS.inc(cache="tag_idf", event="miss")
+                # 先记下代数再查库：统计期间别的进程 invalidate 过时，结果只落进旧分区（或被丢弃）
+                generation = shared_cache.generation()
+                shared = shared_cache.get("tag_idf", "all")
+                if shared is not None:
+                    idf, _default_idf = shared
+                else:
+                    idf = _compute_tag_idf()
+                    shared_cache.put("tag_idf", "all", (idf, _default_idf), _SHARED_TTL,
+                                     start_generation=generation)
+                _idf_cache = idf
+                return _idf_cache
+    CACHE_EVENTS.inc(cache="tag_idf", event="hit")
     return _idf_cache
 
 
@@ -70,3 +92,4 @@ def clear_tag_idf_cache() -> None:
     global _idf_cache
     with _lock:
         _idf_cache = None
+    CACHE_EVENTS.inc(cache="tag_idf", event="invalidation")
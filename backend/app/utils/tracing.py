@@ -0,0 +1,267 @@
+"""
+进程内请求追踪（span 树），不依赖外部采集器。
+
+一次请求由 TracingMiddleware 开一个根 span，之后各层用 span() / traced() 记录子 span：
+route → service（fetch_stats_if_missing 等）→ DB 查询（db_query）→ 上游请求（crawler._get）。
+
+当前 span 存在 ContextVar 里：asyncio.to_thread 和 Starlette BackgroundTasks（anyio 线程池）
+都会复制调用方的 context，所以线程池里的子 span 自动挂到发起请求的那棵树上。
+没有活动追踪时（未采样且未开 Server-Timing）span() 只做一次 ContextVar 读取，开销可忽略。
+
+结果：
+- Server-Timing 响应头：按 span 名汇总耗时（TRACE_SERVER_TIMING 或管理员请求头 X-Trace: 1）
+- 被采样的请求保留完整 span 树（最近 TRACE_BUFFER_SIZE 条），/api/traces 查询（需管理员令牌），
+  TRACE_DUMP_PATH 非空时同时交给后台线程追加写入 JSONL（不在事件循环上做文件 IO，按大小轮转）
+"""
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+
+from ..config import TRACE_SAMPLE_RATE, TRACE_BUFFER_SIZE, TRACE_DUMP_PATH, TRACE_DUMP_MAX_BYTES
+from .metrics import DB_QUERY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("novelmind_current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attrs", "thread", "start", "end")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[int], attrs: Dict):
+        self.trace = trace
+        self.span_id = next(trace._ids)
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.thread = threading.current_thread().name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end is None else (self.end - self.start) * 1000
+
+    def set(self, key: str, value) -> None:
+        self.attrs[key] = value
+
+    def finish(self) -> None:
+        self.end = time.perf_counter()
+        self.trace._add(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ms": round((self.start - self.trace.root_start) * 1000, 3),
+            "duration_ms": None if self.end is None else round(self.duration_ms, 3),
+            "thread": self.thread,
+            "attrs": self.attrs,
+        }
+
+
+class Trace:
+    """一次请求的全部 span。span 可能在多个线程里结束，_add 加锁。"""
+
+    def __init__(self, sampled: bool):
+        self.trace_id = os.urandom(8).hex()
+        self.sampled = sampled
+        self.started_at = time.time()
+        self.root_start = time.perf_counter()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._spans: List[Span] = []
+
+    def _add(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def server_timing(self, limit: int = 20) -> str:
+        """按 span 名汇总已结束 span 的耗时，拼成 Server-Timing 头（根 span 除外）。"""
+        totals: "OrderedDict[str, List[float]]" = OrderedDict()
+        for span in sorted(self.spans(), key=lambda s: s.start):
+            if span.parent_id is None:
+                continue
+            entry = totals.setdefault(span.name, [0.0, 0])
+            entry[0] += span.duration_ms
+            entry[1] += 1
+        parts = []
+        for name, (dur, count) in list(totals.items())[:limit]:
+            part = f"{_metric_name(name)};dur={dur:.1f}"
+            if count > 1:
+                part += f';desc="x{count}"'
+            parts.append(part)
+        parts.append(f"total;dur={(time.perf_counter() - self.root_start) * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> Dict:
+        spans = sorted(self.spans(), key=lambda s: s.start)
+        root = next((s for s in spans if s.parent_id is None), None)
+        return {
+            "trace_id": self.trace_id,
+            "name": root.name if root else None,
+            "started_at": self.started_at,
+            "duration_ms": round(root.duration_ms, 3) if root and root.end else None,
+            "attrs": root.attrs if root else {},
+            "spans": [s.to_dict() for s in spans],
+        }
+
+
+def _metric_name(name: str) -> str:
+    # Server-Timing 的 metric 名是 HTTP token，不能有空格 / 斜杠等
+    return "".join(c if c.isalnum() or c in "._-" else "_" for c in name)
+
+
+# ── span API ────────────────────────────────────────────────────
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """在当前追踪下开一个子 span；没有活动追踪时什么也不做（yield None）。"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, attrs)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """函数级 span 装饰器，name 默认取函数名。"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def db_query(name: str) -> Callable:
+    """数据库查询：同时记 DB_QUERY_SECONDS 指标和 db.<name> span。"""
+    def decorator(func):
+        span_name = f"db.{name}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with DB_QUERY_SECONDS.time(query=name), span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ── 追踪生命周期（TracingMiddleware 调用）──────────────────────────
+def should_sample(forced: bool = False) -> bool:
+    return forced or (TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE)
+
+
+def start_trace(name: str, sampled: bool, **attrs):
+    """开根 span 并设为当前 span，返回 (root, token)；结束时交给 finish_trace。"""
+    trace = Trace(sampled)
+    root = Span(trace, name, None, attrs)
+    return root, _current_span.set(root)
+
+
+def finish_trace(root: Span, token) -> None:
+    root.finish()
+    _current_span.reset(token)
+    if root.trace.sampled:
+        _record(root.trace)
+
+
+_recent_lock = threading.Lock()
+_recent: Deque[Trace] = deque(maxlen=TRACE_BUFFER_SIZE)
+
+# 写盘队列：finish_trace 在事件循环上调用，序列化和文件 IO 都交给后台线程；队列满时丢弃
+_DUMP_QUEUE_SIZE = 1000
+_dump_queue: "queue.Queue[Trace]" = queue.Queue(maxsize=_DUMP_QUEUE_SIZE)
+_dump_thread: Optional[threading.Thread] = None
+_dump_thread_lock = threading.Lock()
+
+
+def _write_dump(lines: List[str]) -> None:
+    try:
+        if os.path.exists(TRACE_DUMP_PATH) and os.path.getsize(TRACE_DUMP_PATH) >= TRACE_DUMP_MAX_BYTES:
+            os.replace(TRACE_DUMP_PATH, TRACE_DUMP_PATH + ".1")
+        with open(TRACE_DUMP_PATH, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+    except OSError as e:
+        logger.warning(f"追踪写盘失败 ({TRACE_DUMP_PATH}): {e}")
+
+
+def _dump_loop() -> None:
+    while True:
+        traces = [_dump_queue.get()]
+        while len(traces) < _DUMP_QUEUE_SIZE:
+            try:
+                traces.append(_dump_queue.get_nowait())
+            except queue.Empty:
+                break
+        _write_dump([json.dumps(t.to_dict(), ensure_ascii=False, default=str) + "\n" for t in traces])
+
+
+def _enqueue_dump(trace: Trace) -> None:
+    global _dump_thread
+    if _dump_thread is None:
+        with _dump_thread_lock:
+            if _dump_thread is None:
+                _dump_thread = threading.Thread(target=_dump_loop, name="trace-dump", daemon=True)
+                _dump_thread.start()
+    try:
+        _dump_queue.put_nowait(trace)
+    except queue.Full:
+        pass
+
+
+def _record(trace: Trace) -> None:
+    with _recent_lock:
+        _recent.append(trace)
+    if TRACE_DUMP_PATH:
+        _enqueue_dump(trace)
+
+
+def recent_traces() -> List[Dict]:
+    """最近被采样的请求摘要（新的在前），不含 span 明细。"""
+    with _recent_lock:
+        traces = list(_recent)
+    result = []
+    for trace in reversed(traces):
+        data = trace.to_dict()
+        data["span_count"] = len(data.pop("spans"))
+        result.append(data)
+    return result
+
+
+def get_trace(trace_id: str) -> Optional[Dict]:
+    with _recent_lock:
+        trace = next((t for t in _recent if t.trace_id == trace_id), None)
+    return trace.to_dict() if trace else None
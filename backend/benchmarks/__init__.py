@@ -0,0 +1 @@
+"""推荐引擎基准测试（合成书目），入口见 benchmarks/run.py。"""
@@ -0,0 +1,106 @@
+"""
+合成书目：按晋江真实分布的形状生成任意规模的 book 数据，供基准测试灌库。
+
+- 标签：少数「人人都有」的高频标签（正剧 / 甜文 / 轻松 …）按固定概率独立出现，
+  其余从常见标签 + 随规模增长的长尾标签里按 Zipf 分布抽取，每本 1~6 个
+- 作者：Zipf 分布（少数高产作者写很多本），作者数约为书数的 1/8
+- 类型 / 视角：按实际站内比例加权，视角只有 6 种，是候选集最大的召回信号
+- 统计字段（收藏 / 评论 / 营养液 / 字数）对数正态分布，intro_short 非空，
+  保证推荐链路不会触发实时补全爬取
+
+同一 (size, seed) 生成的数据完全一致，基线对比才有意义。
+"""
+import bisect
+import itertools
+import math
+import random
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# 高频标签：(标签, 出现概率)，独立抽取
+UBIQUITOUS_TAGS: Sequence[Tuple[str, float]] = (
+    ("正剧", 0.35), ("甜文", 0.30), ("轻松", 0.25), ("爽文", 0.18), ("情有独钟", 0.15),
+)
+
+COMMON_TAGS: Sequence[str] = (
+    "豪门世家", "娱乐圈", "破镜重圆", "系统", "仙侠修真", "复仇虐渣", "江湖", "强强", "无限流",
+    "校园", "穿越时空", "重生", "快穿", "宫廷侯爵", "年代文", "天作之合", "穿书", "星际",
+    "末世", "灵异神怪", "都市异闻", "悬疑推理", "美食", "种田文", "女配", "团宠",
+    "追爱火葬场", "先婚后爱", "青梅竹马", "欢喜冤家", "业界精英", "花季雨季", "西方罗曼",
+    "综漫", "历史衍生", "机甲", "废土", "克苏鲁", "弹幕", "直播",
+)
+
+CATEGORY_ORIENTATIONS = (("言情", 0.45), ("纯爱", 0.35), ("无CP", 0.12), ("百合", 0.03), ("多元", 0.05))
+CATEGORY_ERAS = (("近代现代", 0.40), ("古色古香", 0.25), ("架空历史", 0.15), ("幻想未来", 0.20))
+CATEGORY_GENRES = (("爱情", 0.55), ("剧情", 0.12), ("仙侠", 0.08), ("奇幻", 0.07), ("科幻", 0.05),
+                   ("悬疑", 0.05), ("武侠", 0.03), ("轻小说", 0.05))
+PERSPECTIVES = (("女主", 0.40), ("主受", 0.25), ("主攻", 0.10), ("互攻", 0.08), ("男主", 0.07), ("不明", 0.10))
+
+
+def _weighted(pairs) -> Tuple[List[str], List[float]]:
+    values = [v for v, _ in pairs]
+    cum = list(itertools.accumulate(w for _, w in pairs))
+    return values, cum
+
+
+def _zipf_cum(n: int, s: float) -> List[float]:
+    return list(itertools.accumulate(1.0 / (rank + 1) ** s for rank in range(n)))
+
+
+def tag_vocabulary(size: int) -> List[str]:
+    """常见标签 + 长尾标签；长尾规模随书目增长（约每 50 本一个，至少 200）。"""
+    tail = max(200, size // 50)
+    return list(COMMON_TAGS) + [f"长尾标签{i}" for i in range(tail)]
+
+
+def generate_books(size: int, seed: int = 42) -> Iterator[Dict]:
+    """逐本生成 book_id 1..size 的书（生成器，不在内存里攒整个书目）。"""
+    rng = random.Random(seed)
+    vocab = tag_vocabulary(size)
+    vocab_cum = _zipf_cum(len(vocab), 1.1)
+    authors = max(1, size // 8)
+    author_cum = _zipf_cum(authors, 0.9)
+    orientations, orientation_cum = _weighted(CATEGORY_ORIENTATIONS)
+    eras, era_cum = _weighted(CATEGORY_ERAS)
+    genres, genre_cum = _weighted(CATEGORY_GENRES)
+    perspectives, perspective_cum = _weighted(PERSPECTIVES)
+
+    def pick(values, cum):
+        return values[bisect.bisect_left(cum, rng.random() * cum[-1])]
+
+    for book_id in range(1, size + 1):
+        tags = [tag for tag, p in UBIQUITOUS_TAGS if rng.random() < p]
+        wanted = rng.randint(1, 6)
+        while len(tags) < wanted:
+            tag = vocab[bisect.bisect_left(vocab_cum, rng.random() * vocab_cum[-1])]
+            if tag not in tags:
+                tags.append(tag)
+        author_rank = bisect.bisect_left(author_cum, rng.random() * author_cum[-1])
+        favorite = int(math.exp(rng.gauss(7.5, 1.8)))
+        finished = rng.random() < 0.6
+        yield {
+            "book_id": book_id,
+            "title": f"合成书{book_id}",
+            "author": f"合成作者{author_rank}",
+            "intro": f"合成简介{book_id}",
+            "intro_short": f"一句话简介{book_id}",
+            "tags": " ".join(tags),
+            "category": f"原创-{pick(orientations, orientation_cum)}-{pick(eras, era_cum)}-{pick(genres, genre_cum)}",
+            "perspective": pick(perspectives, perspective_cum),
+            "status": "完结" if finished else "连载",
+            "word_count": int(math.exp(rng.gauss(12.3, 0.9))),
+            "chapter_count": rng.randint(5, 300),
+            "review_count": int(favorite * rng.uniform(0.02, 0.2)),
+            "favorite_count": favorite,
+            "nutrient_count": int(favorite * rng.uniform(0.1, 3)),
+            "total_click_count": int(favorite * rng.uniform(5, 40)),
+            "score": int(favorite * rng.uniform(50, 400)),
+            "cover_url": f"https://i9-static.jjwxc.net/novelimage.php?novelid={book_id}",
+        }
+
+
+def batched(books: Iterator[Dict], batch_size: int) -> Iterator[List[Dict]]:
+    while True:
+        batch = list(itertools.islice(books, batch_size))
+        if not batch:
+            return
+        yield batch
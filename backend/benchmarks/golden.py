@@ -0,0 +1,304 @@
+"""
+推荐结果黄金集回归：固定书目 + 录制好的推荐输出，改打分 / 召回代码前后跑一遍，
+排名、分数、chips、推荐理由有任何变化都会逐条列出来。
+
+- 书目：benchmarks/fixtures/golden_catalog.jsonl（合成书目 + 少量缺标签 / 缺视角 / 缺类型的边界书），
+  入库后的打分不依赖网络，与生产代码走同一条 get_recommendations 链路
+- 黄金集：benchmarks/fixtures/golden_recommendations.json，每个目标记录前 k 名的
+  (book_id, similarity_score, match_reasons, match_summary)
+- check：默认与黄金集逐条比对。名次不同但两边的排序分（相似度 × 热度）相等视为并列，不算差异；
+  分数差超过 --score-tol、chips / 理由文字有变化都算差异
+- --mode ann：近似召回本来就不保证逐条一致，改为报告相对黄金集（精确模式）的
+  recall@k 与名次相关系数（Spearman，只在两边都出现的书上算；重合不足两本时记为 n/a、不计入均值），
+  均值低于阈值算失败
+
+有差异时退出码 1。打分逻辑有意改动时用 record 重新录制，并把黄金集的 diff 一起提交评审。
+
+用法：
+    cd backend && python -m benchmarks.golden check
+    cd backend && python -m benchmarks.golden check --mode ann --min-recall 0.75
+    cd backend && python -m benchmarks.golden record
+    cd backend && python -m benchmarks.golden record --new-catalog   # 连书目一起重新生成
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+FIXTURE_DIR = os.path.join(BENCH_DIR, "fixtures")
+CATALOG_PATH = os.path.join(FIXTURE_DIR, "golden_catalog.jsonl")
+GOLDEN_PATH = os.path.join(FIXTURE_DIR, "golden_recommendations.json")
+
+# 让脚本能 import app.*（把 backend/ 加入路径）
+sys.path.insert(0, BACKEND_DIR)
+
+# 黄金书目规模与种子：够小（秒级跑完、文件可入库），又能覆盖宽泛标签命中大半书目的情形
+CATALOG_SIZE = 500
+CATALOG_SEED = 2024
+# 边界书：按 book_id 取模抹掉字段，覆盖无标签 / 无视角 / 无类型的分支
+_EDGE_CASES = ((97, "tags", ""), (89, "perspective", None), (83, "category", None))
+
+
+# ── 书目 ────────────────────────────────────────────────────────
+def generate_catalog() -> List[Dict]:
+    from .catalog import generate_books
+
+    books = list(generate_books(CATALOG_SIZE, CATALOG_SEED))
+    for book in books:
+        for mod, field, value in _EDGE_CASES:
+            if book["book_id"] % mod == 0:
+                book[field] = value
+    return books
+
+
+def load_catalog() -> List[Dict]:
+    with open(CATALOG_PATH, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _catalog_digest() -> str:
+    with open(CATALOG_PATH, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def _edge_ids(books: List[Dict]) -> List[int]:
+    return sorted(b["book_id"] for b in books if any(b["book_id"] % mod == 0 for mod, _, _ in _EDGE_CASES))
+
+
+def _populate(books: List[Dict]) -> None:
+    from app.database.connection import get_db_connection, init_db_indexes
+    from app.services.novel_service import bulk_upsert_novels
+
+    init_db_indexes()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        for table in ("book_tag", "tag", "book"):
+            cursor.execute(f"DELETE FROM {table}")
+    count = bulk_upsert_novels(books)
+    if count != len(books):
+        raise RuntimeError(f"黄金书目灌库失败：写入 {count}/{len(books)}")
+
+
+# ── 跑推荐 ──────────────────────────────────────────────────────
+def _run_engine(target_ids: List[int], k: int, mode: str) -> Dict[str, List[Dict]]:
+    """对每个目标跑一次推荐，返回 {book_id(str): [推荐项, ...]}，推荐项只留比对需要的字段。"""
+    from app.services import recommendation_service as rec
+    from app.services.ann_service import build_ann_index
+    from app.services.novel_service import get_novels_by_ids
+
+    if mode == "ann":
+        build_ann_index()
+    targets = get_novels_by_ids(target_ids)
+    results = {}
+    for book_id in target_ids:
+        recommendations = rec.get_recommendations(targets[book_id], limit=k, mode=mode)
+        results[str(book_id)] = [{
+            "book_id": r["book_id"],
+            "similarity_score": r["similarity_score"],
+            # 排序分：判断名次变化是否只是并列项换位
+            "rank_key": round(r["similarity_score"] * rec._quality_factor(r), 4),
+            "match_reasons": r["match_reasons"],
+            "match_summary": r["match_summary"],
+        } for r in recommendations]
+    return results
+
+
+# ── 比对 ────────────────────────────────────────────────────────
+def _spearman(expected: List[int], actual: List[int]) -> Optional[float]:
+    """两边都出现的书上的 Spearman 名次相关系数；共同的书不足两本时无定义，返回 None。"""
+    actual_rank = {bid: i for i, bid in enumerate(actual)}
+    common = [bid for bid in expected if bid in actual_rank]
+    n = len(common)
+    if n < 2:
+        return None
+    order = sorted(common, key=lambda bid: actual_rank[bid])
+    rank_in_actual = {bid: i for i, bid in enumerate(order)}
+    d2 = sum((i - rank_in_actual[bid]) ** 2 for i, bid in enumerate(common))
+    return 1 - 6 * d2 / (n * (n * n - 1))
+
+
+def diff_target(expected: List[Dict], actual: List[Dict], score_tol: float) -> List[str]:
+    """逐名次、逐条比对一个目标的推荐，返回差异描述（空列表 = 一致）。"""
+    problems = []
+    for i in range(max(len(expected), len(actual))):
+        exp = expected[i] if i < len(expected) else None
+        act = actual[i] if i < len(actual) else None
+        if exp is None or act is None:
+            problems.append(f"第 {i + 1} 名: {exp and exp['book_id']} → {act and act['book_id']}（条数变化）")
+        elif exp["book_id"] != act["book_id"] and abs(exp["rank_key"] - act["rank_key"]) > 1e-4:
+            problems.append(f"第 {i + 1} 名: {exp['book_id']} → {act['book_id']}"
+                            f"（排序分 {exp['rank_key']} → {act['rank_key']}）")
+
+    actual_by_id = {r["book_id"]: r for r in actual}
+    for exp in expected:
+        act = actual_by_id.get(exp["book_id"])
+        if act is None:
+            continue
+        bid = exp["book_id"]
+        if abs(exp["similarity_score"] - act["similarity_score"]) > score_tol:
+            problems.append(f"{bid} 分数: {exp['similarity_score']} → {act['similarity_score']}")
+        if exp["match_reasons"] != act["match_reasons"]:
+            problems.append(f"{bid} chips: {exp['match_reasons']} → {act['match_reasons']}")
+        if exp["match_summary"] != act["match_summary"]:
+            problems.append(f"{bid} 理由: {exp['match_summary']} → {act['match_summary']}")
+    return problems
+
+
+def compare_exact(golden: Dict, current: Dict[str, List[Dict]], score_tol: float,
+                  max_report: int) -> int:
+    """精确模式比对，打印差异，返回有差异的目标数。"""
+    failed = 0
+    for book_id, expected in golden["results"].items():
+        problems = diff_target(expected, current[book_id], score_tol)
+        if not problems:
+            continue
+        failed += 1
+        if failed <= max_report:
+            print(f"✗ 目标 {book_id}: {len(problems)} 处差异")
+            for p in problems[:10]:
+                print(f"    {p}")
+            if len(problems) > 10:
+                print(f"    …… 另有 {len(problems) - 10} 处")
+    if failed > max_report:
+        print(f"…… 另有 {failed - max_report} 个目标有差异未展开")
+    return failed
+
+
+def _fmt_rho(rho: Optional[float], digits: int = 2) -> str:
+    return "n/a" if rho is None else f"{rho:.{digits}f}"
+
+
+def compare_approx(golden: Dict, current: Dict[str, List[Dict]], k: int) -> Tuple[float, Optional[float]]:
+    """
+    近似模式比对：打印最差的几个目标，返回 (平均 recall@k, 平均 Spearman)。
+
+    Spearman 只对与黄金集至少有两本重合的目标有定义，平均值只在这些目标上算；一个都没有时为 None。
+    """
+    rows = []
+    for book_id, expected in golden["results"].items():
+        exp_ids = [r["book_id"] for r in expected[:k]]
+        act_ids = [r["book_id"] for r in current[book_id][:k]]
+        recall = len(set(exp_ids) & set(act_ids)) / len(exp_ids) if exp_ids else 1.0
+        rows.append((book_id, recall, _spearman(exp_ids, act_ids)))
+    n = len(rows) or 1
+    mean_recall = sum(r[1] for r in rows) / n
+    rhos = [r[2] for r in rows if r[2] is not None]
+    mean_rho = sum(rhos) / len(rhos) if rhos else None
+    print("召回最差的几个目标：")
+    for book_id, recall, rho in sorted(rows, key=lambda r: (r[1], -1 if r[2] is None else r[2]))[:5]:
+        print(f"  book_id={book_id}  recall@{k}={recall:.2f}  spearman={_fmt_rho(rho)}")
+    return mean_recall, mean_rho
+
+
+# ── 入口 ────────────────────────────────────────────────────────
+def _use_database(pg_url: Optional[str]) -> None:
+    """在 import app.* 之前把数据库指到临时库（或指定的专用 PostgreSQL 库），绝不碰开发 / 生产库。"""
+    os.environ.pop("DATABASE_URL", None)
+    # 只比对本进程算出的结果，不读写部署共用的共享缓存；ANN 默认进程内建，不写到部署的快照路径
+    os.environ["SHARED_CACHE_BACKEND"] = "none"
+    os.environ.setdefault("CATALOG_SNAPSHOT_PATH", "")
+    if pg_url:
+        os.environ["DATABASE_URL"] = pg_url
+    else:
+        os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="golden-"), "golden.db")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def record(args) -> None:
+    if args.new_catalog or not os.path.exists(CATALOG_PATH):
+        os.makedirs(FIXTURE_DIR, exist_ok=True)
+        with open(CATALOG_PATH, "w", encoding="utf-8") as f:
+            for book in generate_catalog():
+                f.write(json.dumps(book, ensure_ascii=False, sort_keys=True) + "\n")
+        print(f"书目已生成: {CATALOG_PATH}")
+    books = load_catalog()
+    _populate(books)
+    sampled = random.Random(CATALOG_SEED).sample([b["book_id"] for b in books], args.targets)
+    target_ids = sorted(set(sampled) | set(_edge_ids(books)))
+    golden = {
+        "meta": {
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "catalog_sha256": _catalog_digest(),
+            "k": args.k,
+            "mode": "exact",
+        },
+        "results": _run_engine(target_ids, args.k, "exact"),
+    }
+    with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+        json.dump(golden, f, ensure_ascii=False, indent=1)
+        f.write("\n")
+    print(f"黄金集已录制: {len(target_ids)} 个目标 × 前 {args.k} 名 → {GOLDEN_PATH}")
+
+
+def check(args) -> int:
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        golden = json.load(f)
+    if golden["meta"]["catalog_sha256"] != _catalog_digest():
+        print("❌ 书目文件与录制黄金集时不一致，请先 record 重新录制")
+        return 1
+    _populate(load_catalog())
+    k = golden["meta"]["k"]
+    target_ids = [int(bid) for bid in golden["results"]]
+    current = _run_engine(target_ids, k, args.mode)
+
+    if args.mode == "exact":
+        failed = compare_exact(golden, current, args.score_tol, args.max_report)
+        if failed:
+            print(f"❌ {failed}/{len(target_ids)} 个目标与黄金集不一致"
+                  f"（有意改动打分请 record 重新录制并提交 diff）")
+            return 1
+        print(f"✓ {len(target_ids)} 个目标 × 前 {k} 名与黄金集一致（分数容差 {args.score_tol}）")
+        return 0
+
+    mean_recall, mean_rho = compare_approx(golden, current, k)
+    # 没有任何目标能算 Spearman 时只看 recall（此时 recall 本身已经很低）
+    ok = mean_recall >= args.min_recall and (mean_rho is None or mean_rho >= args.min_rank_corr)
+    print(f"{'✓' if ok else '❌'} {args.mode} 模式 {len(target_ids)} 个目标："
+          f"平均 recall@{k} = {mean_recall:.3f}（阈值 {args.min_recall}），"
+          f"平均 Spearman = {_fmt_rho(mean_rho, 3)}（阈值 {args.min_rank_corr}）")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推荐结果黄金集回归")
+    parser.add_argument("--pg-url", help="在指定的 PostgreSQL 专用库上跑（会被清空！默认用临时 SQLite 库）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_record = sub.add_parser("record", help="用当前代码重新录制黄金集")
+    p_record.add_argument("--targets", type=int, default=60, help="随机抽样的目标书数（另加全部边界书）")
+    p_record.add_argument("--k", type=int, default=10, help="每个目标记录前 k 名")
+    p_record.add_argument("--new-catalog", action="store_true", help="重新生成书目文件")
+
+    p_check = sub.add_parser("check", help="当前代码与黄金集比对")
+    p_check.add_argument("--mode", default="exact", choices=("exact", "ann"), help="召回模式")
+    p_check.add_argument("--score-tol", type=float, default=0.01, help="相似度分数允许的绝对误差")
+    p_check.add_argument("--min-recall", type=float, default=0.75, help="近似模式平均 recall@k 下限")
+    p_check.add_argument("--min-rank-corr", type=float, default=0.7, help="近似模式平均 Spearman 下限")
+    p_check.add_argument("--max-report", type=int, default=10, help="最多展开几个有差异的目标")
+    args = parser.parse_args()
+
+    _use_database(args.pg_url)
+    if args.command == "record":
+        record(args)
+    else:
+        sys.exit(check(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+推荐引擎基准测试：合成书目（1k / 10k / 100k / 1M）× SQLite / PostgreSQL。
+
+每个 (后端, 规模) 在独立子进程里跑（数据库配置在 import 时读取，内存峰值也互不干扰），测：
+- idf_build：清空缓存后重建标签 IDF
+- candidate_retrieval：get_candidate_novels（候选集 SQL + 行转 dict）
+- scoring：_score_candidates（对上一步的候选集打分排序）
+- summary_cold / summary_warm：get_recommendation_summary 未命中 / 命中推荐缓存
+以及候选集大小、tracemalloc 峰值（IDF 重建、一次冷推荐）和进程最大 RSS。
+
+SQLite 的合成库按规模存成 benchmarks/data/catalog_<规模>_<种子>.db，之后复用不重复灌库；
+PostgreSQL 必须用 --pg-url 显式指定一个专用的空库：每个规模开跑前会清空其中的 book / tag / book_tag 表。
+结果写 JSON（默认 benchmarks/results/），给了 --baseline 时逐项对比，p50 / p95 变慢超过
+--threshold 的算回归，退出码 1。
+
+用法：
+    cd backend && python -m benchmarks.run --sizes 1k,10k
+    cd backend && python -m benchmarks.run --sizes 1k,10k,100k,1m --queries 20 --output benchmarks/results/main.json
+    cd backend && python -m benchmarks.run --sizes 10k --backends sqlite,postgres \\
+        --pg-url postgresql://localhost/novelmind_bench --baseline benchmarks/results/main.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+# 让脚本能 import app.*（把 backend/ 加入路径）
+sys.path.insert(0, BACKEND_DIR)
+
+# 对比基线时看的耗时分位数
+_COMPARED_STATS = ("p50_ms", "p95_ms")
+_TIMINGS = ("idf_build", "candidate_retrieval", "scoring", "summary_cold", "summary_warm")
+# 绝对差值小于该值（毫秒）不算回归：缓存命中这类亚毫秒耗时的比值全是噪声
+_MIN_DELTA_MS = 1.0
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    for suffix, factor in (("m", 1_000_000), ("k", 1_000)):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * factor)
+    return int(text)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _summarize(samples_ms: List[float]) -> Dict:
+    values = sorted(samples_ms)
+    return {
+        "n": len(values),
+        "mean_ms": round(sum(values) / len(values), 3) if values else 0.0,
+        "p50_ms": round(_percentile(values, 0.50), 3),
+        "p95_ms": round(_percentile(values, 0.95), 3),
+        "max_ms": round(values[-1], 3) if values else 0.0,
+    }
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _peak_bytes(func, *args, **kwargs) -> int:
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# ── 子进程：在一个库上跑完全部测量 ──────────────────────────────────
+def _prepare_catalog(size: int, seed: int, reset: bool) -> Dict:
+    """库里书数与目标规模不符时（或 reset）重新灌库，返回灌库信息。"""
+    from app.database.connection import get_db_connection, init_db_indexes
+    from app.services.novel_service import bulk_upsert_novels
+    from .catalog import batched, generate_books
+
+    init_db_indexes()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) AS n FROM book")
+        existing = dict(cursor.fetchone())["n"]
+    if existing == size and not reset:
+        return {"populated": False, "books": existing}
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        for table in ("book_tag", "tag", "book"):
+            cursor.execute(f"DELETE FROM {table}")
+    start = time.perf_counter()
+    written = 0
+    for batch in batched(generate_books(size, seed), 5000):
+        count = bulk_upsert_novels(batch)
+        if count != len(batch):
+            raise RuntimeError(f"灌库失败：第 {written + 1} 本起的一批写入 {count}/{len(batch)}")
+        written += count
+        if size >= 100_000 and written % 100_000 == 0:
+            print(f"  已写入 {written}/{size}", file=sys.stderr, flush=True)
+    return {"populated": True, "books": written, "populate_seconds": round(time.perf_counter() - start, 1)}
+
+
+def run_worker(size: int, seed: int, queries: int, limit: int, reset: bool) -> Dict:
+    from app.config import DATABASE_URL
+    from app.services import recommendation_service as rec
+    from app.services.novel_service import get_candidate_novels, get_novel_by_id
+    from app.utils.tag_idf import clear_tag_idf_cache, get_default_idf, get_tag_idf
+
+    catalog = _prepare_catalog(size, seed, reset)
+    targets = [get_novel_by_id(bid) for bid in random.Random(seed).sample(range(1, size + 1), min(queries, size))]
+
+    idf_ms = []
+    for _ in range(3):
+        clear_tag_idf_cache()
+        _, ms = _timed(get_tag_idf)
+        idf_ms.append(ms)
+    clear_tag_idf_cache()
+    idf_peak = _peak_bytes(get_tag_idf)
+    tag_idf, default_idf = get_tag_idf(), get_default_idf()
+
+    retrieval_ms, scoring_ms, candidate_counts = [], [], []
+    for target in targets:
+        candidates, ms = _timed(get_candidate_novels, target)
+        retrieval_ms.append(ms)
+        candidate_counts.append(len(candidates))
+        _, ms = _timed(rec._score_candidates, target, candidates, None, tag_idf, default_idf)
+        scoring_ms.append(ms)
+        del candidates
+
+    # 冷：每次先清推荐缓存（invalidate 会连带清 IDF，重新加载后再计时，只测推荐本身）
+    cold_ms, warm_ms = [], []
+    for target in targets:
+        rec.invalidate_recommendation_cache()
+        get_tag_idf()
+        _, ms = _timed(rec.get_recommendation_summary, target["book_id"], limit, track=False)
+        cold_ms.append(ms)
+        _, ms = _timed(rec.get_recommendation_summary, target["book_id"], limit, track=False)
+        warm_ms.append(ms)
+    rec.invalidate_recommendation_cache()
+    get_tag_idf()
+    summary_peak = _peak_bytes(rec.get_recommendation_summary, targets[0]["book_id"], limit, track=False)
+
+    counts = sorted(candidate_counts)
+    return {
+        "backend": "postgresql" if DATABASE_URL else "sqlite",
+        "size": size,
+        "catalog": {**catalog, "tags": len(tag_idf)},
+        "timings": {
+            "idf_build": _summarize(idf_ms),
+            "candidate_retrieval": _summarize(retrieval_ms),
+            "scoring": _summarize(scoring_ms),
+            "summary_cold": _summarize(cold_ms),
+            "summary_warm": _summarize(warm_ms),
+        },
+        "candidates": {
+            "mean": round(sum(counts) / len(counts), 1),
+            "p50": _percentile(counts, 0.50),
+            "p95": _percentile(counts, 0.95),
+            "max": counts[-1],
+        },
+        "memory": {
+            "idf_build_peak_bytes": idf_peak,
+            "summary_cold_peak_bytes": summary_peak,
+            # Linux 上 ru_maxrss 单位是 KB
+            "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        },
+    }
+
+
+# ── 主进程：调度各组合、保存结果、对比基线 ──────────────────────────
+def _run_case(backend: str, size: int, args) -> Dict:
+    env = dict(os.environ)
+    env.pop("DATABASE_URL", None)
+    # 测的是单进程的计算开销；--reset 重建同路径的库时共享层里还留着上一轮的结果
+    env["SHARED_CACHE_BACKEND"] = "none"
+    env.setdefault("CATALOG_SNAPSHOT_PATH", "")
+    if backend == "postgres":
+        env["DATABASE_URL"] = args.pg_url
+    else:
+        data_dir = os.path.join(BENCH_DIR, "data")
+        os.makedirs(data_dir, exist_ok=True)
+        env["SQLITE_PATH"] = os.path.join(data_dir, f"catalog_{size}_{args.seed}.db")
+    cmd = [sys.executable, "-m", "benchmarks.run", "--worker", "--sizes", str(size),
+           "--seed", str(args.seed), "--queries", str(args.queries), "--limit", str(args.limit)]
+    if args.reset:
+        cmd.append("--reset")
+    proc = subprocess.run(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{backend} / {size} 本 基准进程失败（退出码 {proc.returncode}）")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """逐项对比，打印对比表，返回回归项描述。"""
+    base_runs = {(r["backend"], r["size"]): r for r in baseline.get("runs", [])}
+    regressions = []
+    for run in results["runs"]:
+        base = base_runs.get((run["backend"], run["size"]))
+        if base is None:
+            print(f"  {run['backend']:<10} {run['size']:>8}  基线中没有这一组，跳过")
+            continue
+        for metric in _TIMINGS:
+            for stat in _COMPARED_STATS:
+                old = base["timings"].get(metric, {}).get(stat)
+                new = run["timings"][metric][stat]
+                if not old:
+                    continue
+                ratio = new / old
+                flag = ""
+                if ratio > 1 + threshold and new - old >= _MIN_DELTA_MS:
+                    flag = "  ← 回归"
+                    regressions.append(f"{run['backend']} / {run['size']} / {metric} {stat}: "
+                                       f"{old:.2f} → {new:.2f} ms (x{ratio:.2f})")
+                print(f"  {run['backend']:<10} {run['size']:>8}  {metric:<20} {stat:<7} "
+                      f"{old:>10.2f} → {new:>10.2f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推荐引擎基准测试（合成书目）")
+    parser.add_argument("--sizes", default="1k,10k,100k", help="书目规模，逗号分隔，支持 k / m 后缀")
+    parser.add_argument("--backends", default="sqlite", help="sqlite,postgres")
+    parser.add_argument("--pg-url", help="PostgreSQL 专用基准库（会被清空！）")
+    parser.add_argument("--queries", type=int, default=30, help="每个规模抽样的目标书数")
+    parser.add_argument("--limit", type=int, default=10, help="推荐条数")
+    parser.add_argument("--seed", type=int, default=42, help="书目与抽样随机种子")
+    parser.add_argument("--reset", action="store_true", help="强制重新灌库")
+    parser.add_argument("--output", help="结果 JSON 路径（默认 benchmarks/results/bench-<时间>.json）")
+    parser.add_argument("--baseline", help="对比的基线结果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="变慢超过该比例算回归（默认 0.2）")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    if args.worker:
+        # 子进程：stdout 最后一行是结果 JSON，进度走 stderr
+        print(json.dumps(run_worker(sizes[0], args.seed, args.queries, args.limit, args.reset)))
+        return
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    if "postgres" in backends and not args.pg_url:
+        parser.error("PostgreSQL 基准需要 --pg-url 指定专用库（不会读取 DATABASE_URL，以免清空生产库）")
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "queries": args.queries,
+            "limit": args.limit,
+        },
+        "runs": [],
+    }
+    for backend in backends:
+        for size in sizes:
+            print(f"▶ {backend} / {size} 本 ...", flush=True)
+            run = _run_case(backend, size, args)
+            results["runs"].append(run)
+            t = run["timings"]
+            print(f"  候选集均值 {run['candidates']['mean']:.0f} 本 | "
+                  f"IDF {t['idf_build']['p50_ms']:.1f} ms | 召回 p50 {t['candidate_retrieval']['p50_ms']:.1f} ms | "
+                  f"打分 p50 {t['scoring']['p50_ms']:.1f} ms | 冷推荐 p50 {t['summary_cold']['p50_ms']:.1f} ms "
+                  f"p95 {t['summary_cold']['p95_ms']:.1f} ms | RSS {run['memory']['max_rss_bytes'] / 2**20:.0f} MB")
+
+    output = args.output or os.path.join(
+        BENCH_DIR, "results", f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"对比基线 {args.baseline}（commit {baseline.get('meta', {}).get('commit')}）:")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"✗ {len(regressions)} 项回归（阈值 +{args.threshold:.0%}）:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("✓ 无回归")
+
+
+if __name__ == "__main__":
+    main()
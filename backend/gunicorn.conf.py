@@ -0,0 +1,39 @@
+"""
+gunicorn 多进程部署配置：gunicorn 只做进程管理（拉起 / 重启 / 平滑退出），
+每个 worker 是一个独立的 uvicorn 事件循环进程，推荐打分这类 CPU 密集的工作能用上实例的多个核。
+
+用法：
+    cd backend && gunicorn -c gunicorn.conf.py app.main:app
+    cd backend && WEB_CONCURRENCY=4 PORT=8000 gunicorn -c gunicorn.conf.py app.main:app
+
+注意每个 worker 各有一套：
+- 数据库连接池（DB_POOL_MAX_CONN）和 to_thread 线程池（TO_THREAD_WORKERS），
+  PostgreSQL 的 max_connections 要留够 worker 数 × DB_POOL_MAX_CONN
+- 启动预热和试读预取（PREFETCH_BUDGET_PER_HOUR 是每个 worker 的预算）
+推荐 / IDF 缓存经共享缓存层（SHARED_CACHE_BACKEND）在 worker 之间共用，worker 和命令行脚本的 invalidate
+都会传到所有 worker；
+ANN 索引编码成目录快照文件（CATALOG_SNAPSHOT_PATH），各 worker 只读 mmap 共用一份；
+统计刷新、目录发现和目录快照生成只在持有调度锁的一个 worker 里运行（见 app/utils/scheduler_lock.py）。
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+# 默认按核数，但不超过 4：容器里 cpu_count 常报的是宿主机核数，每个 worker 还各占一份连接池和缓存内存
+workers = int(os.environ.get("WEB_CONCURRENCY", min(os.cpu_count() or 1, 4)))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# 不 preload：每个 worker 自己导入应用、跑 lifespan，连接池和后台线程都不跨 fork
+preload_app = False
+# worker 心跳超时（秒）：事件循环被卡住这么久 gunicorn 会重启该 worker
+timeout = 60
+# 平滑退出时等待进行中的请求（含爬取）完成的时间
+graceful_timeout = 30
+keepalive = 5
+
+# 访问日志由应用自己的结构化日志负责，gunicorn 本身的日志写 stdout
+accesslog = None
+errorlog = "-"
+
+# 把实际 worker 数写回环境变量，worker 进程继承后 config 据此在多 worker 时默认启用目录快照
+# （路径在 DATA_DIR 下）；共享缓存层在 config 里默认就开着，命令行脚本也用同一个
+os.environ["WEB_CONCURRENCY"] = str(workers)
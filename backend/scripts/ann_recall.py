@@ -0,0 +1,62 @@
+"""
+度量 ANN（MinHash LSH）召回模式相对精确召回的 recall@k 与候选集缩减幅度。
+
+随机抽样若干本有标签的书，分别用 exact / ann 两种模式跑完整推荐，
+对比前 k 名的重合度。调 ANN_BANDS / ANN_NUM_PERM（环境变量）后用它验证效果。
+
+用法：
+    cd backend && ../.venv/bin/python -m scripts.ann_recall
+    cd backend && ../.venv/bin/python -m scripts.ann_recall --sample 200 --k 20
+    cd backend && ANN_BANDS=16 ../.venv/bin/python -m scripts.ann_recall
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# 让脚本能 import app.*（把 backend/ 加入路径）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import ANN_NUM_PERM, ANN_BANDS  # noqa: E402
+from app.database.connection import get_db_connection, init_db_indexes  # noqa: E402
+from app.services.ann_service import build_ann_index  # noqa: E402
+from app.services.recommendation_service import evaluate_ann_recall  # noqa: E402
+
+
+def _sample_ids(sample: int, seed: int):
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT book_id FROM book WHERE tags IS NOT NULL AND tags != ''")
+        ids = [dict(r)["book_id"] for r in cursor.fetchall()]
+    random.Random(seed).shuffle(ids)
+    return ids[:sample]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ANN 召回率评估")
+    parser.add_argument("--sample", type=int, default=100, help="抽样书数")
+    parser.add_argument("--k", type=int, default=10, help="recall@k 的 k")
+    parser.add_argument("--seed", type=int, default=42, help="抽样随机种子")
+    args = parser.parse_args()
+
+    init_db_indexes()
+    start = time.time()
+    count = build_ann_index()
+    print(f"ANN 索引: {count} 本，签名 {ANN_NUM_PERM} 位 / {ANN_BANDS} 段，"
+          f"建索引 {time.time() - start:.1f} 秒")
+
+    report = evaluate_ann_recall(_sample_ids(args.sample, args.seed), args.k)
+    print(f"抽样 {report['books']} 本，recall@{report['k']} = {report['recall_at_k']:.3f}")
+    print(f"平均候选集：精确 {report['exact_candidates']:.0f} 本 → "
+          f"ANN {report['ann_candidates']:.0f} 本")
+
+    worst = sorted(report["per_book"], key=lambda b: b["recall"])[:5]
+    print("召回最差的几本：")
+    for b in worst:
+        print(f"  book_id={b['book_id']}  recall={b['recall']:.2f}  "
+              f"候选 {b['exact_candidates']} → {b['ann_candidates']}")
+
+
+if __name__ == "__main__":
+    main()
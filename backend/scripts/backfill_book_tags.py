@@ -0,0 +1,52 @@
+"""
+从 book.tags 全量重建标签关联表（tag / book_tag）。
+
+背景：标签原先只存为一列空格分隔的 TEXT，idx_book_tags 是对整串的 B-tree，
+成员查询只能 LIKE '%tag%' 全表扫。现改为 tag 字典 + book_tag 关联表，
+候选召回与 IDF 统计都走 (tag_id, book_id) 索引。
+
+insert_novel 入库时会同步维护关联表；服务的调度 worker 启动时在关联表为空时也会自动回填一次。
+本脚本用于手动全量重建（如直接改过 book.tags、或从旧库导入数据后）。幂等，可重复跑，
+与运行中的服务同时跑也安全。
+
+用法：
+    # 本地 SQLite
+    cd backend && ../.venv/bin/python -m scripts.backfill_book_tags
+
+    # 线上 PostgreSQL
+    cd backend && DATABASE_URL="postgresql://..." python -m scripts.backfill_book_tags
+"""
+import os
+import sys
+import time
+
+# 让脚本能 import app.*（把 backend/ 加入路径）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database.connection import get_db_connection, init_db_indexes  # noqa: E402
+from app.services.novel_service import rebuild_book_tags  # noqa: E402
+
+
+def _count(sql: str) -> int:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        return dict(cursor.fetchone())["n"]
+
+
+def main():
+    db = "PostgreSQL（线上）" if os.environ.get("DATABASE_URL") else "SQLite（本地）"
+    print(f"数据库: {db}")
+
+    # 确保 tag / book_tag 表与索引已建（幂等）
+    init_db_indexes()
+
+    start = time.time()
+    books = rebuild_book_tags()
+    print(f"已重建 {books} 本书的标签关联，耗时 {time.time() - start:.1f} 秒")
+    print(f"标签字典: {_count('SELECT COUNT(*) AS n FROM tag')} 个，"
+          f"关联行: {_count('SELECT COUNT(*) AS n FROM book_tag')} 条")
+
+
+if __name__ == "__main__":
+    main()
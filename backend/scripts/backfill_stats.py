@@ -31,6 +31,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.services.crawler_service import JinjiangCrawler  # noqa: E402
 from app.services.novel_service import get_novel_by_id, insert_novel  # noqa: E402
 from app.database.connection import get_db_connection, init_db_indexes  # noqa: E402
+from app.utils.log import setup_logging  # noqa: E402
 
 
 def _fetch_pending_ids(limit=None):
@@ -52,6 +53,7 @@ def main():
     parser = argparse.ArgumentParser(description="批量补全小说统计数据")
     parser.add_argument("--limit", type=int, default=None, help="最多处理多少本（试跑用）")
     args = parser.parse_args()
+    setup_logging(fmt="text")
 
     db = "PostgreSQL（线上）" if os.environ.get("DATABASE_URL") else "SQLite（本地）"
     print(f"数据库: {db}")
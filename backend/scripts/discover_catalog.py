@@ -0,0 +1,77 @@
+"""
+目录发现：从榜单和 id 区间批量导入书籍（可中断、可续跑）。
+
+队列（discovery_frontier）和断点（discovery_checkpoint）都存在库里，
+Ctrl+C 或进程被杀后直接重跑同一条命令即可从断点继续。
+每轮最多发 --budget 个上游请求，走爬虫共享限速（移动端每请求 1~2 秒）。
+
+用法：
+    cd backend && ../.venv/bin/python -m scripts.discover_catalog                     # 榜单 + id 区间
+    cd backend && ../.venv/bin/python -m scripts.discover_catalog --budget 2000 --no-rankings
+    cd backend && ../.venv/bin/python -m scripts.discover_catalog --ids 912073 100002  # 指定 id 入队
+    cd backend && ../.venv/bin/python -m scripts.discover_catalog --status
+    cd backend && ../.venv/bin/python -m scripts.discover_catalog --reset-failed
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+# 让脚本能 import app.*（把 backend/ 加入路径）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import DISCOVERY_BUDGET  # noqa: E402
+from app.database.connection import init_db_indexes  # noqa: E402
+from app.services.discovery_service import (  # noqa: E402
+    SOURCE_RANKING,
+    enqueue,
+    frontier_status,
+    reset_failed,
+    run_discovery,
+)
+from app.utils.log import setup_logging  # noqa: E402
+
+
+def _print_status():
+    status = frontier_status()
+    counts = status["counts"]
+    print("发现队列：" + ("，".join(f"{k} {v}" for k, v in sorted(counts.items())) or "空"))
+    for source, cp in status["checkpoints"].items():
+        when = datetime.fromtimestamp(cp["updated_at"]).strftime("%Y-%m-%d %H:%M") if cp["updated_at"] else "-"
+        print(f"断点 {source}: {cp['position']}（{when}）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="目录发现 / 批量导入")
+    parser.add_argument("--budget", type=int, default=DISCOVERY_BUDGET, help="本次上游请求数上限")
+    parser.add_argument("--no-rankings", action="store_true", help="不抓榜单页")
+    parser.add_argument("--no-id-range", action="store_true", help="队列空时不从 id 区间补货")
+    parser.add_argument("--ids", type=int, nargs="*", help="把这些 id 以高优先级入队")
+    parser.add_argument("--status", action="store_true", help="只打印队列状态与断点")
+    parser.add_argument("--reset-failed", action="store_true", help="把 failed 的 id 放回队列")
+    args = parser.parse_args()
+    setup_logging(fmt="text")
+
+    init_db_indexes()
+    if args.status:
+        _print_status()
+        return
+    if args.reset_failed:
+        print(f"已重置 {reset_failed()} 个失败 id")
+        return
+    if args.ids:
+        print(f"入队 {enqueue(args.ids, SOURCE_RANKING)} 个 id")
+
+    try:
+        summary = run_discovery(args.budget, rankings=not args.no_rankings, id_range=not args.no_id_range)
+    except KeyboardInterrupt:
+        print("\n已中断；未完成的 id 仍在队列中，重跑即可续上")
+        _print_status()
+        sys.exit(130)
+    print(f"请求 {summary['requests']} 个，新入队 {summary['enqueued']}，导入 {summary['imported']} 本，"
+          f"不存在 {summary['missing']}，待重试 {summary['retried']}；耗时 {summary['seconds']} 秒")
+    _print_status()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+本地假晋江上游：压测爬取链路时代替真实站点，不给晋江加压。
+
+模拟爬虫用到的全部接口（一个端口同时扮演桌面站、移动端 API 和图床，路径互不冲突）：
+- /search/search_ajax.php     AJAX 搜索（JSON）
+- /search.php                 网页搜索（gb18030 HTML）
+- /onebook.php                详情页（以 fixtures 里的 912073_full.html 为模板，按 novelid 换书名 / 作者 / 标签）
+- /androidapi/novelbasicinfo  统计 + 富字段
+- /androidapi/chapterList     章节列表（前 --free-chapters 章免费）
+- /androidapi/chapterContent  单章正文
+- 其余路径                     当作图片：返回按路径固定生成的 JPEG
+
+可配置延迟（均值 + 抖动）、错误率（500）和限流（每秒请求数超过 --max-rps 时回 429，
+或按 --throttle-rate 随机回 429），/_stats 查看各接口请求数。
+
+用法：
+    cd backend && python -m scripts.fake_upstream --port 9100 --latency-ms 150 --jitter-ms 100
+    cd backend && python -m scripts.fake_upstream --error-rate 0.02 --max-rps 50
+
+    # 另开终端，让后端指向假上游（用单独的库，压测搜索会写入新书）：
+    cd backend && JJWXC_WEB_BASE=http://127.0.0.1:9100 JJWXC_APP_BASE=http://127.0.0.1:9100 \\
+        IMAGE_UPSTREAM_BASE=http://127.0.0.1:9100 CRAWL_DELAY_SCALE=0 SQLITE_PATH=/tmp/loadtest.db \\
+        uvicorn app.main:app --port 8000
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote_to_bytes, urlparse
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "detail_pages", "912073_full.html")
+
+_TAGS = ("强强", "江湖", "正剧", "甜文", "轻松", "豪门世家", "娱乐圈", "破镜重圆", "系统", "仙侠修真",
+         "复仇虐渣", "无限流", "校园", "穿越时空", "重生", "快穿", "年代文", "星际", "末世", "美食")
+_PARAGRAPH = "山风卷着细雪扑进窗棂，灯下的人却仍在翻那一卷旧书，仿佛外头的风声与他全不相干。"
+
+
+def _book_seed(book_id: int) -> random.Random:
+    return random.Random(book_id * 7919)
+
+
+def _novel_id_for(keyword: str) -> int:
+    """同一个关键词总是搜到同一本书，id 放在 9e7 以上，不和真实书目撞。"""
+    return 90_000_000 + int(hashlib.md5(keyword.encode("utf-8")).hexdigest()[:6], 16)
+
+
+class FakeJinjiang:
+    def __init__(self, args):
+        self.args = args
+        with open(FIXTURE, encoding="gb18030") as f:
+            self.detail_template = f.read()
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._images = {}
+
+    # ── 故障注入 ────────────────────────────────────────────────
+    def fault(self):
+        """返回 (状态码, 说明) 表示本次要注入的故障，None 表示正常响应。"""
+        a = self.args
+        if a.max_rps > 0:
+            with self._lock:
+                now = time.monotonic()
+                if now - self._window_start >= 1.0:
+                    self._window_start, self._window_count = now, 0
+                self._window_count += 1
+                if self._window_count > a.max_rps:
+                    return 429, "rate limited"
+        if a.throttle_rate > 0 and random.random() < a.throttle_rate:
+            return 429, "rate limited"
+        if a.error_rate > 0 and random.random() < a.error_rate:
+            return 500, "injected error"
+        return None
+
+    def delay(self):
+        a = self.args
+        ms = max(0.0, a.latency_ms + random.uniform(-a.jitter_ms, a.jitter_ms))
+        if ms:
+            time.sleep(ms / 1000)
+
+    # ── 各接口 ──────────────────────────────────────────────────
+    def search_ajax(self, q):
+        keyword = q.get("keywords", [""])[0]
+        if not keyword or random.random() < self.args.search_miss_rate:
+            return "application/json", json.dumps({"status": 200, "data": []}).encode()
+        novel_id = _novel_id_for(keyword)
+        body = {"status": 200, "data": [{"novelid": novel_id, "novelname": keyword,
+                                          "authorname": f"压测作者{novel_id % 500}"}]}
+        return "application/json", json.dumps(body, ensure_ascii=False).encode()
+
+    def search_web(self, raw_query):
+        m = re.search(r"(?:^|&)kw=([^&]*)", raw_query)
+        keyword = unquote_to_bytes(m.group(1)).decode("gb18030", "replace") if m else ""
+        novel_id = _novel_id_for(keyword)
+        page = (f'<html><body><div><a href="onebook.php?novelid={novel_id}">{keyword}</a> '
+                f'<a href="oneauthor.php?authorid={novel_id % 500}">压测作者{novel_id % 500}</a></div></body></html>')
+        return "text/html; charset=gb18030", page.encode("gb18030")
+
+    def detail(self, q):
+        novel_id = int(q.get("novelid", ["1"])[0])
+        rng = _book_seed(novel_id)
+        tags = iter(rng.sample(_TAGS, 4))
+        page = (self.detail_template
+                .replace("912073", str(novel_id))
+                .replace("天涯客", f"压测书{novel_id}")
+                .replace("priest", f"压测作者{novel_id % 500}"))
+        page = re.sub(r'(<a href="bookbase\.php\?bq=\d+">)[^<]*(</a>)', lambda m: m.group(1) + next(tags) + m.group(2), page)
+        return "text/html; charset=gb2312", page.encode("gb18030")
+
+    def basicinfo(self, q):
+        novel_id = int(q.get("novelId", ["1"])[0])
+        rng = _book_seed(novel_id)
+        favorite = int(rng.lognormvariate(8, 1.5))
+        body = {
+            "novelId": novel_id,
+            "novelName": f"压测书{novel_id}",
+            "authorName": f"压测作者{novel_id % 500}",
+            "novelIntro": "压测简介",
+            "novelIntroShort": f"一句话简介{novel_id}",
+            "novelClass": "原创-纯爱-架空历史-武侠",
+            "mainview": "主受",
+            "novelTags": ",".join(rng.sample(_TAGS, 4)),
+            "novelStep": "2",
+            "novelSize": str(rng.randint(50_000, 900_000)),
+            "novelChapterCount": str(self.args.chapters),
+            "novelbefavoritedcount": str(favorite),
+            "comment_count": str(favorite // 15),
+            "nutrition_novel": str(favorite // 3),
+            "novip_clicks": str(favorite * 12),
+            "novelScore": f"{favorite * 150 / 1e4:.1f}万",
+            "characters": [{"character_id": "1", "character_name": "甲", "character_masked": "0"}],
+            "character_relations": [],
+        }
+        return "application/json", json.dumps(body, ensure_ascii=False).encode()
+
+    def chapter_list(self, q):
+        chapters = [{"chapterid": str(i), "chaptername": f"第{i}章", "chaptertype": "0",
+                     "chaptersize": "3000", "isvip": "0" if i <= self.args.free_chapters else "1"}
+                    for i in range(1, self.args.chapters + 1)]
+        return "application/json", json.dumps({"chapterlist": chapters}, ensure_ascii=False).encode()
+
+    def chapter_content(self, q):
+        chapter_id = int(q.get("chapterId", ["1"])[0])
+        vip = chapter_id > self.args.free_chapters
+        body = {"chapterName": f"第{chapter_id}章", "chapterIntro": "", "isvip": "1" if vip else "0",
+                "content": "" if vip else (_PARAGRAPH + "\n") * self.args.paragraphs, "sayBody": ""}
+        return "application/json", json.dumps(body, ensure_ascii=False).encode()
+
+    def image(self, path):
+        data = self._images.get(path)
+        if data is None:
+            data = _render_image(path)
+            self._images[path] = data
+        return "image/jpeg", data
+
+
+def _render_image(path: str) -> bytes:
+    """按路径哈希出底色的 300x420 JPEG（封面尺寸）；没装 Pillow 时返回一段固定字节。"""
+    digest = hashlib.md5(path.encode()).digest()
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return b"\xff\xd8\xff\xe0" + digest * 512 + b"\xff\xd9"
+    img = Image.new("RGB", (300, 420), tuple(digest[:3]))
+    draw = ImageDraw.Draw(img)
+    for i in range(0, 420, 12):
+        draw.line([(0, i), (300, 420 - i)], fill=tuple(digest[3:6]), width=3)
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+def _make_handler(upstream: FakeJinjiang):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            if upstream.args.verbose:
+                super().log_message(fmt, *args)
+
+        def _send(self, status: int, content_type: str, body: bytes, extra=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (extra or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            path, q = parsed.path, parse_qs(parsed.query)
+            if path == "/_stats":
+                self._send(200, "application/json", json.dumps(upstream.stats, ensure_ascii=False).encode())
+                return
+
+            routes = {
+                "/search/search_ajax.php": lambda: upstream.search_ajax(q),
+                "/search.php": lambda: upstream.search_web(parsed.query),
+                "/onebook.php": lambda: upstream.detail(q),
+                "/androidapi/novelbasicinfo": lambda: upstream.basicinfo(q),
+                "/androidapi/chapterList": lambda: upstream.chapter_list(q),
+                "/androidapi/chapterContent": lambda: upstream.chapter_content(q),
+            }
+            name = path if path in routes else "image"
+            upstream.delay()
+            fault = upstream.fault()
+            with upstream._lock:
+                upstream.stats[name] += 1
+                if fault:
+                    upstream.stats[f"{name} {fault[0]}"] += 1
+            if fault:
+                status, message = fault
+                extra = {"Retry-After": "1"} if status == 429 else None
+                self._send(status, "text/plain; charset=utf-8", message.encode(), extra)
+                return
+            content_type, body = routes[path]() if path in routes else upstream.image(path)
+            self._send(200, content_type, body)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地假晋江上游（压测用）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=120, help="平均响应延迟")
+    parser.add_argument("--jitter-ms", type=float, default=80, help="延迟抖动（±）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 500 的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="随机返回 429 的比例")
+    parser.add_argument("--max-rps", type=int, default=0, help="每秒请求数上限，超出回 429（0 = 不限）")
+    parser.add_argument("--search-miss-rate", type=float, default=0.1, help="AJAX 搜索无结果（走网页搜索兜底）的比例")
+    parser.add_argument("--chapters", type=int, default=30, help="每本书章节数")
+    parser.add_argument("--free-chapters", type=int, default=10, help="免费章节数")
+    parser.add_argument("--paragraphs", type=int, default=80, help="每章正文段落数")
+    parser.add_argument("--verbose", action="store_true", help="打印每个请求")
+    args = parser.parse_args()
+
+    if not os.path.exists(FIXTURE):
+        print(f"❌ 找不到详情页模板: {FIXTURE}", file=sys.stderr)
+        sys.exit(1)
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(FakeJinjiang(args)))
+    server.daemon_threads = True
+    print(f"假上游已启动: http://{args.host}:{args.port}  延迟 {args.latency_ms}±{args.jitter_ms} ms  "
+          f"错误率 {args.error_rate:.0%}  限流 {args.max_rps or '无'} rps / 随机 {args.throttle_rate:.0%}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
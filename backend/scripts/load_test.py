@@ -0,0 +1,242 @@
+"""
+HTTP 压测：按比例混合搜索 / 推荐 / 试读章节 / 图片代理请求打本地后端，
+报告吞吐、各类请求 p50 / p99 延迟，以及压测期间的线程池 / 连接池 / 上游爬取饱和度。
+用来在流量高峰前定 worker 数、TO_THREAD_WORKERS、DB_POOL_MAX_CONN 等上限。
+
+爬取链路请先用 scripts/fake_upstream.py 起假上游并让后端指向它（见该脚本说明），
+不要对真实晋江压测。目标书从后端同一个库里抽样，所以本脚本要和后端用同样的
+SQLITE_PATH / DATABASE_URL。搜索里 --search-new 比例的关键词库里没有，会触发实时爬取并写入新书。
+
+饱和度来自轮询 /api/health/ready（与负载均衡看到的一致）。
+
+用法：
+    cd backend && SQLITE_PATH=/tmp/loadtest.db python -m scripts.load_test --duration 60 --concurrency 50
+    cd backend && python -m scripts.load_test --mix search=1,recommend=6,chapters=2,image=3 --rps 200
+    cd backend && python -m scripts.load_test --base-url http://127.0.0.1:8000 --output /tmp/load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+from urllib.parse import quote
+
+import httpx
+
+# 让脚本能 import app.*（把 backend/ 加入路径）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database.connection import get_db_connection  # noqa: E402
+
+DEFAULT_MIX = "search=2,recommend=5,chapters=2,image=3"
+
+
+def _sample_books(n: int) -> List[Dict]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT book_id, title, cover_url FROM book ORDER BY RANDOM() LIMIT {int(n)}")
+        return [dict(r) for r in cursor.fetchall()]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class LoadTest:
+    def __init__(self, args, books: List[Dict]):
+        self.args = args
+        self.books = books
+        kinds, weights = [], []
+        for part in args.mix.split(","):
+            kind, _, weight = part.partition("=")
+            kinds.append(kind.strip())
+            weights.append(float(weight or 1))
+        unknown = set(kinds) - {"search", "recommend", "chapters", "image"}
+        if unknown:
+            raise SystemExit(f"未知的请求类型: {', '.join(sorted(unknown))}")
+        self.kinds, self.weights = kinds, weights
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.samples: List[Dict] = []
+        self._new_seq = 0
+
+    def _request(self, kind: str) -> str:
+        book = random.choice(self.books)
+        if kind == "recommend":
+            return f"/api/recommendations/{book['book_id']}?limit=10"
+        if kind == "chapters":
+            return f"/api/novels/{book['book_id']}/chapters"
+        if kind == "image":
+            cover = book.get("cover_url") or f"https://i9-static.jjwxc.net/novelimage.php?novelid={book['book_id']}"
+            width = random.choice(("", "&w=240", "&w=480"))
+            return f"/api/proxy/image?url={quote(cover, safe='')}{width}"
+        if random.random() < self.args.search_new:
+            self._new_seq += 1
+            keyword = f"压测新书{os.getpid()}-{self._new_seq}"
+        else:
+            keyword = book["title"]
+        return f"/api/novels/search?q={quote(keyword)}"
+
+    async def _one(self, client: httpx.AsyncClient) -> None:
+        kind = random.choices(self.kinds, self.weights)[0]
+        start = time.perf_counter()
+        try:
+            resp = await client.get(self._request(kind))
+            await resp.aread()
+            status = str(resp.status_code)
+        except httpx.TimeoutException:
+            status = "timeout"
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        self.latencies[kind].append((time.perf_counter() - start) * 1000)
+        self.statuses[kind][status] += 1
+
+    async def _worker(self, client: httpx.AsyncClient, deadline: float, interval: float) -> None:
+        next_at = time.monotonic()
+        while time.monotonic() < deadline:
+            if interval:
+                # 开环：按目标速率发，不因响应变慢而自动降速（更接近真实流量高峰）
+                next_at += interval
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self._one(client)
+
+    async def _sample_saturation(self, client: httpx.AsyncClient, deadline: float) -> None:
+        while time.monotonic() < deadline:
+            try:
+                resp = await client.get("/api/health/ready", timeout=5)
+                report = resp.json()
+                checks = report.get("checks", {})
+                threads = checks.get("thread_pool", {})
+                crawler = checks.get("crawler", {})
+                self.samples.append({
+                    "ready": report.get("ready"),
+                    "reasons": report.get("reasons", []),
+                    "queued": threads.get("queued") or 0,
+                    "busy": threads.get("busy") or 0,
+                    "workers": threads.get("workers"),
+                    "background_busy": (threads.get("background") or {}).get("busy") or 0,
+                    "db_in_use": (checks.get("database", {}).get("pool") or {}).get("in_use") or 0,
+                    "crawls": (crawler.get("in_flight") or 0) + (crawler.get("waiting_rate_limit") or 0),
+                })
+            except (httpx.HTTPError, ValueError):
+                self.samples.append({"ready": None, "reasons": ["health check failed"], "queued": 0, "busy": 0,
+                                     "workers": None, "background_busy": 0, "db_in_use": 0, "crawls": 0})
+            await asyncio.sleep(self.args.sample_interval)
+
+    async def run(self) -> Dict:
+        a = self.args
+        limits = httpx.Limits(max_connections=a.concurrency + 5, max_keepalive_connections=a.concurrency + 5)
+        async with httpx.AsyncClient(base_url=a.base_url, timeout=a.timeout, limits=limits) as client:
+            start = time.monotonic()
+            deadline = start + a.duration
+            interval = a.concurrency / a.rps if a.rps else 0.0
+            await asyncio.gather(
+                self._sample_saturation(client, deadline),
+                *(self._worker(client, deadline, interval) for _ in range(a.concurrency)),
+            )
+            elapsed = time.monotonic() - start
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> Dict:
+        per_kind = {}
+        all_latencies = []
+        for kind in self.kinds:
+            values = sorted(self.latencies.get(kind, []))
+            all_latencies.extend(values)
+            statuses = self.statuses.get(kind, Counter())
+            errors = sum(n for s, n in statuses.items() if not (s.isdigit() and int(s) < 400))
+            per_kind[kind] = {
+                "requests": len(values),
+                "rps": round(len(values) / elapsed, 1),
+                "errors": errors,
+                "p50_ms": round(_percentile(values, 0.50), 1),
+                "p99_ms": round(_percentile(values, 0.99), 1),
+                "max_ms": round(values[-1], 1) if values else 0.0,
+                "statuses": dict(statuses),
+            }
+        all_latencies.sort()
+        samples = self.samples or [{}]
+        reasons = Counter(r for s in self.samples for r in s.get("reasons", []))
+        return {
+            "config": {k: getattr(self.args, k) for k in ("base_url", "duration", "concurrency", "rps", "mix")},
+            "elapsed_seconds": round(elapsed, 1),
+            "total": {
+                "requests": len(all_latencies),
+                "rps": round(len(all_latencies) / elapsed, 1),
+                "p50_ms": round(_percentile(all_latencies, 0.50), 1),
+                "p99_ms": round(_percentile(all_latencies, 0.99), 1),
+            },
+            "by_kind": per_kind,
+            "saturation": {
+                "samples": len(self.samples),
+                "not_ready_ratio": round(sum(1 for s in self.samples if s.get("ready") is not True)
+                                         / max(len(self.samples), 1), 3),
+                "thread_pool_workers": next((s["workers"] for s in self.samples if s.get("workers")), None),
+                "thread_pool_busy_max": max(s.get("busy", 0) for s in samples),
+                "thread_pool_queued_max": max(s.get("queued", 0) for s in samples),
+                "thread_pool_queued_mean": round(sum(s.get("queued", 0) for s in samples) / len(samples), 1),
+                "background_busy_max": max(s.get("background_busy", 0) for s in samples),
+                "db_in_use_max": max(s.get("db_in_use", 0) for s in samples),
+                "upstream_crawls_max": max(s.get("crawls", 0) for s in samples),
+                "not_ready_reasons": dict(reasons.most_common(5)),
+            },
+        }
+
+
+def _print_report(report: Dict) -> None:
+    total = report["total"]
+    print(f"\n总计 {total['requests']} 个请求 / {report['elapsed_seconds']} 秒 = {total['rps']} req/s，"
+          f"p50 {total['p50_ms']} ms，p99 {total['p99_ms']} ms")
+    print(f"{'类型':<10}{'请求数':>8}{'req/s':>9}{'错误':>7}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}  状态码")
+    for kind, r in report["by_kind"].items():
+        print(f"{kind:<12}{r['requests']:>8}{r['rps']:>9}{r['errors']:>7}{r['p50_ms']:>10}{r['p99_ms']:>10}"
+              f"{r['max_ms']:>10}  {r['statuses']}")
+    s = report["saturation"]
+    print(f"\n线程池：忙碌最多 {s['thread_pool_busy_max']}/{s['thread_pool_workers']}，"
+          f"排队最多 {s['thread_pool_queued_max']}（平均 {s['thread_pool_queued_mean']}）；"
+          f"后台任务线程最多 {s['background_busy_max']}")
+    print(f"数据库连接最多占用 {s['db_in_use_max']}，进行中的上游请求最多 {s['upstream_crawls_max']}")
+    print(f"就绪检查失败比例 {s['not_ready_ratio']:.1%}（{s['samples']} 次采样）")
+    for reason, n in s["not_ready_reasons"].items():
+        print(f"  {reason}: {n} 次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端混合流量压测")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=30, help="压测时长（秒）")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发连接数")
+    parser.add_argument("--rps", type=float, default=0, help="目标总请求速率（0 = 闭环，尽力而为）")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"请求比例（默认 {DEFAULT_MIX}）")
+    parser.add_argument("--search-new", type=float, default=0.3, help="搜索中库里没有的书（触发爬取）的比例")
+    parser.add_argument("--books", type=int, default=500, help="从库里抽样的目标书数")
+    parser.add_argument("--timeout", type=float, default=30, help="单个请求超时（秒）")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="饱和度采样间隔（秒）")
+    parser.add_argument("--output", help="结果 JSON 路径")
+    args = parser.parse_args()
+
+    books = _sample_books(args.books)
+    if not books:
+        print("❌ 库里没有书，无法压测（检查 SQLITE_PATH / DATABASE_URL 是否和后端一致）", file=sys.stderr)
+        sys.exit(1)
+    print(f"压测 {args.base_url}：{args.duration:.0f} 秒，并发 {args.concurrency}，"
+          f"{'速率 ' + str(args.rps) + ' req/s' if args.rps else '闭环'}，比例 {args.mix}，样本 {len(books)} 本", flush=True)
+
+    report = asyncio.run(LoadTest(args, books).run())
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
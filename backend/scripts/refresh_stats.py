@@ -0,0 +1,65 @@
+"""
+按「陈旧度 × 热度」刷新一轮书籍统计（条件请求，没变化的书不解析不写库）。
+
+适合挂成外部定时任务（如每小时一次）；也可在 API 进程内设 STATS_REFRESH_INTERVAL 跑。
+每轮最多发 --budget 个上游请求，爬虫自带限速（移动端每请求 1~2 秒、详情页 2~3 秒）。
+
+用法：
+    cd backend && ../.venv/bin/python -m scripts.refresh_stats
+    cd backend && ../.venv/bin/python -m scripts.refresh_stats --budget 500 --detail
+    cd backend && ../.venv/bin/python -m scripts.refresh_stats --plan          # 只看本轮会刷哪些书
+    cd backend && ../.venv/bin/python -m scripts.refresh_stats --book-ids 912073
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+# 让脚本能 import app.*（把 backend/ 加入路径）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import STATS_REFRESH_BUDGET  # noqa: E402
+from app.database.connection import init_db_indexes  # noqa: E402
+from app.services.freshness_service import plan_refresh, refresh_book, run_refresh_cycle  # noqa: E402
+from app.utils.log import setup_logging  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="书籍统计数据刷新")
+    parser.add_argument("--budget", type=int, default=STATS_REFRESH_BUDGET, help="本轮上游请求数上限")
+    parser.add_argument("--detail", action="store_true", help="同时条件刷新详情页（每本多 1 个请求）")
+    parser.add_argument("--plan", action="store_true", help="只打印本轮刷新计划，不发请求")
+    parser.add_argument("--book-ids", type=int, nargs="*", help="只刷新这些书（忽略优先级与预算）")
+    args = parser.parse_args()
+    setup_logging(fmt="text")
+
+    init_db_indexes()
+    kinds = ("basicinfo", "detail") if args.detail else ("basicinfo",)
+
+    if args.book_ids:
+        for book_id in args.book_ids:
+            result = refresh_book(book_id, kinds)
+            status = "写库" if result["written"] else ("有变化" if result["changed"] else "未变化")
+            print(f"  book_id={book_id}  {status}  请求 {result['requests']}  {'; '.join(result['errors'])}")
+        return
+
+    if args.plan:
+        plan = plan_refresh(args.budget, kinds)
+        print(f"本轮计划刷新 {len(plan)} 本（预算 {args.budget} 个请求）")
+        for item in plan[:50]:
+            last = (datetime.fromtimestamp(item["last_fetched"]).strftime("%Y-%m-%d %H:%M")
+                    if item["last_fetched"] else "从未")
+            print(f"  {item['priority']:6.2f}  book_id={item['book_id']}  收藏 {item['favorite_count'] or 0}"
+                  f"  上次 {last}  《{item['title']}》")
+        if len(plan) > 50:
+            print(f"  …… 另有 {len(plan) - 50} 本")
+        return
+
+    summary = run_refresh_cycle(args.budget, kinds)
+    print(f"刷新 {summary['refreshed']}/{summary['planned']} 本，请求 {summary['requests']} 个；"
+          f"有变化 {summary['changed']}，写库 {summary['written']}，失败 {summary['errors']}；"
+          f"耗时 {summary['seconds']} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+从原始响应归档离线重建 book / chapter 行（不发任何网络请求）。
+
+改进了详情页 / 移动端接口的解析逻辑之后，用它把归档里每本书最新一次抓到的
+原始响应重新过一遍解析器，写回数据库，代替按 2~3 秒一本的速度重新爬全库。
+解析在进程池里并行（CPU 密集），写库在主进程里串行。
+
+合并规则与在线爬取一致：以库里已有的行为底，覆盖上详情页字段，再用移动端统计 /
+富字段覆盖（桌面端的精确「文章积分」优先）；试读章节按 fetch_free_chapters 的规则
+从归档的章节列表 + 章节正文组装。
+
+用法：
+    cd backend && RAW_ARCHIVE_DIR=/data/raw ../.venv/bin/python -m scripts.reparse_archive
+    cd backend && ../.venv/bin/python -m scripts.reparse_archive --archive /data/raw --workers 8
+    cd backend && ../.venv/bin/python -m scripts.reparse_archive --archive /data/raw --book-ids 912073 100002 --dry-run
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# 让脚本能 import app.*（把 backend/ 加入路径）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import RAW_ARCHIVE_DIR  # noqa: E402
+from app.database.connection import init_db_indexes  # noqa: E402
+from app.services.chapter_service import insert_chapters  # noqa: E402
+from app.services.crawler_service import JinjiangCrawler  # noqa: E402
+from app.services.novel_service import get_novel_by_id, insert_novel  # noqa: E402
+from app.services.raw_archive import latest_responses, list_archived_book_ids, load_text  # noqa: E402
+from app.utils.log import setup_logging  # noqa: E402
+
+
+def _reparse_one(book_id: int, archive_dir: str, chapters_n: int) -> dict:
+    """
+    在子进程里解析一本书的归档响应。
+
+    Returns:
+        dict: book_id / detail（详情页字段，无归档则 None）/ extras（移动端字段）/
+              chapters（试读章节行）/ error
+    """
+    result = {"book_id": book_id, "detail": None, "extras": {}, "chapters": [], "error": None}
+    try:
+        crawler = JinjiangCrawler()
+        latest = latest_responses(book_id, archive_dir)
+
+        if "detail" in latest:
+            result["detail"] = crawler.parse_novel_detail(load_text(latest["detail"], archive_dir))
+        if "basicinfo" in latest:
+            result["extras"] = crawler.parse_mobile_extras(json.loads(load_text(latest["basicinfo"], archive_dir)))
+        if "chapter_list" in latest:
+            chapter_list = crawler.parse_chapter_list(json.loads(load_text(latest["chapter_list"], archive_dir)))
+            contents = latest.get("chapter_content", {})
+
+            def _archived_content(chapter_id):
+                entry = contents.get(chapter_id)
+                if entry is None:
+                    return {}
+                return crawler.parse_chapter_content(json.loads(load_text(entry, archive_dir)))
+
+            result["chapters"] = crawler.assemble_free_chapters(chapter_list, _archived_content, chapters_n)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def _merge_row(existing: dict, parsed: dict) -> dict:
+    """按在线爬取的合并规则组出待写回的 book 行；没有任何可用归档时返回 None。"""
+    if parsed["detail"] is None and not parsed["extras"]:
+        return None
+    if existing is None and parsed["detail"] is None:
+        return None  # 库里没有、归档里也没详情页：缺书名作者，不新建
+    row = {**(existing or {}), **(parsed["detail"] or {}), "book_id": parsed["book_id"]}
+    return JinjiangCrawler.merge_mobile_extras(row, parsed["extras"])
+
+
+def _changed_fields(existing: dict, row: dict) -> list:
+    if existing is None:
+        return ["<new>"]
+    return sorted(k for k in row if k in existing and row[k] != existing[k])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从原始响应归档离线重建 book / chapter")
+    parser.add_argument("--archive", default=RAW_ARCHIVE_DIR, help="归档目录（默认 RAW_ARCHIVE_DIR）")
+    parser.add_argument("--book-ids", type=int, nargs="*", help="只重建这些书（默认归档里全部）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="解析进程数")
+    parser.add_argument("--chapters", type=int, default=3, help="试读章节数（同 get_or_fetch_chapters）")
+    parser.add_argument("--dry-run", action="store_true", help="只解析并报告变化字段，不写库")
+    args = parser.parse_args()
+    setup_logging(fmt="text")
+
+    if not args.archive:
+        print("未指定归档目录：用 --archive 或设置 RAW_ARCHIVE_DIR")
+        sys.exit(1)
+
+    init_db_indexes()
+    book_ids = args.book_ids or list_archived_book_ids(args.archive)
+    print(f"待重建 {len(book_ids)} 本，{args.workers} 个解析进程")
+
+    start = time.time()
+    books = chapters = skipped = errors = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        parsed_iter = pool.map(
+            _reparse_one, book_ids, [args.archive] * len(book_ids), [args.chapters] * len(book_ids),
+            chunksize=16,
+        )
+        for parsed in parsed_iter:
+            book_id = parsed["book_id"]
+            if parsed["error"]:
+                errors += 1
+                print(f"✗ book_id={book_id} 解析失败: {parsed['error']}")
+                continue
+
+            existing = get_novel_by_id(book_id)
+            row = _merge_row(existing, parsed)
+            if row is None:
+                skipped += 1
+            elif args.dry_run:
+                changed = _changed_fields(existing, row)
+                if changed:
+                    print(f"  book_id={book_id} 变化字段: {', '.join(changed)}")
+                books += 1
+            elif insert_novel(row):
+                books += 1
+
+            if parsed["chapters"]:
+                if args.dry_run or insert_chapters(book_id, parsed["chapters"]):
+                    chapters += len(parsed["chapters"])
+
+    verb = "可重建" if args.dry_run else "已重建"
+    print(f"\n{verb} {books} 本书、{chapters} 个试读章节；跳过 {skipped}，失败 {errors}；"
+          f"耗时 {time.time() - start:.1f} 秒")
+    if not args.dry_run and books:
+        print("提示：运行中的 API 进程有推荐 / IDF 缓存，需重启或等缓存过期后生效")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
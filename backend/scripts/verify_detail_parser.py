@@ -0,0 +1,100 @@
+"""
+详情页解析器回归校验：lxml 快速路径 vs BeautifulSoup 回退路径 vs 已记录的 golden 输出。
+
+fixtures/detail_pages/ 下每个 <name>.html（GB18030 编码，与线上详情页一致）对应一个
+<name>.json golden 文件。校验项：
+- 快速路径与回退路径输出逐字段一致
+- 两者都与 golden 一致（golden 由回退路径生成，即原始解析逻辑的输出）
+并报告两条路径的单页 CPU 耗时。
+
+改了解析逻辑、确认新输出无误后，用 --record 重新生成 golden。
+也可以用 --pages 指向任意一批保存下来的真实详情页目录做对比。
+
+用法：
+    cd backend && ../.venv/bin/python -m scripts.verify_detail_parser
+    cd backend && ../.venv/bin/python -m scripts.verify_detail_parser --record
+    cd backend && ../.venv/bin/python -m scripts.verify_detail_parser --pages /path/to/saved_pages
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+# 让脚本能 import app.*（把 backend/ 加入路径）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.crawler_service import JinjiangCrawler  # noqa: E402
+from app.utils.log import setup_logging  # noqa: E402
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "detail_pages"
+
+
+def _cpu_time(fn, page_html: str, repeat: int) -> float:
+    start = time.process_time()
+    for _ in range(repeat):
+        fn(page_html)
+    return (time.process_time() - start) / repeat * 1000
+
+
+def _diff(a: dict, b: dict) -> list:
+    return [
+        f"{k}: {a.get(k)!r} != {b.get(k)!r}"
+        for k in sorted(set(a) | set(b))
+        if a.get(k) != b.get(k) or (k in a) != (k in b)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="详情页解析器回归校验")
+    parser.add_argument("--pages", default=str(FIXTURE_DIR), help="详情页 .html 目录")
+    parser.add_argument("--record", action="store_true", help="用回退路径的输出重写 golden 文件")
+    parser.add_argument("--repeat", type=int, default=20, help="计时重复次数")
+    args = parser.parse_args()
+    setup_logging(fmt="text")
+
+    crawler = JinjiangCrawler()
+    pages = sorted(Path(args.pages).glob("*.html"))
+    if not pages:
+        print(f"目录里没有 .html: {args.pages}")
+        sys.exit(1)
+
+    failures = 0
+    fast_total = slow_total = 0.0
+    for page in pages:
+        page_html = page.read_bytes().decode("gb18030")
+        reference = crawler._parse_detail_soup(page_html)
+        fast = crawler._parse_detail_lxml(page_html)
+        golden_path = page.with_suffix(".json")
+
+        if args.record:
+            golden_path.write_text(json.dumps(reference, ensure_ascii=False, indent=2, sort_keys=True) + "\n",
+                                   encoding="utf-8")
+
+        problems = [f"lxml vs html.parser  {d}" for d in _diff(fast, reference)]
+        if golden_path.exists():
+            golden = json.loads(golden_path.read_text(encoding="utf-8"))
+            problems += [f"html.parser vs golden  {d}" for d in _diff(reference, golden)]
+        else:
+            problems.append("缺少 golden 文件（先跑 --record）")
+
+        fast_ms = _cpu_time(crawler._parse_detail_lxml, page_html, args.repeat)
+        slow_ms = _cpu_time(crawler._parse_detail_soup, page_html, args.repeat)
+        fast_total += fast_ms
+        slow_total += slow_ms
+
+        status = "✓" if not problems else "✗"
+        print(f"{status} {page.name}  lxml {fast_ms:.2f}ms / html.parser {slow_ms:.2f}ms")
+        for p in problems:
+            print(f"    {p}")
+        failures += bool(problems)
+
+    print(f"\n{len(pages) - failures}/{len(pages)} 通过；"
+          f"平均单页 CPU：lxml {fast_total / len(pages):.2f}ms，"
+          f"html.parser {slow_total / len(pages):.2f}ms（{slow_total / max(fast_total, 1e-9):.1f}×）")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+为库里所有 book.cover_url 预先生成封面缩略图（写入图片代理的磁盘缓存）。
+
+部署后或批量导入书籍后跑一次，用户第一次打开卡片就能直接命中缓存，不用等回源 + 编码。
+运行中的 API 进程会在首次请求时自动收编这些文件，无需重启。
+
+用法：
+    cd backend && ../.venv/bin/python -m scripts.warm_thumbnails
+    cd backend && ../.venv/bin/python -m scripts.warm_thumbnails --widths 240 480 --formats webp avif
+    cd backend && ../.venv/bin/python -m scripts.warm_thumbnails --limit 50 --concurrency 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# 让脚本能 import app.*（把 backend/ 加入路径）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database.connection import get_db_connection  # noqa: E402
+from app.services.image_proxy import (  # noqa: E402
+    ImageFetchError,
+    close_image_client,
+    fetch_original,
+    validate_image_url,
+)
+from app.services.thumbnail_service import (  # noqa: E402
+    SUPPORTED_FORMATS,
+    ThumbnailError,
+    ensure_thumbnail,
+    shutdown_thumbnail_pool,
+    snap_width,
+    thumbnails_enabled,
+)
+from app.utils.log import setup_logging  # noqa: E402
+
+
+def _cover_urls(limit):
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT cover_url FROM book WHERE cover_url IS NOT NULL AND cover_url != ''")
+        urls = [dict(row)["cover_url"] for row in cursor.fetchall()]
+    valid = []
+    for url in urls:
+        try:
+            validate_image_url(url)
+            valid.append(url)
+        except ValueError:
+            pass
+    return valid[:limit] if limit else valid
+
+
+async def _warm(urls, widths, formats, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+    stats = {"ok": 0, "failed": 0, "original_bytes": 0, "thumb_bytes": {}}
+
+    async def one(url):
+        async with sem:
+            try:
+                src = await fetch_original(url)
+                stats["original_bytes"] += src.stat().st_size
+                for width in widths:
+                    for fmt in formats:
+                        path = await ensure_thumbnail(url, width, fmt)
+                        stats["thumb_bytes"].setdefault((width, fmt), []).append(path.stat().st_size)
+                stats["ok"] += 1
+            except (ImageFetchError, ThumbnailError) as e:
+                stats["failed"] += 1
+                print(f"  ✗ {url}: {e}")
+
+    done = 0
+    tasks = [asyncio.create_task(one(url)) for url in urls]
+    for task in asyncio.as_completed(tasks):
+        await task
+        done += 1
+        if done % 50 == 0:
+            print(f"  {done}/{len(urls)}")
+    await close_image_client()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预生成封面缩略图")
+    # 默认覆盖前端卡片（100px / 220px）在 1x、2x 屏上会请求的档位
+    parser.add_argument("--widths", type=int, nargs="+", default=[120, 240, 480], help="宽度（会取到允许的档位）")
+    parser.add_argument("--formats", nargs="+", default=None, help="编码格式（默认本机支持的 avif / webp）")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发回源数")
+    parser.add_argument("--limit", type=int, default=None, help="只处理前 N 个封面")
+    args = parser.parse_args()
+    setup_logging(fmt="text")
+
+    if not thumbnails_enabled():
+        print("未安装 Pillow，无法生成缩略图")
+        sys.exit(1)
+
+    widths = sorted({snap_width(w) for w in args.widths})
+    formats = args.formats or [f for f in SUPPORTED_FORMATS if f != "jpeg"] or ["jpeg"]
+    unsupported = [f for f in formats if f not in SUPPORTED_FORMATS]
+    if unsupported:
+        print(f"本机 Pillow 不支持: {', '.join(unsupported)}")
+        sys.exit(1)
+
+    urls = _cover_urls(args.limit)
+    print(f"封面 {len(urls)} 张，宽度 {widths}，格式 {formats}")
+    start = time.time()
+    try:
+        stats = asyncio.run(_warm(urls, widths, formats, args.concurrency))
+    finally:
+        shutdown_thumbnail_pool()
+
+    print(f"\n完成 {stats['ok']} 张，失败 {stats['failed']}；耗时 {time.time() - start:.1f} 秒")
+    if stats["ok"]:
+        print(f"原图平均 {stats['original_bytes'] / stats['ok'] / 1024:.1f} KB")
+        for (width, fmt), sizes in sorted(stats["thumb_bytes"].items()):
+            print(f"  w{width} {fmt}: 平均 {sum(sizes) / len(sizes) / 1024:.1f} KB，最大 {max(sizes) / 1024:.1f} KB")
+    sys.exit(1 if stats["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
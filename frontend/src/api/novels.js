@@ -19,8 +19,23 @@ apiClient.interceptors.response.use(
 export const searchNovel = (query) =>
   apiClient.get('/novels/search', { params: { q: query } })
 
+// compact：推荐列表只渲染卡片字段，不拉简介、角色等大字段
 export const getRecommendations = (bookId, limit = 10) =>
-  apiClient.get(`/recommendations/${bookId}`, { params: { limit } })
+  apiClient.get(`/recommendations/${bookId}`, { params: { limit, compact: true } })
+
+// 分页推荐（无限滚动）：首次不传 cursor，之后传上一页返回的 next_cursor
+export const getRecommendationPage = (bookId, cursor = null, pageSize = 20) =>
+  apiClient.get(`/recommendations/${bookId}/page`, {
+    params: { page_size: pageSize, compact: true, ...(cursor ? { cursor } : {}) }
+  })
+
+// 批量推荐：一次请求拿多本书各自的推荐；merge=true 时附带合并去重的整体排行
+export const getBatchRecommendations = (bookIds, limit = 10, merge = false) =>
+  apiClient.post('/recommendations/batch', { book_ids: bookIds, limit, merge })
+
+// 书架推荐：以多本书的聚合画像为种子，服务端一次算出合并排行（不含种子书）
+export const getShelfRecommendations = (bookIds, limit = 10) =>
+  apiClient.post('/recommendations/shelf', { book_ids: bookIds, limit })
 
 // 试读前 N 章免费正文（懒加载：后端库里有就秒回，没有则实时爬取约 4~8s）
 export const getChapters = (bookId, n = 3) =>
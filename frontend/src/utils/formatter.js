@@ -31,12 +31,17 @@ export const formatNumber = (num) => {
   return num.toString().replace(/\B(?=(\d{3})+(?!\d))/g, ',')
 }
 
+// 与 api/novels.js 的 baseURL 一致
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || '/api'
+
 /**
  * 处理图片URL - 修复混合内容和防盗链问题
  * @param {string} imageUrl - 原始图片URL
+ * @param {number} [displayWidth] - 显示宽度（CSS 像素）；传入时走后端缩略图代理，
+ *   按设备像素比（最多 2 倍）请求缩放 + WebP/AVIF 转码后的封面
  * @returns {string} - 处理后的图片URL
  */
-export const getProxiedImageUrl = (imageUrl) => {
+export const getProxiedImageUrl = (imageUrl, displayWidth) => {
   if (!imageUrl) return ''
 
   // 修复新浪图床的 HTTP 协议问题（混合内容阻止）
@@ -49,6 +54,12 @@ export const getProxiedImageUrl = (imageUrl) => {
       .replace(/ww(\d+)\.sinaimg\.cn/, 'wx$1.sinaimg.cn')
   }
 
+  if (displayWidth) {
+    const dpr = Math.min(window.devicePixelRatio || 1, 2)
+    const w = Math.round(displayWidth * dpr)
+    return `${API_BASE_URL}/proxy/image?url=${encodeURIComponent(imageUrl)}&w=${w}`
+  }
+
   return imageUrl
 }
 